@@ -18,4 +18,5 @@ setup(
         "django-pglocks >= 1.0.4",
         "timeout-decorator >= 0.5.0",
     ],
+    extras_require={"orjson": ["orjson >= 3.0.0"]},
 )
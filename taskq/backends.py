@@ -0,0 +1,551 @@
+"""Storage of the tasks, and the operations the producers and the consumers run
+on them.
+
+The backend is configured with settings.TASKQ["backend"] and
+settings.TASKQ["backend_options"]:
+
+- PostgresBackend (default) stores the tasks in the Task tables and relies on
+  SELECT ... FOR UPDATE SKIP LOCKED and on advisory locks,
+- SQLiteBackend stores the tasks in the Task tables of a SQLite database, for
+  development,
+- MemoryBackend keeps the tasks in memory, for tests. With eager=True, the
+  tasks are executed as soon as they are enqueued.
+"""
+
+import itertools
+import logging
+import threading
+from collections import defaultdict
+from contextlib import contextmanager, nullcontext
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from django_pglocks import advisory_lock
+
+from .exceptions import Cancel
+from .json import get_codec
+from .models import TASK_MODELS, Task
+from .purge import purge_tasks
+from .routing import bulk_create_tasks, db_for_task_name
+from .scheduler import ScheduledTask
+from .stats import purge_stats, update_stats
+from .timings import timed_enter
+from .utils import cached_setting, chunks
+from .workers import heartbeat, prune_workers, unregister_worker
+
+logger = logging.getLogger("taskq")
+
+
+def apply_overlap_policies(scheduled_tasks, active_names):
+    """Apply the `overlap` policy of each scheduled task, given the names of
+    the scheduled tasks which still have an active (queued, fetched or
+    running) task.
+
+    Returns a tuple ([scheduled_task], [name]) containing the scheduled
+    tasks for which a new Task must be created and the names of the
+    scheduled tasks whose queued Tasks must be canceled.
+    """
+    created = []
+    replaced_names = []
+    for scheduled_task in scheduled_tasks:
+        if scheduled_task.name in active_names:
+            if scheduled_task.overlap == ScheduledTask.OVERLAP_SKIP:
+                logger.info(
+                    "%s : Skipped, previous run is still active",
+                    scheduled_task.name,
+                )
+                continue
+            if scheduled_task.overlap == ScheduledTask.OVERLAP_REPLACE:
+                replaced_names.append(scheduled_task.name)
+
+        created.append(scheduled_task)
+
+    return created, replaced_names
+
+
+class Backend:
+    """Store the tasks and hand them out to the consumers."""
+
+    # Whether the function args larger than settings.TASKQ["payload_threshold"]
+    # are offloaded to the payload store
+    offloads_payloads = True
+
+    def enqueue(self, task):
+        """Store the new `task`."""
+        raise NotImplementedError
+
+    def bulk_enqueue(self, tasks):
+        """Store the new `tasks`."""
+        raise NotImplementedError
+
+    def claim(self, shards=None, databases=None):
+        """Mark the due tasks as fetched and return them. Each task is claimed
+        by a single consumer.
+
+        :param shards: The shards to claim tasks from first, see
+        sharding.get_preferred_shards().
+        :param databases: The aliases of the databases to claim tasks from.
+        """
+        raise NotImplementedError
+
+    def start(self, task):
+        """Store that the claimed `task` is running."""
+        raise NotImplementedError
+
+    def ack(self, task):
+        """Store the final status (success, failed or canceled) of `task`."""
+        raise NotImplementedError
+
+    def retry(self, task):
+        """Store the `task` queued again after a failure, with its new retries
+        count and due_at."""
+        raise NotImplementedError
+
+    def create_scheduled_tasks(self, scheduled_tasks):
+        """Create the tasks of the due `scheduled_tasks`, unless they were
+        already created (possibly by another consumer) or their overlap policy
+        prevents it."""
+        raise NotImplementedError
+
+    def purge(self, retention, archive=None, max_batches=None, using=None):
+        """Delete the finished tasks older than their retention, see
+        purge.purge_tasks(). Returns the number of deleted tasks."""
+        raise NotImplementedError
+
+    def update_stats(self, rows):
+        """Add the counts of the (unsaved) TaskStats `rows` to the execution
+        statistics, see stats.update_stats()."""
+        raise NotImplementedError
+
+    def heartbeat(self, worker):
+        """Store the last_heartbeat and the counters of the Worker `worker`,
+        registering it when it isn't (anymore), see workers.py."""
+        raise NotImplementedError
+
+    def unregister_worker(self, worker):
+        """Delete the `worker`."""
+        raise NotImplementedError
+
+    def prune_workers(self, timeout):
+        """Delete the workers whose last heartbeat is older than the `timeout`
+        timedelta. Returns the number of deleted workers."""
+        raise NotImplementedError
+
+    def lock(self, name, wait=True, using=None):
+        """Return a context manager holding the lock `name`, shared by all the
+        consumers, and yielding whether it was acquired."""
+        raise NotImplementedError
+
+    def execution_context(self):
+        """Return the context manager in which the task functions run."""
+        return nullcontext()
+
+
+class _ProcessLocks:
+    """Named locks only shared by the threads of the current process."""
+
+    def __init__(self):
+        self._locks = defaultdict(threading.Lock)
+        self._guard = threading.Lock()
+
+    @contextmanager
+    def __call__(self, name, wait=True):
+        with self._guard:
+            lock = self._locks[name]
+
+        acquired = lock.acquire(blocking=wait)
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                lock.release()
+
+
+class DatabaseBackend(Backend):
+    """Store the tasks in the Task tables of the databases of
+    settings.TASKQ["databases"]."""
+
+    def enqueue(self, task):
+        task.save(using=db_for_task_name(task.name))
+
+    def bulk_enqueue(self, tasks):
+        bulk_create_tasks(tasks)
+
+    def claim(self, shards=None, databases=None):
+        due_tasks = []
+        for using in databases or [None]:
+            with transaction.atomic(using=using):
+                for task_model in TASK_MODELS:
+                    due_tasks += self._claim_due_tasks(
+                        task_model.objects.db_manager(using), shards
+                    )
+        return due_tasks
+
+    def _claim_due_tasks(self, task_manager, shards):
+        due_tasks_qs = task_manager.filter(
+            Q(status=Task.STATUS_QUEUED), due_at__lte=timezone.now()
+        )
+
+        if shards is None:
+            return self._claim_tasks(due_tasks_qs)
+
+        # Claim the tasks of the preferred shards first, so that the consumers
+        # don't skip over each other's locked rows. Only steal the tasks of the
+        # other shards (and the tasks created before sharding was enabled)
+        # when there are none.
+        due_tasks = self._claim_tasks(due_tasks_qs.filter(shard__in=shards))
+        if not due_tasks:
+            due_tasks = self._claim_tasks(
+                due_tasks_qs.filter(Q(shard__isnull=True) | ~Q(shard__in=shards))
+            )
+        return due_tasks
+
+    def _claim_tasks(self, due_tasks_qs):
+        """Mark the tasks of `due_tasks_qs` not claimed by another consumer as
+        fetched and return them."""
+        raise NotImplementedError
+
+    def start(self, task):
+        task.save(update_fields=["status", "started_at", "worker"])
+
+    def ack(self, task):
+        # The task function_args are never saved back: they may have been
+        # modified by the task function.
+        task.save(update_fields=["status", "retries", "due_at", "finished_at"])
+
+    def retry(self, task):
+        task.save(update_fields=["status", "retries", "due_at"])
+
+    def create_scheduled_tasks(self, scheduled_tasks):
+        lock = self.lock("taskq_create_scheduled_tasks")
+        with timed_enter(lock, "schedule_lock_wait"):
+            scheduled_tasks_by_database = defaultdict(list)
+            for scheduled_task in scheduled_tasks:
+                scheduled_tasks_by_database[scheduled_task.database].append(
+                    scheduled_task
+                )
+
+            for using, scheduled_tasks in scheduled_tasks_by_database.items():
+                self._create_scheduled_tasks(scheduled_tasks, using)
+
+    def _create_scheduled_tasks(self, scheduled_tasks, using):
+        """Create the tasks of the due scheduled tasks stored in the `using`
+        database."""
+        scheduled_tasks = self._exclude_already_created_tasks(scheduled_tasks, using)
+
+        checked_names = [
+            t.name for t in scheduled_tasks if t.overlap != ScheduledTask.OVERLAP_QUEUE
+        ]
+        active_names = set()
+        if checked_names:
+            # A single query finds the scheduled tasks with an active task
+            active_names = set(
+                Task.objects.using(using)
+                .filter(name__in=checked_names, status__in=Task.ACTIVE_STATUSES)
+                .values_list("name", flat=True)
+                .distinct()
+            )
+        scheduled_tasks, replaced_names = apply_overlap_policies(
+            scheduled_tasks, active_names
+        )
+
+        with transaction.atomic(using=using):
+            if replaced_names:
+                Task.objects.using(using).filter(
+                    name__in=replaced_names, status=Task.STATUS_QUEUED
+                ).update(status=Task.STATUS_CANCELED)
+
+            Task.objects.using(using).bulk_create(
+                [
+                    scheduled_task.as_task
+                    for scheduled_task in scheduled_tasks
+                    if not scheduled_task.is_fanout
+                ]
+            )
+
+        for scheduled_task in scheduled_tasks:
+            if scheduled_task.is_fanout:
+                self._create_fanout_tasks(scheduled_task, using)
+
+    def _exclude_already_created_tasks(self, scheduled_tasks, using):
+        """Filter out the scheduled tasks for which a Task was already created
+        (possibly by another consumer) for their current due date.
+        """
+        existing = set(
+            Task.objects.using(using)
+            .filter(
+                name__in=[t.name for t in scheduled_tasks],
+                due_at__in=[t.due_at for t in scheduled_tasks],
+            )
+            .values_list("name", "due_at")
+        )
+        return [t for t in scheduled_tasks if (t.name, t.due_at) not in existing]
+
+    def _create_fanout_tasks(self, scheduled_task, using):
+        """Stream the tasks generated by a fan-out scheduled task into chunked
+        bulk inserts.
+
+        The tasks are created in a single transaction: if the generator
+        function fails, none of its tasks are created.
+        """
+        created_count = 0
+        try:
+            with transaction.atomic(using=using):
+                generated_tasks = scheduled_task.generate_tasks()
+                for chunk in chunks(generated_tasks, scheduled_task.chunk_size):
+                    Task.objects.using(using).bulk_create(chunk)
+                    created_count += len(chunk)
+        except Exception as e:
+            logger.exception("%s : Fan-out failed: %s", scheduled_task.name, e)
+            return
+
+        logger.info("%s : %s tasks created", scheduled_task.name, created_count)
+
+    def purge(self, retention, archive=None, max_batches=None, using=None):
+        purge_stats(using=using)
+        return purge_tasks(
+            retention,
+            archive=archive,
+            max_batches=max_batches,
+            using=using or DEFAULT_DB_ALIAS,
+        )
+
+    def update_stats(self, rows):
+        update_stats(rows)
+
+    def heartbeat(self, worker):
+        heartbeat(worker)
+
+    def unregister_worker(self, worker):
+        unregister_worker(worker)
+
+    def prune_workers(self, timeout):
+        return prune_workers(timeout)
+
+    def execution_context(self):
+        return transaction.atomic()
+
+
+class PostgresBackend(DatabaseBackend):
+    """Claim the tasks with SELECT ... FOR UPDATE SKIP LOCKED and synchronize
+    the consumers with advisory locks."""
+
+    def _claim_tasks(self, due_tasks_qs):
+        # The selected rows are locked until the end of the transaction, the
+        # other consumers skip them.
+        due_tasks = list(due_tasks_qs.select_for_update(skip_locked=True))
+        for task in due_tasks:
+            task.status = Task.STATUS_FETCHED
+
+        due_tasks_qs.model.objects.using(due_tasks_qs.db).bulk_update(
+            due_tasks, fields=["status"]
+        )
+        return due_tasks
+
+    def lock(self, name, wait=True, using=None):
+        # https://www.postgresql.org/docs/11/explicit-locking.html#ADVISORY-LOCKS
+        return advisory_lock(name, wait=wait, using=using)
+
+
+class SQLiteBackend(DatabaseBackend):
+    """Store the tasks in a SQLite database, for development.
+
+    The locks are only shared by the consumers running in the same process.
+    """
+
+    def __init__(self):
+        self._locks = _ProcessLocks()
+
+    def _claim_tasks(self, due_tasks_qs):
+        # SQLite has no SELECT ... FOR UPDATE: each task is claimed with a
+        # conditional UPDATE, which only succeeds for a single consumer.
+        task_manager = due_tasks_qs.model.objects.using(due_tasks_qs.db)
+        claimed_ids = [
+            pk
+            for pk in due_tasks_qs.values_list("pk", flat=True)
+            if task_manager.filter(pk=pk, status=Task.STATUS_QUEUED).update(
+                status=Task.STATUS_FETCHED
+            )
+        ]
+        return list(task_manager.filter(pk__in=claimed_ids))
+
+    def lock(self, name, wait=True, using=None):
+        return self._locks(name, wait=wait)
+
+
+class MemoryBackend(Backend):
+    """Keep the tasks in memory, for tests: no database is involved.
+
+    The tasks are only shared by the producers and consumers of the current
+    process. With `eager`, the tasks are executed as soon as they are enqueued
+    (regardless of their due_at), and the exceptions of the task functions are
+    raised to the caller.
+    """
+
+    # The tasks are kept in memory: offloading their args is pointless
+    offloads_payloads = False
+
+    def __init__(self, eager=False):
+        self.eager = eager
+        self._tasks = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.RLock()
+        self._locks = _ProcessLocks()
+        # The TaskStats written by the consumers
+        self.stats = []
+        # The registered Workers, by uuid
+        self.workers = {}
+
+    @property
+    def tasks(self):
+        """The stored tasks, in their creation order."""
+        with self._lock:
+            return list(self._tasks.values())
+
+    def clear(self):
+        with self._lock:
+            self._tasks.clear()
+            self.stats.clear()
+            self.workers.clear()
+
+    def enqueue(self, task):
+        # Round-trip the function args through the codec, as a database would
+        codec = get_codec()
+        task.function_args = codec.loads(codec.dumps(task.function_args))
+
+        with self._lock:
+            task.pk = next(self._ids)
+            self._tasks[task.pk] = task
+
+        if self.eager:
+            self._execute(task)
+
+    def bulk_enqueue(self, tasks):
+        for task in tasks:
+            self.enqueue(task)
+
+    def _execute(self, task):
+        task.status = Task.STATUS_RUNNING
+        task.started_at = timezone.now()
+        try:
+            task.execute()
+        except Cancel:
+            task.status = Task.STATUS_CANCELED
+        except Exception:
+            task.status = Task.STATUS_FAILED
+            raise
+        else:
+            task.status = Task.STATUS_SUCCESS
+        finally:
+            task.finished_at = timezone.now()
+
+    def claim(self, shards=None, databases=None):
+        now = timezone.now()
+        with self._lock:
+            due_tasks = [
+                task
+                for task in self._tasks.values()
+                if task.status == Task.STATUS_QUEUED and task.due_at <= now
+            ]
+            for task in due_tasks:
+                task.status = Task.STATUS_FETCHED
+        return due_tasks
+
+    def start(self, task):
+        pass
+
+    def ack(self, task):
+        pass
+
+    def retry(self, task):
+        pass
+
+    def create_scheduled_tasks(self, scheduled_tasks):
+        with self._lock:
+            existing = {(task.name, task.due_at) for task in self._tasks.values()}
+            scheduled_tasks = [
+                t for t in scheduled_tasks if (t.name, t.due_at) not in existing
+            ]
+            active_names = {
+                task.name
+                for task in self._tasks.values()
+                if task.status in Task.ACTIVE_STATUSES
+            }
+            scheduled_tasks, replaced_names = apply_overlap_policies(
+                scheduled_tasks, active_names
+            )
+            for task in self._tasks.values():
+                if task.name in replaced_names and task.status == Task.STATUS_QUEUED:
+                    task.status = Task.STATUS_CANCELED
+
+        for scheduled_task in scheduled_tasks:
+            if not scheduled_task.is_fanout:
+                self.enqueue(scheduled_task.as_task)
+                continue
+
+            try:
+                generated_tasks = list(scheduled_task.generate_tasks())
+            except Exception as e:
+                logger.exception("%s : Fan-out failed: %s", scheduled_task.name, e)
+                continue
+            self.bulk_enqueue(generated_tasks)
+            logger.info(
+                "%s : %s tasks created", scheduled_task.name, len(generated_tasks)
+            )
+
+    def purge(self, retention, archive=None, max_batches=None, using=None):
+        now = timezone.now()
+        with self._lock:
+            expired = [
+                task
+                for task in self._tasks.values()
+                if task.status in retention
+                and task.due_at < now - retention[task.status]
+            ]
+            for task in expired:
+                del self._tasks[task.pk]
+        return len(expired)
+
+    def update_stats(self, rows):
+        with self._lock:
+            self.stats.extend(rows)
+
+    def heartbeat(self, worker):
+        worker.last_heartbeat = timezone.now()
+        with self._lock:
+            self.workers[worker.uuid] = worker
+
+    def unregister_worker(self, worker):
+        with self._lock:
+            self.workers.pop(worker.uuid, None)
+
+    def prune_workers(self, timeout):
+        now = timezone.now()
+        with self._lock:
+            dead = [
+                uuid
+                for uuid, worker in self.workers.items()
+                if worker.last_heartbeat < now - timeout
+            ]
+            for uuid in dead:
+                del self.workers[uuid]
+        return len(dead)
+
+    def lock(self, name, wait=True, using=None):
+        return self._locks(name, wait=wait)
+
+
+@cached_setting
+def get_backend():
+    """Return the backend configured with settings.TASKQ["backend"] and
+    settings.TASKQ["backend_options"] (cached).
+
+    Defaults to PostgresBackend.
+    """
+    taskq_config = getattr(settings, "TASKQ", {})
+    backend_cls_str = taskq_config.get("backend", "taskq.backends.PostgresBackend")
+    options = taskq_config.get("backend_options", {})
+    return import_string(backend_cls_str)(**options)
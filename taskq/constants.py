@@ -3,3 +3,20 @@ import datetime
 TASKQ_DEFAULT_CONSUMER_SLEEP_RATE = 10  # In seconds
 
 TASKQ_DEFAULT_TASK_TIMEOUT = datetime.timedelta(minutes=5)
+
+TASKQ_DEFAULT_PURGE_BATCH_SIZE = 1000
+
+# Maximum number of batches deleted by each purge of the consumer run loop
+TASKQ_DEFAULT_CONSUMER_PURGE_MAX_BATCHES = 10
+
+# Maximum number of tasks submitted by each request to the ingestion view
+TASKQ_DEFAULT_INGEST_MAX_TASKS = 1000
+
+# Retention of the rows of the TaskStats table
+TASKQ_DEFAULT_STATS_RETENTION = datetime.timedelta(days=30)
+
+# The workers whose last heartbeat is older are considered dead
+TASKQ_DEFAULT_WORKER_TIMEOUT = datetime.timedelta(minutes=15)
+
+# Maximum number of rows scanned by each count of the taskqtop command
+TASKQ_DEFAULT_ESTIMATE_LIMIT = 10000
@@ -1,28 +1,59 @@
 import logging
 import threading
-from time import sleep
+from contextlib import nullcontext
+from time import perf_counter, sleep
 
 import timeout_decorator
 from django.conf import settings
-from django.db import transaction, DatabaseError
-from django.db.models import Q
+from django.db import DatabaseError
 from django.utils import timezone
-from django_pglocks import advisory_lock
-
-from .constants import TASKQ_DEFAULT_CONSUMER_SLEEP_RATE, TASKQ_DEFAULT_TASK_TIMEOUT
-from .exceptions import Cancel, TaskFatalError
+from django.utils.module_loading import import_string
+
+from .backends import get_backend
+from .constants import (
+    TASKQ_DEFAULT_CONSUMER_PURGE_MAX_BATCHES,
+    TASKQ_DEFAULT_CONSUMER_SLEEP_RATE,
+    TASKQ_DEFAULT_TASK_TIMEOUT,
+)
+from .exceptions import Cancel, TaskFatalError, TaskLoadingError
+from .metrics import get_metrics
 from .models import Task
+from .profiling import get_profiling_config
+from .purge import TaskArchive, get_retention
+from .registry import registry
+from .routing import get_consumer_databases
 from .scheduler import Scheduler
-from .utils import traceback_filter_taskq_frames, ordinal
+from .sharding import get_preferred_shards
+from .stats import (
+    ResourceUsage,
+    StatsBuffer,
+    resource_accounting_enabled,
+    stats_enabled,
+)
+from .timings import IterationTimings, phase, timed_enter
+from .tracing import get_tracer
+from .utils import parse_timedelta, traceback_filter_taskq_frames, ordinal
+from .workers import get_worker_timeout, new_worker
 
 logger = logging.getLogger("taskq")
 
+OUTCOME_METRICS = {
+    Task.STATUS_SUCCESS: "taskq_tasks_succeeded_total",
+    Task.STATUS_FAILED: "taskq_tasks_failed_total",
+    Task.STATUS_CANCELED: "taskq_tasks_canceled_total",
+    Task.STATUS_QUEUED: "taskq_tasks_retried_total",
+}
+
 
 class Consumer:
     """Collect and executes tasks when they are due."""
 
     def __init__(
-        self, sleep_rate=TASKQ_DEFAULT_CONSUMER_SLEEP_RATE, execute_tasks_barrier=None
+        self,
+        sleep_rate=TASKQ_DEFAULT_CONSUMER_SLEEP_RATE,
+        execute_tasks_barrier=None,
+        shards=None,
+        databases=None,
     ):
         """Create a new Consumer.
 
@@ -31,16 +62,40 @@ class Consumer:
         :param execute_tasks_barrier: Install the passed barrier in the
         `execute_tasks_barrier` method to test its thread-safety. DO NOT USE
         IN PRODUCTION.
+        :param shards: The shards this consumer claims its tasks from first
+        when settings.TASKQ["shards"] is set (default: a random shard).
+        :param databases: The aliases of the databases this consumer claims its
+        tasks from (default: all the databases of settings.TASKQ["databases"]).
         """
         super().__init__()
         self._should_stop = threading.Event()
         self._scheduler = Scheduler()
-        self._fetched_tasks_count_above_error_threshold_counter = 0
+        self._oldest_due_task_age_above_threshold_counter = 0
+        self._last_purge_at = None
+        self._last_prune_at = None
+        # The Worker registered while the run loop runs, see workers.py
+        self._worker = None
+        self._shards = get_preferred_shards(shards)
+        self._databases = get_consumer_databases(databases)
+        self._backend = get_backend()
+        self._metrics = get_metrics()
+        self._tracer = get_tracer()
+        self._stats = StatsBuffer() if stats_enabled() else None
+        self._resource_accounting = (
+            self._stats is not None and resource_accounting_enabled()
+        )
+        # Called with (consumer, timings) after each iteration of the run loop
+        self.iteration_hooks = [
+            import_string(hook)
+            for hook in getattr(settings, "TASKQ", {}).get("iteration_hooks", [])
+        ]
 
         # Test parameters
         self._sleep_rate = sleep_rate
         self._execute_tasks_barrier = execute_tasks_barrier
 
+        self.warm_up()
+
     def stop(self):
         logger.info(
             "Consumer was asked to quit. " "Terminating process in less than %ss.",
@@ -55,12 +110,132 @@ class Consumer:
     def run(self):
         """The main entry point to start the consumer run loop."""
         logger.info("Consumer started.")
+        self._metrics.start()
 
-        while not self.stopped:
-            self.create_scheduled_tasks()
+        try:
+            while not self.stopped:
+                if self._worker is None:
+                    self.register_worker()
+                self.run_iteration()
+        finally:
+            self.unregister_worker()
+
+    def run_iteration(self):
+        """Run an iteration of the run loop, and report the timings of its
+        phases (see timings.py)."""
+        timings = IterationTimings()
+        with timings.activate():
+            with phase("schedule"):
+                self.create_scheduled_tasks()
             self.execute_tasks()
+            with phase("purge"):
+                self.purge_tasks()
+            with phase("stats"):
+                self.write_stats()
+            with phase("sleep"):
+                sleep(self._sleep_rate)
+
+        self._report_iteration(timings)
+        self.heartbeat(timings)
+        return timings
+
+    def _report_iteration(self, timings):
+        self._metrics.observe("taskq_loop_duration_seconds", timings.duration)
+        for name, seconds in timings.phases.items():
+            self._metrics.observe(
+                "taskq_loop_phase_duration_seconds", seconds, phase=name
+            )
+
+        threshold = getattr(settings, "TASKQ", {}).get("slow_iteration_threshold")
+        if (
+            threshold is not None
+            and timings.duration > parse_timedelta(threshold).total_seconds()
+        ):
+            logger.warning(
+                "Slow iteration: %s", timings, extra={"phases": timings.phases}
+            )
+
+        for hook in self.iteration_hooks:
+            try:
+                hook(self, timings)
+            except Exception:
+                logger.exception("Iteration hook %s failed", hook)
+
+    def register_worker(self):
+        """Create the Worker of this consumer, registered in the Worker table
+        by the first iteration of the run loop before it claims any task, see
+        workers.py."""
+        self._worker = new_worker(self._databases, self._shards)
+
+    def unregister_worker(self):
+        if self._worker is None:
+            return
+
+        try:
+            self._backend.unregister_worker(self._worker)
+        except DatabaseError:
+            logger.exception("Couldn't unregister the worker")
+        self._worker = None
+
+    def heartbeat(self, timings):
+        """Store the heartbeat of the worker with the fraction of the iteration
+        spent executing tasks, and prune the dead workers at most once per
+        worker timeout."""
+        if self._worker is None:
+            return
+
+        total = timings.duration + timings.phases.get("sleep", 0)
+        if total:
+            self._worker.busy_ratio = timings.phases.get("process", 0) / total
+        if not self._store_heartbeat():
+            return
+
+        now = timezone.now()
+        if self._last_prune_at is None or (
+            now - self._last_prune_at >= get_worker_timeout()
+        ):
+            self.prune_workers()
+
+    def _store_heartbeat(self):
+        """Store the heartbeat of the worker, returns whether it succeeded."""
+        try:
+            self._backend.heartbeat(self._worker)
+        except DatabaseError:
+            logger.exception("Couldn't store the worker heartbeat")
+            return False
+        return True
+
+    def prune_workers(self):
+        self._last_prune_at = timezone.now()
+        try:
+            deleted_count = self._backend.prune_workers(get_worker_timeout())
+        except DatabaseError:
+            logger.exception("Couldn't prune the dead workers")
+            return
+        if deleted_count:
+            logger.warning("%s dead workers pruned", deleted_count)
+
+    def warm_up(self):
+        """Register all the @taskified functions of the project before
+        claiming any task, and report the scheduled tasks referencing an
+        unknown function.
+
+        Raises a ValueError when settings.TASKQ["profiling"] is invalid, rather
+        than failing each task the profiler would be set up for.
+        """
+        registry.autodiscover()
+        get_profiling_config()
 
-            sleep(self._sleep_rate)
+        for scheduled_task in self._scheduler.tasks:
+            try:
+                Task.import_taskified_function(scheduled_task.function_name)
+            except TaskLoadingError as e:
+                logger.error(
+                    "%s : Cannot load scheduled task function %s: %s",
+                    scheduled_task.name,
+                    scheduled_task.function_name,
+                    e,
+                )
 
     def create_scheduled_tasks(self):
         """Register new tasks for each scheduled (recurring) tasks defined in
@@ -71,21 +246,64 @@ class Consumer:
         if not due_tasks:
             return
 
-        # Multiple instances of taskq rely on an advisory lock.
-        # This lock is self-exclusive so that only one session can hold it at a time.
-        # https://www.postgresql.org/docs/11/explicit-locking.html#ADVISORY-LOCKS
-        with advisory_lock("taskq_create_scheduled_tasks"):
-            for scheduled_task in due_tasks:
-                task_exists = Task.objects.filter(
-                    name=scheduled_task.name, due_at=scheduled_task.due_at
-                ).exists()
+        self._backend.create_scheduled_tasks(due_tasks)
 
-                if task_exists:
-                    continue
+        self._scheduler.update_all_tasks_due_dates()
 
-                scheduled_task.create_task()
+    def purge_tasks(self):
+        """Delete the finished tasks older than their retention, at most once
+        every settings.TASKQ["purge_interval"] (disabled by default).
 
-        self._scheduler.update_all_tasks_due_dates()
+        Each purge deletes a limited number of batches so that it doesn't delay
+        the execution of the tasks for too long.
+        """
+        taskq_config = getattr(settings, "TASKQ", {})
+        interval = taskq_config.get("purge_interval")
+        if interval is None:
+            return
+
+        now = timezone.now()
+        if self._last_purge_at and now - self._last_purge_at < parse_timedelta(
+            interval
+        ):
+            return
+        self._last_purge_at = now
+
+        archive_dir = taskq_config.get("purge_archive_dir")
+        archive = TaskArchive(archive_dir) if archive_dir else None
+        try:
+            for using in self._databases:
+                # Only one consumer purges the tasks of a database at a time,
+                # the others skip it.
+                lock = self._backend.lock("taskq_purge_tasks", wait=False, using=using)
+                with timed_enter(lock, "purge_lock_wait") as acquired:
+                    if not acquired:
+                        continue
+
+                    self._backend.purge(
+                        get_retention(),
+                        archive=archive,
+                        max_batches=TASKQ_DEFAULT_CONSUMER_PURGE_MAX_BATCHES,
+                        using=using,
+                    )
+        finally:
+            if archive is not None:
+                archive.close()
+
+    def write_stats(self):
+        """Write the statistics of the tasks executed since the last call, see
+        stats.py."""
+        if self._stats is None:
+            return
+
+        rows = self._stats.pop()
+        if not rows:
+            return
+
+        try:
+            self._backend.update_stats(rows)
+        except DatabaseError:
+            logger.exception("Couldn't write the tasks statistics")
 
     def execute_tasks(self):
         due_tasks = self.fetch_due_tasks()
@@ -95,54 +313,65 @@ class Consumer:
         if self._execute_tasks_barrier is not None:
             self._execute_tasks_barrier.wait()
 
-        self.process_tasks(due_tasks)
+        with phase("process"):
+            self.process_tasks(due_tasks)
 
     def fetch_due_tasks(self):
-        # Multiple instances of taskq rely on select_for_update().
-        # This mechanism will lock selected rows until the end of the transaction.
-
-        with transaction.atomic():
-            due_tasks_qs = Task.objects.filter(
-                Q(status=Task.STATUS_QUEUED), due_at__lte=timezone.now()
-            ).select_for_update(skip_locked=True)
+        if self._worker is not None and self._worker.pk is None:
+            # The started tasks reference the worker: register it first
+            self._store_heartbeat()
 
-            due_tasks = list(due_tasks_qs)
-            for task in due_tasks:
-                task.status = Task.STATUS_FETCHED
+        with phase("claim"), self._metrics.timer("taskq_claim_duration_seconds"):
+            due_tasks = self._backend.claim(
+                shards=self._shards, databases=self._databases
+            )
 
-            Task.objects.bulk_update(due_tasks, fields=["status"])
+        for task in due_tasks:
+            self._metrics.increment(
+                "taskq_tasks_fetched_total", function=task.function_name
+            )
 
-        self._log_fetched_tasks_count(len(due_tasks))
+        self._log_fetched_tasks(due_tasks)
 
         return due_tasks
 
-    def _log_fetched_tasks_count(self, task_count):
-        if task_count:
-            logger.info(f"{task_count} tasks fetched")
+    def _log_fetched_tasks(self, due_tasks):
+        if due_tasks:
+            logger.info(f"{len(due_tasks)} tasks fetched")
+        else:
+            # The consumer caught up with the due tasks
+            self._oldest_due_task_age_above_threshold_counter = 0
 
-        log_threshold = getattr(
-            settings, "TASKQ_FETCHED_TASKS_COUNT_LOGGED_AS_ERROR_THRESHOLD", None
-        )
-        if log_threshold and task_count >= log_threshold:
-            self._fetched_tasks_count_above_error_threshold_counter += 1
-            counter_trigger = getattr(
-                settings,
-                "TASKQ_FETCHED_TASKS_COUNT_ABOVE_ERROR_THRESHOLD_COUNTER_TRIGGER",
-                1,
+    def _check_due_task_age(self, task):
+        """Log an error when the tasks are started more than
+        settings.TASKQ["oldest_due_task_age_threshold"] after their due date,
+        for settings.TASKQ["oldest_due_task_age_trigger"] consecutive tasks.
+
+        The age is measured when each task starts, rather than when the tasks
+        are claimed: the tasks waiting behind a long batch claimed by the
+        consumer are measured too.
+        """
+        taskq_config = getattr(settings, "TASKQ", {})
+        threshold = taskq_config.get("oldest_due_task_age_threshold")
+        if threshold is None:
+            return
+
+        age = task.started_at - task.due_at
+        if age <= parse_timedelta(threshold):
+            self._oldest_due_task_age_above_threshold_counter = 0
+            return
+
+        self._oldest_due_task_age_above_threshold_counter += 1
+        counter_trigger = taskq_config.get("oldest_due_task_age_trigger", 1)
+        if self._oldest_due_task_age_above_threshold_counter >= counter_trigger:
+            logger.error(
+                f"task started more than {parse_timedelta(threshold)} after its due date",
+                extra={
+                    "task": str(task),
+                    "oldest due task age": age.total_seconds(),
+                    "age above threshold counter": self._oldest_due_task_age_above_threshold_counter,
+                },
             )
-            if (
-                self._fetched_tasks_count_above_error_threshold_counter
-                >= counter_trigger
-            ):
-                logger.error(
-                    f"more than {log_threshold} tasks fetched",
-                    extra={
-                        "task count": task_count,
-                        "task count above threshold counter": self._fetched_tasks_count_above_error_threshold_counter,
-                    },
-                )
-        else:
-            self._fetched_tasks_count_above_error_threshold_counter = 0
 
     def process_tasks(self, due_tasks):
         for due_task in due_tasks:
@@ -163,13 +392,34 @@ class Consumer:
             nth = ordinal(task.retries)
             logger.info("%s : Started (%s retry)", task, nth)
 
+        usage = ResourceUsage() if self._resource_accounting else None
+
         def _execute_task():
-            with transaction.atomic():
-                task.execute()
+            with self._backend.execution_context(), usage or nullcontext():
+                with self._tracer.span("taskq.execute", task):
+                    task.execute()
 
+        metrics = self._metrics
+        function = task.function_name
         try:
             task.status = Task.STATUS_RUNNING
-            task.save()
+            task.started_at = timezone.now()
+            task.worker = None
+            if self._worker is not None:
+                # The tasks of a batch run one after the other: a heartbeat
+                # at each start keeps a busy worker from being pruned.
+                self._store_heartbeat()
+                task.worker = self._worker.uuid
+            self._backend.start(task)
+            metrics.increment("taskq_tasks_started_total", function=function)
+            self._check_due_task_age(task)
+            self._tracer.record_span(
+                "taskq.queue_wait",
+                task,
+                max(task.created_at or task.due_at, task.due_at),
+                task.started_at,
+            )
+            started_at = perf_counter()
 
             try:
                 if timeout.total_seconds():
@@ -188,6 +438,7 @@ class Consumer:
                 task.status = Task.STATUS_CANCELED
             except timeout_decorator.TimeoutError as e:
                 logger.info("%s : Timed out", task)
+                metrics.increment("taskq_tasks_timed_out_total", function=function)
                 self.fail_task(task, e)
             except Exception as e:
                 if task.retries < task.max_retries:
@@ -200,7 +451,24 @@ class Consumer:
                 logger.info("%s : Success", task)
                 task.status = Task.STATUS_SUCCESS
             finally:
-                task.save()
+                duration = perf_counter() - started_at
+                metrics.observe(
+                    "taskq_task_duration_seconds", duration, function=function
+                )
+                # The task is still running when a BaseException (e.g.
+                # KeyboardInterrupt) escaped its function
+                outcome = OUTCOME_METRICS.get(task.status)
+                if outcome is not None:
+                    metrics.increment(outcome, function=function)
+                    if self._stats is not None:
+                        self._stats.record(task, duration, usage)
+                if self._worker is not None:
+                    self._worker.tasks_processed += 1
+                if task.status == Task.STATUS_QUEUED:
+                    self._backend.retry(task)
+                else:
+                    task.finished_at = timezone.now()
+                    self._backend.ack(task)
         except DatabaseError:
             logger.error("%s : DB error, couldn't update task status", task)
 
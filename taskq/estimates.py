@@ -0,0 +1,199 @@
+"""Cheap estimates of the content of the task tables, for the taskqtop
+command.
+
+Counting the rows of a large task table is a sequential scan. Instead:
+
+- the active (queued, fetched, running) tasks are counted with the status
+  indexes, scanning at most `limit` rows,
+- the other counts come from the planner statistics of PostgreSQL: the number
+  of rows of the table (and of its partitions) in pg_class.reltuples and the
+  frequency of each status in pg_stats, refreshed by ANALYZE (autovacuum).
+  The active counts above `limit` are estimated the same way,
+- the queued tasks of each function are counted in the first `limit` queued
+  tasks, and extrapolated to all of them,
+- the oldest due task is looked up in each shard through the claim index,
+- the throughput comes from the TaskStats table (see stats.py).
+
+Without planner statistics (on the other databases, or before the table was
+first analyzed), all the statuses are counted up to `limit` rows.
+"""
+
+import datetime
+from collections import Counter, namedtuple
+
+from django.db import connections
+from django.db.models import Sum
+from django.utils import timezone
+
+from .constants import TASKQ_DEFAULT_ESTIMATE_LIMIT
+from .models import TASK_MODELS, Task, TaskStats
+from .routing import get_databases
+from .sharding import get_shard_count
+
+
+class Count(namedtuple("Count", ["value", "exact"])):
+    """A row count, either exact or estimated."""
+
+    def __add__(self, other):
+        return Count(self.value + other.value, self.exact and other.exact)
+
+    def __str__(self):
+        value = self.value
+        for unit in ("", "k", "M"):
+            if value < 1000:
+                break
+            value /= 1000
+        else:
+            unit = "G"
+        prefix = "" if self.exact else "~"
+        if unit:
+            return f"{prefix}{value:.1f}{unit}"
+        return f"{prefix}{value:.0f}"
+
+
+ZERO = Count(0, True)
+
+
+class Snapshot:
+    """The estimated counts of the tasks of all the task tables and databases:
+
+    - total: the Count of all the tasks,
+    - statuses: the Count of the tasks of each status,
+    - functions: the Count of the queued tasks of each function,
+    - oldest_due_age: the age of the oldest due queued task (or None),
+    - executions: the executions of each function per minute, over the last
+      `window` minutes (empty when the statistics are disabled),
+    - throughput: the executed tasks per second over the same window.
+    """
+
+    def __init__(self, limit=TASKQ_DEFAULT_ESTIMATE_LIMIT, window=5):
+        self.taken_at = timezone.now()
+        self.total = ZERO
+        self.statuses = {status: ZERO for status, _ in Task.STATUS_CHOICES}
+        self.functions = {}
+        self.oldest_due_age = None
+
+        for using in get_databases():
+            for task_model in TASK_MODELS:
+                self._add_table(task_model.objects.using(using), limit)
+
+        self._add_executions(window)
+
+    def _add_table(self, tasks, limit):
+        connection = connections[tasks.db]
+        row_count, frequencies = None, {}
+        if connection.vendor == "postgresql":
+            db_table = tasks.model._meta.db_table
+            row_count = _estimated_row_count(connection, db_table)
+            if row_count is not None:
+                frequencies = _status_frequencies(connection, db_table)
+
+        statuses = {}
+        for status, _ in Task.STATUS_CHOICES:
+            count = None
+            if status in Task.ACTIVE_STATUSES or status not in frequencies:
+                count = _capped_count(tasks.filter(status=status), limit)
+            if (count is None or not count.exact) and status in frequencies:
+                count = Count(round(frequencies[status] * row_count.value), False)
+            statuses[status] = count
+            self.statuses[status] += count
+        if row_count is None:
+            row_count = sum(statuses.values(), ZERO)
+        self.total += row_count
+
+        queued = tasks.filter(status=Task.STATUS_QUEUED)
+        names = Counter(queued.values_list("function_name", flat=True)[:limit])
+        sampled = sum(names.values())
+        queued_count = statuses[Task.STATUS_QUEUED]
+        for name, count in names.items():
+            if queued_count.exact:
+                function_count = Count(count, True)
+            else:
+                # Only the first `limit` queued tasks were counted
+                function_count = Count(
+                    round(count * queued_count.value / sampled), False
+                )
+            self.functions[name] = self.functions.get(name, ZERO) + function_count
+
+        oldest_due_at = _oldest_due_at(queued, self.taken_at)
+        if oldest_due_at is not None:
+            age = self.taken_at - oldest_due_at
+            self.oldest_due_age = max(self.oldest_due_age or age, age)
+
+    def _add_executions(self, window):
+        until = self.taken_at.replace(second=0, microsecond=0)
+        since = until - datetime.timedelta(minutes=window)
+        rows = (
+            TaskStats.objects.filter(minute__gte=since, minute__lt=until)
+            .values("function_name")
+            .order_by("function_name")
+            .annotate(executions=Sum("executions"))
+        )
+        self.executions = {
+            row["function_name"]: row["executions"] / window for row in rows
+        }
+        self.throughput = sum(self.executions.values()) / 60
+
+
+def _capped_count(tasks, limit):
+    """Count the tasks, scanning at most `limit` + 1 rows: the Count is not
+    exact when there are more."""
+    count = tasks[: limit + 1].count()
+    return Count(count, count <= limit)
+
+
+def _oldest_due_at(queued, now):
+    """Return the due date of the oldest due task of `queued`, or None.
+
+    Ordering all the queued tasks by due date would scan them: the claim
+    index (status, shard, due_at) is only ordered by due date within a shard.
+    Each shard (and the tasks without one) is looked up through it instead,
+    reading a single index entry each. The tasks left in shards beyond
+    settings.TASKQ["shards"] after it was lowered (or disabled) are ignored.
+    """
+    shard_count = get_shard_count() or 0
+    oldest_due_at = None
+    for shard in [None, *range(shard_count)]:
+        due_at = (
+            queued.filter(shard=shard, due_at__lte=now)
+            .order_by("due_at")
+            .values_list("due_at", flat=True)
+            .first()
+        )
+        if due_at is not None:
+            oldest_due_at = min(oldest_due_at or due_at, due_at)
+    return oldest_due_at
+
+
+def _estimated_row_count(connection, db_table):
+    """Return the Count of the rows of the table and of its partitions from
+    pg_class.reltuples, or None when they were never analyzed."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT SUM(reltuples) FILTER (WHERE reltuples >= 0) FROM pg_class "
+            "WHERE oid = %s::regclass OR oid IN ("
+            "  SELECT inhrelid FROM pg_inherits WHERE inhparent = %s::regclass"
+            ")",
+            [db_table, db_table],
+        )
+        (reltuples,) = cursor.fetchone()
+    if reltuples is None:
+        return None
+    return Count(round(reltuples), False)
+
+
+def _status_frequencies(connection, db_table):
+    """Return the fraction of the rows of the table with each of the most
+    common statuses, from pg_stats."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT most_common_vals::text, most_common_freqs FROM pg_stats "
+            "WHERE schemaname = current_schema() AND tablename = %s "
+            "AND attname = 'status' ORDER BY inherited DESC LIMIT 1",
+            [db_table],
+        )
+        row = cursor.fetchone()
+    if row is None or row[0] is None:
+        return {}
+    values = [int(value) for value in row[0].strip("{}").split(",")]
+    return dict(zip(values, row[1]))
@@ -15,3 +15,11 @@ class TaskLoadingError(TaskFatalError):
 
     def __init__(self, exception):
         super().__init__(str(exception))
+
+
+class PayloadNotFoundError(TaskLoadingError):
+    """The offloaded function arguments of the task could not be found"""
+
+
+class InvalidTaskRecord(ValueError):
+    """A task record to import is invalid"""
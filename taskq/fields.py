@@ -0,0 +1,95 @@
+import threading
+import uuid
+
+from django.apps import apps
+from django.db import models
+
+
+class UUIDStringField(models.CharField):
+    """A CharField storing UUIDs as strings, which can also be used on a
+    native uuid column (see the taskqcompactstorage command)."""
+
+    def from_db_value(self, value, expression, connection):
+        if isinstance(value, uuid.UUID):
+            return str(value)
+        return value
+
+
+class FunctionNameCache:
+    """Map the function names to the ids of the TaskFunction lookup table, per
+    database, and remember which task tables use the compact layout in which
+    function_name holds these ids instead of the names."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        with self._lock:
+            self._compact = {}
+            self._ids = {}
+            self._names = {}
+
+    def is_compact(self, connection, db_table):
+        key = (connection.alias, db_table)
+        if key not in self._compact and connection.vendor != "postgresql":
+            self._compact[key] = False
+        if key not in self._compact:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT data_type FROM information_schema.columns "
+                    "WHERE table_name = %s AND column_name = %s",
+                    [db_table, "function_name"],
+                )
+                row = cursor.fetchone()
+            self._compact[key] = row is not None and row[0] == "smallint"
+        return self._compact[key]
+
+    def get_id(self, name, connection):
+        key = (connection.alias, name)
+        if key not in self._ids:
+            function_model = apps.get_model("taskq", "TaskFunction")
+            function, _ = function_model.objects.using(connection.alias).get_or_create(
+                name=name
+            )
+            self._remember(connection.alias, function.pk, name)
+        return self._ids[key]
+
+    def get_name(self, function_id, connection):
+        key = (connection.alias, function_id)
+        if key not in self._names:
+            function_model = apps.get_model("taskq", "TaskFunction")
+            name = (
+                function_model.objects.using(connection.alias)
+                .values_list("name", flat=True)
+                .get(pk=function_id)
+            )
+            self._remember(connection.alias, function_id, name)
+        return self._names[key]
+
+    def _remember(self, alias, function_id, name):
+        with self._lock:
+            self._ids[(alias, name)] = function_id
+            self._names[(alias, function_id)] = name
+
+
+function_names = FunctionNameCache()
+
+
+class FunctionNameField(models.CharField):
+    """A CharField storing the name of a function, which is transparently
+    stored as a TaskFunction id when the compact layout is used (see the
+    taskqcompactstorage command)."""
+
+    def from_db_value(self, value, expression, connection):
+        if isinstance(value, int):
+            return function_names.get_name(value, connection)
+        return value
+
+    def get_db_prep_value(self, value, connection, prepared=False):
+        value = super().get_db_prep_value(value, connection, prepared)
+        if value is not None and function_names.is_compact(
+            connection, self.model._meta.db_table
+        ):
+            return function_names.get_id(value, connection)
+        return value
@@ -0,0 +1,261 @@
+"""Bulk creation of tasks from plain records, produced outside of Django.
+
+A record is a dict with a "function_name" key (the name of a @taskified
+function) and optionally "args", "kwargs", "due_at" (ISO 8601), "name",
+"max_retries", "retry_delay", "retry_backoff", "retry_backoff_factor",
+"timeout" (in seconds), "uuid" and "trace_context" (see tracing.py).
+"""
+
+import datetime
+import io
+import math
+import uuid
+from collections import defaultdict
+
+from django.db import connections, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .exceptions import InvalidTaskRecord
+from .json import JSONEncoder
+from .payloads import get_payload_store
+from .registry import registry
+from .routing import db_for_task_name
+
+RECORD_OPTIONS = (
+    "due_at",
+    "max_retries",
+    "retry_delay",
+    "retry_backoff",
+    "retry_backoff_factor",
+    "timeout",
+    "args",
+    "kwargs",
+)
+
+
+def task_from_record(record):
+    """Return a new (unsaved) task built from `record`, or raise an
+    InvalidTaskRecord.
+
+    The function must be registered (see registry.autodiscover()): the records
+    never cause a module to be imported.
+    """
+    if not isinstance(record, dict):
+        raise InvalidTaskRecord("A task record must be an object")
+
+    unknown = set(record) - {
+        "function_name",
+        "name",
+        "uuid",
+        "trace_context",
+        *RECORD_OPTIONS,
+    }
+    if unknown:
+        unknown = ", ".join(sorted(map(str, unknown)))
+        raise InvalidTaskRecord(f"Unexpected fields: {unknown}")
+
+    function_name = record.get("function_name")
+    if not function_name or not isinstance(function_name, str):
+        raise InvalidTaskRecord("Missing function_name")
+
+    taskified_function = registry.get(function_name)
+    if taskified_function is None:
+        raise InvalidTaskRecord(f'Unknown function "{function_name}"')
+
+    if not isinstance(record.get("args", []), list):
+        raise InvalidTaskRecord("args must be a list")
+    if not isinstance(record.get("kwargs", {}), dict):
+        raise InvalidTaskRecord("kwargs must be an object")
+
+    options = {
+        key: value
+        for key, value in record.items()
+        if key in RECORD_OPTIONS and value is not None
+    }
+    if "due_at" in options:
+        options["due_at"] = _parse_due_at(options["due_at"])
+    _check_retry_options(options)
+    if record.get("name"):
+        # Set before the args are encoded: the name routes the task, and its
+        # offloaded args, to a database
+        options["name"] = str(record["name"])
+        if len(options["name"]) > 255:
+            raise InvalidTaskRecord("name is longer than 255 characters")
+
+    try:
+        task = taskified_function.new_task(**options)
+    except (TypeError, ValueError) as e:
+        raise InvalidTaskRecord(str(e))
+
+    if record.get("uuid"):
+        try:
+            task.uuid = str(uuid.UUID(str(record["uuid"])))
+        except ValueError:
+            raise InvalidTaskRecord(f'Invalid uuid "{record["uuid"]}"')
+    if record.get("trace_context"):
+        trace_context = str(record["trace_context"])
+        if len(trace_context) > 255:
+            raise InvalidTaskRecord("trace_context is longer than 255 characters")
+        task.trace_context = trace_context
+
+    return task
+
+
+def _check_retry_options(options):
+    """Check the types of the retry options, which the database would only
+    reject when the tasks are inserted."""
+    # bool is a subclass of int
+    max_retries = options.get("max_retries", 0)
+    if not isinstance(max_retries, int) or isinstance(max_retries, bool):
+        raise InvalidTaskRecord("max_retries must be an integer")
+    if max_retries < 0:
+        raise InvalidTaskRecord("max_retries must not be negative")
+
+    if not isinstance(options.get("retry_backoff", False), bool):
+        raise InvalidTaskRecord("retry_backoff must be a boolean")
+
+    factor = options.get("retry_backoff_factor", 2)
+    if (
+        not isinstance(factor, (int, float))
+        or isinstance(factor, bool)
+        or not math.isfinite(factor)
+    ):
+        raise InvalidTaskRecord("retry_backoff_factor must be a finite number")
+
+
+def _parse_due_at(value):
+    due_at = None
+    if isinstance(value, str):
+        try:
+            due_at = parse_datetime(value)
+        except ValueError:
+            pass
+    if due_at is None:
+        raise InvalidTaskRecord(f'Invalid due_at "{value}"')
+
+    if timezone.is_naive(due_at):
+        due_at = timezone.make_aware(due_at, datetime.timezone.utc)
+    return due_at
+
+
+def create_tasks(tasks):
+    """Insert the (unsaved) `tasks` in their database, grouped by database and
+    task model. The tasks whose uuid already exists are ignored, and their
+    offloaded payloads deleted.
+
+    The tasks are loaded with COPY in a staging table, then inserted with a
+    single INSERT ... SELECT on PostgreSQL, and with bulk inserts on the other
+    databases.
+
+    Returns the number of created tasks.
+    """
+    grouped_tasks = defaultdict(list)
+    for task in tasks:
+        grouped_tasks[(type(task), db_for_task_name(task.name))].append(task)
+
+    created_count = 0
+    for (task_model, using), group in grouped_tasks.items():
+        connection = connections[using]
+        if connection.vendor == "postgresql":
+            count, created_refs = _copy_tasks(task_model, group, connection)
+        else:
+            count, created_refs = _bulk_create_tasks(task_model, group, using)
+        created_count += count
+
+        unused_refs = [
+            task.payload_ref
+            for task in group
+            if task.payload_ref and task.payload_ref not in created_refs
+        ]
+        if unused_refs:
+            get_payload_store().delete(unused_refs, using=using)
+
+    return created_count
+
+
+def _bulk_create_tasks(task_model, tasks, using):
+    """Insert the tasks whose uuid doesn't exist yet. Returns the number of
+    created tasks and the set of their payload refs."""
+    tasks_by_uuid = {}
+    for task in tasks:
+        tasks_by_uuid.setdefault(task.uuid, task)
+    existing = task_model.objects.using(using).filter(uuid__in=list(tasks_by_uuid))
+    for uuid_ in existing.values_list("uuid", flat=True):
+        del tasks_by_uuid[uuid_]
+
+    created = list(tasks_by_uuid.values())
+    task_model.objects.using(using).bulk_create(created, ignore_conflicts=True)
+    return len(created), {task.payload_ref for task in created if task.payload_ref}
+
+
+def _copy_tasks(task_model, tasks, connection):
+    qn = connection.ops.quote_name
+    fields = [
+        field for field in task_model._meta.concrete_fields if not field.primary_key
+    ]
+    columns = ", ".join(qn(field.column) for field in fields)
+    table = qn(task_model._meta.db_table)
+
+    data = io.StringIO()
+    for task in tasks:
+        values = [_copy_value(task, field, connection) for field in fields]
+        data.write("\t".join(values))
+        data.write("\n")
+    data.seek(0)
+
+    with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+        # The staging table has the types of the task table, but none of its
+        # constraints and indexes, which makes COPY as fast as possible.
+        cursor.execute(
+            f"CREATE TEMPORARY TABLE taskq_import ON COMMIT DROP AS "
+            f"SELECT {columns} FROM {table} WITH NO DATA"
+        )
+        copy_sql = f"COPY taskq_import ({columns}) FROM STDIN"
+        # COPY uses the driver cursor: convert its errors to the Django ones
+        with connection.wrap_database_errors:
+            if hasattr(cursor.cursor, "copy_expert"):
+                cursor.cursor.copy_expert(copy_sql, data)
+            else:
+                with cursor.cursor.copy(copy_sql) as copy:  # psycopg 3
+                    copy.write(data.getvalue())
+
+        cursor.execute(
+            f"WITH created AS ("
+            f"  INSERT INTO {table} ({columns}) SELECT {columns} FROM taskq_import "
+            f"  ON CONFLICT DO NOTHING RETURNING payload_ref"
+            f") SELECT COUNT(*), ARRAY_AGG(payload_ref) "
+            f"FILTER (WHERE payload_ref IS NOT NULL) FROM created"
+        )
+        created_count, created_refs = cursor.fetchone()
+        cursor.execute("DROP TABLE taskq_import")
+
+    return created_count, set(created_refs or [])
+
+
+def _copy_value(task, field, connection):
+    """Return the value of `field` in the text format of COPY."""
+    value = getattr(task, field.attname)
+    if value is None:
+        return "\\N"
+
+    if field.get_internal_type() == "JSONField":
+        value = JSONEncoder().encode(value)
+    else:
+        value = field.get_db_prep_save(value, connection)
+
+    if isinstance(value, bool):
+        value = "t" if value else "f"
+    elif isinstance(value, datetime.datetime):
+        value = value.isoformat()
+    elif isinstance(value, datetime.timedelta):
+        value = f"{value.total_seconds()} seconds"
+    else:
+        value = str(value)
+
+    return (
+        value.replace("\\", "\\\\")
+        .replace("\t", "\\t")
+        .replace("\n", "\\n")
+        .replace("\r", "\\r")
+    )
@@ -1,52 +1,183 @@
+import base64
 import datetime
+import decimal
 import json
+import uuid
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from .utils import cached_setting
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+
+# Extended types are stored as {"__type__": <type name>, "value": <value>}
+def encode_extended_type(obj):
+    """Return a JSON serializable representation of `obj`, or raise a
+    TypeError if its type is not supported."""
+    # datetime.datetime is a subclass of datetime.date
+    if isinstance(obj, datetime.datetime):
+        return {"__type__": "datetime", "value": obj.isoformat()}
+    if isinstance(obj, datetime.date):
+        return {"__type__": "date", "value": obj.isoformat()}
+    if isinstance(obj, datetime.time):
+        return {"__type__": "time", "value": obj.isoformat()}
+    if isinstance(obj, datetime.timedelta):
+        value = [obj.days, obj.seconds, obj.microseconds]
+        return {"__type__": "timedelta", "value": value}
+    if isinstance(obj, decimal.Decimal):
+        return {"__type__": "decimal", "value": str(obj)}
+    if isinstance(obj, bytes):
+        value = base64.b64encode(obj).decode("ascii")
+        return {"__type__": "bytes", "value": value}
+    # Natively serialized as a string by orjson, do the same everywhere.
+    if isinstance(obj, uuid.UUID):
+        return str(obj)
+
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def _decode_timedelta(value):
+    days, seconds, microseconds = value
+    return datetime.timedelta(days=days, seconds=seconds, microseconds=microseconds)
+
+
+_EXTENDED_TYPE_DECODERS = {
+    "datetime": datetime.datetime.fromisoformat,
+    "date": datetime.date.fromisoformat,
+    "time": datetime.time.fromisoformat,
+    "timedelta": _decode_timedelta,
+    "decimal": decimal.Decimal,
+    "bytes": base64.b64decode,
+}
+
+# Verbose representations written by previous versions of taskq
+_LEGACY_EXTENDED_TYPE_DECODERS = {
+    "datetime": lambda obj_dict: datetime.datetime(**obj_dict),
+    "timedelta": lambda obj_dict: datetime.timedelta(**obj_dict),
+}
+
+
+def decode_extended_type(obj_dict):
+    """Return the object represented by a dict containing a "__type__" key, or
+    the dict itself if it doesn't represent a supported type."""
+    obj_type = obj_dict["__type__"]
+
+    if len(obj_dict) == 2 and "value" in obj_dict:
+        decoder = _EXTENDED_TYPE_DECODERS.get(obj_type)
+        if decoder is not None:
+            return decoder(obj_dict["value"])
+
+    legacy_decoder = _LEGACY_EXTENDED_TYPE_DECODERS.get(obj_type)
+    if legacy_decoder is not None:
+        kwargs = {k: v for k, v in obj_dict.items() if k != "__type__"}
+        return legacy_decoder(kwargs)
+
+    return obj_dict
+
+
+def decode_extended_types(obj):
+    """Replace in-place every extended type representation contained in the
+    decoded JSON document `obj` by the object it represents."""
+    # The JSON decoders only build plain dicts and lists: compare the exact
+    # types, which is cheaper than isinstance().
+    if type(obj) is dict:
+        for key, value in obj.items():
+            value_type = type(value)
+            if value_type is dict or value_type is list:
+                obj[key] = decode_extended_types(value)
+        if "__type__" in obj:
+            return decode_extended_type(obj)
+    elif type(obj) is list:
+        for i, value in enumerate(obj):
+            value_type = type(value)
+            if value_type is dict or value_type is list:
+                obj[i] = decode_extended_types(value)
+    return obj
+
+
+class JSONCodec:
+    """Serialize the task arguments with the standard library json module."""
+
+    def dumps(self, obj):
+        return json.dumps(obj, default=encode_extended_type, separators=(",", ":"))
+
+    def loads(self, s):
+        obj = json.loads(s)
+        # Only walk the decoded document if it may contain extended types
+        if '"__type__"' in s:
+            obj = decode_extended_types(obj)
+        return obj
+
+
+class OrjsonCodec(JSONCodec):
+    """Serialize the task arguments with orjson, a fast JSON library
+    implemented in Rust. Requires the orjson package."""
+
+    _OPTIONS = (
+        orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS if orjson else 0
+    )
+
+    def dumps(self, obj):
+        try:
+            return orjson.dumps(
+                obj, default=encode_extended_type, option=self._OPTIONS
+            ).decode()
+        except orjson.JSONEncodeError:
+            # orjson doesn't support integers larger than 64 bits, let the
+            # standard library try (and raise a TypeError if it fails too).
+            return super().dumps(obj)
+
+    def loads(self, s):
+        obj = orjson.loads(s)
+        if '"__type__"' in s:
+            obj = decode_extended_types(obj)
+        return obj
+
+
+@cached_setting
+def get_codec():
+    """Return the codec configured with settings.TASKQ["codec"] (cached).
+
+    Defaults to OrjsonCodec if orjson is installed, JSONCodec otherwise.
+    """
+    codec_cls_str = getattr(settings, "TASKQ", {}).get("codec")
+    if codec_cls_str:
+        return import_string(codec_cls_str)()
+    if orjson is not None:
+        return OrjsonCodec()
+    return JSONCodec()
+
+
+class EncodedDict(dict):
+    """A dict holding its encoding by the codec, which the JSONEncoder returns
+    instead of encoding the dict again. It must not be modified."""
+
+    def __init__(self, obj, encoded):
+        super().__init__(obj)
+        self.encoded = encoded
 
 
 class JSONEncoder(json.JSONEncoder):
+    """Encoder of the Task.function_args JSONField, delegating the encoding to
+    the configured codec."""
+
+    def encode(self, obj):
+        if isinstance(obj, EncodedDict):
+            return obj.encoded
+        return get_codec().dumps(obj)
+
     def default(self, obj):
-        if isinstance(obj, datetime.datetime):
-            return self.default_datetime(obj)
-
-        if isinstance(obj, datetime.timedelta):
-            return self.default_timedelta(obj)
-
-        return super().default(obj)
-
-    def default_datetime(self, obj):
-        return {
-            "__type__": "datetime",
-            "year": obj.year,
-            "month": obj.month,
-            "day": obj.day,
-            "hour": obj.hour,
-            "minute": obj.minute,
-            "second": obj.second,
-            "microsecond": obj.microsecond,
-        }
-
-    def default_timedelta(self, obj):
-        return {
-            "__type__": "timedelta",
-            "days": obj.days,
-            "seconds": obj.seconds,
-            "microseconds": obj.microseconds,
-        }
+        return encode_extended_type(obj)
 
 
 class JSONDecoder(json.JSONDecoder):
-    def __init__(self):
-        super().__init__(object_hook=self.dict_to_object)
-
-    def dict_to_object(self, obj_dict):
-        if "__type__" not in obj_dict:
-            return obj_dict
-
-        obj_type = obj_dict.pop("__type__")
-        if obj_type == "datetime":
-            return datetime.datetime(**obj_dict)
-        if obj_type == "timedelta":
-            return datetime.timedelta(**obj_dict)
-
-        # Put __type__ back in the object dict
-        obj_dict["__type__"] = obj_type
-        return obj_dict
+    """Decoder of the Task.function_args JSONField, delegating the decoding to
+    the configured codec."""
+
+    def decode(self, s):
+        return get_codec().loads(s)
@@ -0,0 +1,76 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from taskq.models import TASK_MODELS, Task
+from taskq.partitions import is_partitioned
+
+
+def index_name(task_model):
+    return f"{task_model._meta.db_table}_args_gin"
+
+
+class Command(BaseCommand):
+    """Create (or drop) a GIN index with the jsonb_path_ops operator class on
+    the function_args column of the task tables, which makes the lookups of
+    Task.objects.with_args() (e.g. the tasks of a customer) use the index
+    instead of scanning the table.
+
+    The index is opt-in: it slows down the insertion of the tasks and takes
+    space. It is built without blocking the writes, except on a partitioned
+    task table (see the taskqpartition command) on which PostgreSQL doesn't
+    support CREATE INDEX CONCURRENTLY.
+    """
+
+    help = "Create or drop the index of the task function args (PostgreSQL only)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("action", choices=["create", "drop"])
+        parser.add_argument(
+            "--database",
+            default=DEFAULT_DB_ALIAS,
+            help="The database of the task tables (default: %(default)s)",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Print the SQL statements without executing them",
+        )
+
+    def handle(self, *args, **options):
+        connection = connections[options["database"]]
+        if connection.vendor != "postgresql":
+            raise CommandError("The function args index requires PostgreSQL")
+
+        partitioned = is_partitioned(using=connection.alias)
+        statements = []
+        for task_model in TASK_MODELS:
+            # PostgreSQL can't build the indexes of a partitioned table (only
+            # the Task table can be) concurrently
+            concurrently = " CONCURRENTLY"
+            if partitioned and task_model is Task:
+                concurrently = ""
+            name = connection.ops.quote_name(index_name(task_model))
+            if options["action"] == "create":
+                table = connection.ops.quote_name(task_model._meta.db_table)
+                statements.append(
+                    f"CREATE INDEX{concurrently} IF NOT EXISTS {name} "
+                    f"ON {table} USING gin (function_args jsonb_path_ops)"
+                )
+            else:
+                statements.append(f"DROP INDEX{concurrently} IF EXISTS {name}")
+
+        if options["dry_run"]:
+            for statement in statements:
+                self.stdout.write(f"{statement};")
+            return
+
+        # CREATE INDEX CONCURRENTLY can't run in a transaction: each statement
+        # is committed on its own.
+        with connection.cursor() as cursor:
+            for statement in statements:
+                cursor.execute(statement)
+
+        if options["action"] == "create":
+            self.stdout.write("The function args indexes were created.")
+        else:
+            self.stdout.write("The function args indexes were dropped.")
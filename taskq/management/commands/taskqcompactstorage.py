@@ -0,0 +1,109 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+from taskq.fields import function_names
+from taskq.models import Task, TaskFunction
+
+
+class Command(BaseCommand):
+    """Convert the Task table to its compact storage layout, in a single table
+    rewrite:
+
+    - uuid and fire_id use the native uuid type,
+    - status, retries, max_retries and retry_backoff_factor are smallints,
+    - function_name holds the id of the function in the TaskFunction lookup
+      table instead of its name.
+
+    The Task model reads and writes both layouts transparently. Running
+    consumers and producers must be restarted after the conversion.
+    """
+
+    help = "Convert the task table to its compact storage layout (PostgreSQL only)"
+
+    SMALLINT_COLUMNS = ["status", "retries", "max_retries", "retry_backoff_factor"]
+    UUID_COLUMNS = ["uuid", "fire_id"]
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--database",
+            default=DEFAULT_DB_ALIAS,
+            help="The database to convert (default: %(default)s)",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Print the SQL statements without executing them",
+        )
+
+    def handle(self, *args, **options):
+        connection = connections[options["database"]]
+        if connection.vendor != "postgresql":
+            raise CommandError("The compact storage layout requires PostgreSQL")
+
+        if function_names.is_compact(connection, Task._meta.db_table):
+            self.stdout.write("The task table already uses the compact layout.")
+            return
+
+        statements = self.get_statements(connection)
+
+        if options["dry_run"]:
+            for statement in statements:
+                self.stdout.write(f"{statement};")
+            return
+
+        with transaction.atomic(using=connection.alias):
+            with connection.cursor() as cursor:
+                for statement in statements:
+                    cursor.execute(statement)
+
+        function_names.clear()
+        self.stdout.write("The task table now uses the compact layout.")
+
+    def get_statements(self, connection):
+        qn = connection.ops.quote_name
+        task_table = qn(Task._meta.db_table)
+        function_table = qn(TaskFunction._meta.db_table)
+
+        statements = []
+
+        # The varchar_pattern_ops indexes created by Django for the varchar
+        # columns can't be converted to the uuid type (nor are they useful).
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(
+                cursor, Task._meta.db_table
+            )
+        for name, constraint in constraints.items():
+            if (
+                constraint["index"]
+                and name.endswith("_like")
+                and constraint["columns"][0] in self.UUID_COLUMNS
+            ):
+                statements.append(f"DROP INDEX {qn(name)}")
+
+        statements.append(
+            f"INSERT INTO {function_table} (name) "
+            f"SELECT DISTINCT function_name FROM {task_table} "
+            f"ON CONFLICT (name) DO NOTHING"
+        )
+        # Sub-queries are not allowed in ALTER COLUMN ... USING
+        statements.append(
+            f"CREATE FUNCTION pg_temp.taskq_function_id(varchar) RETURNS smallint "
+            f"AS $$ SELECT id FROM {function_table} WHERE name = $1 $$ "
+            f"LANGUAGE sql STABLE"
+        )
+
+        alterations = [
+            f"ALTER COLUMN {qn(column)} TYPE uuid USING {qn(column)}::uuid"
+            for column in self.UUID_COLUMNS
+        ]
+        alterations += [
+            f"ALTER COLUMN {qn(column)} TYPE smallint"
+            for column in self.SMALLINT_COLUMNS
+        ]
+        alterations.append(
+            "ALTER COLUMN function_name TYPE smallint "
+            "USING pg_temp.taskq_function_id(function_name)"
+        )
+        statements.append(f"ALTER TABLE {task_table} " + ", ".join(alterations))
+
+        return statements
@@ -0,0 +1,127 @@
+import csv
+import json
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DataError
+
+from taskq.exceptions import InvalidTaskRecord
+from taskq.ingest import create_tasks, task_from_record
+from taskq.registry import registry
+from taskq.utils import chunks
+
+# The CSV columns holding JSON documents
+JSON_COLUMNS = ("args", "kwargs")
+# The CSV columns holding integers
+INTEGER_COLUMNS = ("max_retries", "retry_delay", "retry_backoff_factor", "timeout")
+
+
+class Command(BaseCommand):
+    """Create tasks from a JSON Lines or CSV file of task records (see
+    taskq.ingest), e.g. produced by an offline job.
+
+    A JSON Lines file contains one record object per line. A CSV file has a
+    header line naming the fields of the records, its args and kwargs columns
+    contain JSON documents and its empty cells are ignored.
+
+    The tasks are created in batches, each one in its own transaction. The tasks
+    whose uuid already exists are ignored, so that an interrupted import can be
+    run again when the records have a uuid.
+    """
+
+    help = "Create tasks from a JSON Lines or CSV file"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help='The file to import ("-" for stdin)')
+        parser.add_argument(
+            "--format",
+            choices=["jsonl", "csv"],
+            help="The file format (default: guessed from the file extension, "
+            "jsonl for stdin)",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=10000,
+            help="The number of tasks created by each transaction "
+            "(default: %(default)s)",
+        )
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        file_format = options["format"]
+        if file_format is None:
+            file_format = "csv" if path.endswith(".csv") else "jsonl"
+
+        # Register the @taskified functions the records are validated against
+        registry.autodiscover()
+
+        if path == "-":
+            created_count = self.import_file(sys.stdin, file_format, options)
+        else:
+            with open(path, newline="", encoding="utf-8") as f:
+                created_count = self.import_file(f, file_format, options)
+
+        self.stdout.write(f"{created_count} tasks created")
+
+    def import_file(self, f, file_format, options):
+        if file_format == "csv":
+            records = self.read_csv(f)
+        else:
+            records = self.read_jsonl(f)
+
+        created_count = 0
+        for batch in chunks(records, options["batch_size"]):
+            tasks = []
+            for line_number, record in batch:
+                try:
+                    tasks.append(task_from_record(record))
+                except InvalidTaskRecord as e:
+                    raise CommandError(
+                        f"Line {line_number}: {e} ({created_count} tasks created "
+                        f"before the error)"
+                    )
+            try:
+                created_count += create_tasks(tasks)
+            except (DataError, ValueError) as e:
+                # e.g. a value out of the range of its column
+                lines = f"{batch[0][0]}-{batch[-1][0]}"
+                raise CommandError(
+                    f"Lines {lines}: {str(e).strip()} ({created_count} tasks "
+                    f"created before the error)"
+                )
+
+        return created_count
+
+    def read_jsonl(self, f):
+        for line_number, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            try:
+                yield line_number, json.loads(line)
+            except ValueError as e:
+                raise CommandError(f"Line {line_number}: invalid JSON: {e}")
+
+    def read_csv(self, f):
+        reader = csv.DictReader(f)
+        for row in reader:
+            # DictReader stores the fields beyond the header under None
+            if None in row:
+                raise CommandError(
+                    f"Line {reader.line_num}: more fields than in the header"
+                )
+            record = {}
+            try:
+                for key, value in row.items():
+                    if value == "" or value is None:
+                        continue
+                    if key in JSON_COLUMNS:
+                        value = json.loads(value)
+                    elif key in INTEGER_COLUMNS:
+                        value = int(value)
+                    elif key == "retry_backoff":
+                        value = value.lower() in ("1", "true", "t", "yes")
+                    record[key] = value
+            except ValueError as e:
+                raise CommandError(f"Line {reader.line_num}: invalid {key}: {e}")
+            yield reader.line_num, record
@@ -0,0 +1,94 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from taskq.partitions import (
+    INTERVALS,
+    convert_to_partitioned,
+    create_partitions,
+    drop_expired_partitions,
+    is_partitioned,
+    list_partitions,
+)
+from taskq.purge import get_retention
+
+
+class Command(BaseCommand):
+    """Manage the range partitioning of the task table by due_at:
+
+    - convert: convert the task table to a partitioned table. The existing
+      table becomes the partition of the tasks due before the current interval.
+    - create: create the partitions of the current and of the next intervals.
+      Should run periodically (e.g. daily), tasks due after the last partition
+      are stored in the DEFAULT partition.
+    - drop: drop the partitions only containing tasks older than the retention
+      defined in settings.TASKQ["retention"] (taskqpurge also does this).
+    - list: list the partitions.
+
+    Running consumers and producers must be restarted after the conversion.
+    """
+
+    help = "Manage the partitions of the task table (PostgreSQL only)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("action", choices=["convert", "create", "drop", "list"])
+        parser.add_argument(
+            "--interval",
+            choices=INTERVALS,
+            default="month",
+            help="The time range covered by each partition (default: %(default)s)",
+        )
+        parser.add_argument(
+            "--ahead",
+            type=int,
+            default=3,
+            help="The number of partitions to create after the current one "
+            "(default: %(default)s)",
+        )
+        parser.add_argument(
+            "--database",
+            default=DEFAULT_DB_ALIAS,
+            help="The database of the task table (default: %(default)s)",
+        )
+
+    def handle(self, *args, **options):
+        using = options["database"]
+        if connections[using].vendor != "postgresql":
+            raise CommandError("Partitioning requires PostgreSQL")
+
+        action = options["action"]
+        partitioned = is_partitioned(using)
+        if action == "convert":
+            if partitioned:
+                self.stdout.write("The task table is already partitioned.")
+                return
+            convert_to_partitioned(options["interval"], options["ahead"], using=using)
+            self.stdout.write("The task table is now partitioned.")
+            return
+
+        if not partitioned:
+            raise CommandError(
+                'The task table is not partitioned, run "taskqpartition convert" first'
+            )
+
+        if action == "create":
+            names = create_partitions(
+                options["interval"], options["ahead"], using=using
+            )
+            self.stdout.write(f"{len(names)} partitions created")
+        elif action == "drop":
+            try:
+                retention = get_retention()
+            except ValueError as e:
+                raise CommandError(e)
+            names = drop_expired_partitions(retention, using=using)
+            self.stdout.write(f"{len(names)} partitions dropped")
+        else:
+            for partition in list_partitions(using):
+                if partition.is_default:
+                    bounds = "DEFAULT"
+                else:
+                    lower = (
+                        partition.lower.isoformat() if partition.lower else "MINVALUE"
+                    )
+                    bounds = f"{lower} - {partition.upper.isoformat()}"
+                self.stdout.write(f"{partition.name}: {bounds}")
@@ -0,0 +1,57 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from taskq.constants import TASKQ_DEFAULT_PURGE_BATCH_SIZE
+from taskq.purge import TaskArchive, get_retention, purge_tasks
+from taskq.routing import get_databases
+from taskq.stats import purge_stats
+
+
+class Command(BaseCommand):
+    """Delete the finished tasks older than the retention defined in the
+    project settings."""
+
+    help = "Delete the finished tasks older than their retention"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=TASKQ_DEFAULT_PURGE_BATCH_SIZE,
+            help="The number of tasks deleted by each query (default: %(default)s)",
+        )
+        parser.add_argument(
+            "--archive-dir",
+            help="Write the deleted tasks to a compressed JSON Lines file "
+            "in this directory",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            retention = get_retention()
+        except ValueError as e:
+            raise CommandError(e)
+
+        if not retention:
+            raise CommandError('No retention defined in settings.TASKQ["retention"]')
+
+        archive = None
+        if options["archive_dir"]:
+            archive = TaskArchive(options["archive_dir"])
+
+        deleted_count = 0
+        try:
+            for using in get_databases():
+                purge_stats(using=using)
+                deleted_count += purge_tasks(
+                    retention,
+                    batch_size=options["batch_size"],
+                    archive=archive,
+                    using=using,
+                )
+        finally:
+            if archive is not None:
+                archive.close()
+
+        self.stdout.write(f"{deleted_count} tasks deleted")
+        if archive is not None and deleted_count:
+            self.stdout.write(f"Archived to {archive.path}")
@@ -1,13 +1,41 @@
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
 
 from taskq.consumer import Consumer
 
 
+def shard_list(value):
+    return [int(shard) for shard in value.split(",")]
+
+
+def database_list(value):
+    return value.split(",")
+
+
 class Command(BaseCommand):
     """Start a new taskq Consumer, fetching and executing tasks as they are registered."""
 
     help = "Start a new task queue consumer"
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--shards",
+            type=shard_list,
+            help="Comma separated list of the shards to claim tasks from first, when "
+            'settings.TASKQ["shards"] is set (default: a random shard)',
+        )
+
+        parser.add_argument(
+            "--databases",
+            type=database_list,
+            help="Comma separated list of the databases to claim tasks from, "
+            'among settings.TASKQ["databases"] (default: all of them)',
+        )
+
     def handle(self, *args, **options):
-        consumer = Consumer()
+        try:
+            consumer = Consumer(
+                shards=options["shards"], databases=options["databases"]
+            )
+        except ValueError as e:
+            raise CommandError(e)
         consumer.run()
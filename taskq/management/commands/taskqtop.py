@@ -0,0 +1,94 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from taskq.constants import TASKQ_DEFAULT_ESTIMATE_LIMIT
+from taskq.estimates import ZERO, Snapshot
+from taskq.models import Task
+
+# Clear the terminal and move the cursor to its top left corner
+CLEAR_SCREEN = "\033[2J\033[H"
+
+
+class Command(BaseCommand):
+    """Display the number of tasks of each status and the queued tasks of each
+    function, refreshed every second, without loading the database: the
+    counts are estimated from the planner statistics or counted up to a limit
+    (see taskq/estimates.py). Estimated counts are prefixed with "~".
+
+    The executions per minute and the throughput come from the execution
+    statistics of the last minutes (settings.TASKQ["stats"]).
+    """
+
+    help = "Display a live overview of the task queue"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=1,
+            help="The seconds between each refresh (default: %(default)s)",
+        )
+        parser.add_argument(
+            "--iterations",
+            type=int,
+            help="Exit after this number of refreshes (default: never)",
+        )
+        parser.add_argument(
+            "--limit",
+            type=int,
+            default=TASKQ_DEFAULT_ESTIMATE_LIMIT,
+            help="The maximum number of rows scanned by each count "
+            "(default: %(default)s)",
+        )
+        parser.add_argument(
+            "--functions",
+            type=int,
+            default=20,
+            help="The number of functions displayed (default: %(default)s)",
+        )
+
+    def handle(self, *args, **options):
+        clear = CLEAR_SCREEN if self.stdout.isatty() else ""
+        iteration = 0
+        try:
+            while True:
+                snapshot = Snapshot(limit=options["limit"])
+                self.stdout.write(clear + self.render(snapshot, options["functions"]))
+                iteration += 1
+                if options["iterations"] and iteration >= options["iterations"]:
+                    break
+                time.sleep(options["interval"])
+        except KeyboardInterrupt:
+            pass
+
+    def render(self, snapshot, functions_count):
+        lines = [
+            f"taskq - {snapshot.taken_at:%Y-%m-%d %H:%M:%S} - {snapshot.total} tasks",
+            "  ".join(
+                f"{label.lower()} {snapshot.statuses[status]}"
+                for status, label in Task.STATUS_CHOICES
+            ),
+        ]
+        if snapshot.oldest_due_age is None:
+            oldest = "-"
+        else:
+            oldest = f"{snapshot.oldest_due_age.total_seconds():.1f}s"
+        lines.append(
+            f"oldest due task: {oldest}  "
+            f"throughput: {snapshot.throughput:.1f} tasks/s"
+        )
+
+        names = sorted(
+            set(snapshot.functions) | set(snapshot.executions),
+            key=lambda name: snapshot.functions.get(name, ZERO).value,
+            reverse=True,
+        )
+        width = max([len(name) for name in names] + [len("FUNCTION")])
+        lines.append("")
+        lines.append(f"{'FUNCTION':<{width}}  {'QUEUED':>8}  {'PER MIN':>8}")
+        for name in names[:functions_count]:
+            queued = snapshot.functions.get(name, ZERO)
+            executions = snapshot.executions.get(name, 0)
+            lines.append(f"{name:<{width}}  {str(queued):>8}  {executions:>8.1f}")
+        return "\n".join(lines)
@@ -0,0 +1,81 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from taskq.models import TASK_MODELS, Task, Worker
+from taskq.routing import get_databases
+from taskq.workers import get_worker_timeout, prune_workers
+
+
+class Command(BaseCommand):
+    """List the registered workers (see taskq/workers.py): their host, pid,
+    databases, shards, heartbeat age, busy ratio and running task, followed by
+    the number of busy (running a task) and idle workers.
+
+    The workers whose last heartbeat is older than
+    settings.TASKQ["worker_timeout"] are listed as dead.
+    """
+
+    help = "List the workers and their running task"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--prune",
+            action="store_true",
+            help="Delete the dead workers",
+        )
+
+    def handle(self, *args, **options):
+        if options["prune"]:
+            self.stdout.write(f"{prune_workers()} dead workers deleted")
+
+        workers = list(Worker.objects.order_by("host", "pid"))
+        running_tasks = self._running_tasks([worker.uuid for worker in workers])
+
+        now = timezone.now()
+        timeout = get_worker_timeout()
+        alive_count = busy_count = 0
+        for worker in workers:
+            age = now - worker.last_heartbeat
+            task = running_tasks.get(worker.uuid)
+            if age > timeout:
+                state = "dead"
+            elif task is not None:
+                state = "busy"
+            else:
+                state = "idle"
+            if state != "dead":
+                alive_count += 1
+                busy_count += state == "busy"
+
+            shards = ",".join(map(str, worker.shards)) if worker.shards else "-"
+            self.stdout.write(
+                f"{worker.host}:{worker.pid} {state} "
+                f"databases={','.join(worker.databases)} shards={shards} "
+                f"heartbeat={age.total_seconds():.0f}s ago "
+                f"busy_ratio={worker.busy_ratio:.0%} "
+                f"tasks_processed={worker.tasks_processed} "
+                f"task={task or '-'}"
+            )
+
+        idle_count = alive_count - busy_count
+        idle_ratio = idle_count / alive_count if alive_count else 0
+        self.stdout.write(
+            f"{alive_count} workers: {busy_count} busy, {idle_count} idle "
+            f"(idle ratio {idle_ratio:.0%}), {len(workers) - alive_count} dead"
+        )
+
+    def _running_tasks(self, worker_uuids):
+        """Return the running tasks of the workers, by worker uuid."""
+        running_tasks = {}
+        if not worker_uuids:
+            return running_tasks
+
+        for using in get_databases():
+            for task_model in TASK_MODELS:
+                running_tasks.update(
+                    (task.worker, task)
+                    for task in task_model.objects.using(using).filter(
+                        status=Task.STATUS_RUNNING, worker__in=worker_uuids
+                    )
+                )
+        return running_tasks
@@ -0,0 +1,310 @@
+"""Metrics of the consumers, reported to the exporters configured with
+settings.TASKQ["metrics_exporters"], a dict {exporter class: options}:
+
+    TASKQ = {
+        "metrics_exporters": {
+            "taskq.metrics.PrometheusExporter": {"port": 9100},
+            "taskq.metrics.StatsDExporter": {"host": "localhost", "port": 8125},
+        }
+    }
+
+The consumers report the following metrics, labelled by function name for the
+task metrics:
+
+- taskq_tasks_fetched_total, taskq_tasks_started_total,
+  taskq_tasks_succeeded_total, taskq_tasks_failed_total,
+  taskq_tasks_retried_total, taskq_tasks_canceled_total and
+  taskq_tasks_timed_out_total (counters, timed out tasks are also counted as
+  failed),
+- taskq_task_duration_seconds: the execution time of the tasks (histogram),
+- taskq_claim_duration_seconds: the time spent claiming the due tasks
+  (histogram),
+- taskq_loop_duration_seconds: the duration of the run loop iterations,
+  sleep excluded (histogram).
+- taskq_loop_phase_duration_seconds: the duration of each phase of the run
+  loop iterations, labelled by phase (histogram, see timings.py).
+
+Reporting a metric without any exporter costs a function call.
+
+Each worker process serves its own metrics: when several workers run on a
+host, give the PrometheusExporter a range of ports, e.g. {"port": [9100,
+9109]}, each worker serves its metrics on the first free one.
+"""
+
+import logging
+import socket
+import threading
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from time import perf_counter
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from .utils import cached_setting
+
+logger = logging.getLogger("taskq")
+
+DEFAULT_BUCKETS = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1,
+    2.5,
+    5,
+    10,
+    30,
+    60,
+    300,
+)
+
+
+class Metrics:
+    """Report metrics to a list of exporters."""
+
+    def __init__(self, exporters=()):
+        self.exporters = list(exporters)
+
+    def increment(self, name, value=1, **labels):
+        """Add `value` to the counter `name`."""
+        for exporter in self.exporters:
+            exporter.increment(name, value, labels)
+
+    def observe(self, name, value, **labels):
+        """Add an observation of `value` seconds to the histogram `name`."""
+        for exporter in self.exporters:
+            exporter.observe(name, value, labels)
+
+    @contextmanager
+    def timer(self, name, **labels):
+        """Observe the time spent in the block in the histogram `name`."""
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, perf_counter() - start, **labels)
+
+    def start(self):
+        """Start the exporters, e.g. the HTTP server of PrometheusExporter."""
+        for exporter in self.exporters:
+            exporter.start()
+
+    def stop(self):
+        for exporter in self.exporters:
+            exporter.stop()
+
+
+class Exporter:
+    """The interface of the metrics exporters."""
+
+    def increment(self, name, value, labels):
+        raise NotImplementedError
+
+    def observe(self, name, value, labels):
+        raise NotImplementedError
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+
+class PrometheusExporter(Exporter):
+    """Aggregate the metrics in memory, and serve them in the Prometheus text
+    format at http://<address>:<port>/metrics once started.
+
+    `port` is a port number, or the [first, last] range of the ports to try.
+    """
+
+    def __init__(self, port=9100, address="127.0.0.1", buckets=DEFAULT_BUCKETS):
+        if isinstance(port, int):
+            self._ports = [port]
+        else:
+            first, last = port
+            self._ports = range(first, last + 1)
+        self.port = self._ports[0]
+        self.address = address
+        self.buckets = tuple(sorted(buckets))
+        self._counters = {}
+        self._histograms = {}
+        self._lock = threading.Lock()
+        self._server = None
+
+    def increment(self, name, value, labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, value, labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                # [bucket counts..., +Inf count, sum]
+                histogram = self._histograms[key] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    histogram[i] += 1
+            histogram[-2] += 1
+            histogram[-1] += value
+
+    def render(self):
+        """Return the metrics in the Prometheus text format."""
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted(
+                (key, list(histogram)) for key, histogram in self._histograms.items()
+            )
+
+        lines = []
+        previous_name = None
+        for (name, labels), value in counters:
+            if name != previous_name:
+                lines.append(f"# TYPE {name} counter")
+                previous_name = name
+            lines.append(f"{name}{_format_labels(labels)} {value}")
+
+        for (name, labels), histogram in histograms:
+            if name != previous_name:
+                lines.append(f"# TYPE {name} histogram")
+                previous_name = name
+            for bound, count in zip(self.buckets, histogram):
+                bucket_labels = _format_labels(labels + (("le", str(bound)),))
+                lines.append(f"{name}_bucket{bucket_labels} {count}")
+            bucket_labels = _format_labels(labels + (("le", "+Inf"),))
+            lines.append(f"{name}_bucket{bucket_labels} {histogram[-2]}")
+            lines.append(f"{name}_count{_format_labels(labels)} {histogram[-2]}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {histogram[-1]}")
+
+        return "\n".join(lines) + "\n"
+
+    def start(self):
+        if self._server is not None:
+            return
+
+        exporter = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path != "/metrics":
+                    self.send_error(404)
+                    return
+                body = exporter.render().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        for port in self._ports:
+            try:
+                self._server = ThreadingHTTPServer((self.address, port), Handler)
+                break
+            except OSError as e:
+                error = e
+        else:
+            # The tasks are executed anyway, without serving their metrics
+            logger.error(
+                "Couldn't serve the metrics on %s ports %s-%s: %s",
+                self.address,
+                self._ports[0],
+                self._ports[-1],
+                error,
+            )
+            return
+
+        self.port = self._server.server_address[1]
+        thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        thread.start()
+        logger.info(
+            "Serving the metrics on http://%s:%s/metrics", self.address, self.port
+        )
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    formatted = ",".join(
+        '{}="{}"'.format(
+            key,
+            str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"),
+        )
+        for key, value in labels
+    )
+    return "{" + formatted + "}"
+
+
+class StatsDExporter(Exporter):
+    """Send each metric in a UDP datagram to a StatsD server.
+
+    StatsD has no labels: they are appended to the metric name
+    (e.g. taskq.tasks_succeeded_total.myapp_tasks_add), or sent as DogStatsD
+    tags with tags=True.
+    """
+
+    def __init__(self, host="localhost", port=8125, prefix="taskq", tags=False):
+        self.address = (host, port)
+        self.prefix = prefix
+        self.tags = tags
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._socket.setblocking(False)
+
+    def increment(self, name, value, labels):
+        self._send(name, f"{value}|c", labels)
+
+    def observe(self, name, value, labels):
+        self._send(name, f"{value * 1000:.3f}|ms", labels)
+
+    def _send(self, name, value, labels):
+        if self.prefix:
+            name = name.replace("taskq_", "", 1)
+            name = f"{self.prefix}.{name}"
+
+        if not labels:
+            packet = f"{name}:{value}"
+        elif self.tags:
+            tags = ",".join(f"{key}:{label}" for key, label in labels.items())
+            packet = f"{name}:{value}|#{tags}"
+        else:
+            suffix = ".".join(
+                str(label).replace(".", "_").replace(":", "_")
+                for label in labels.values()
+            )
+            packet = f"{name}.{suffix}:{value}"
+
+        try:
+            self._socket.sendto(packet.encode(), self.address)
+        except OSError:
+            # The metrics are lost rather than delaying the tasks
+            pass
+
+    def stop(self):
+        self._socket.close()
+
+
+@cached_setting
+def get_metrics():
+    """Return the Metrics reporting to the exporters configured with
+    settings.TASKQ["metrics_exporters"] (cached)."""
+    taskq_config = getattr(settings, "TASKQ", {})
+    exporters = [
+        import_string(exporter_cls_str)(**(options or {}))
+        for exporter_cls_str, options in taskq_config.get(
+            "metrics_exporters", {}
+        ).items()
+    ]
+    return Metrics(exporters)
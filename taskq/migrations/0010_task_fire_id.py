@@ -0,0 +1,19 @@
+# Generated by Django 4.2.30 on 2026-10-19 02:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("taskq", "0009_use_jsonfield_for_function_args"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="task",
+            name="fire_id",
+            field=models.CharField(
+                db_index=True, default=None, max_length=36, null=True
+            ),
+        ),
+    ]
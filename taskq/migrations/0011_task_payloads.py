@@ -0,0 +1,32 @@
+# Generated by Django 4.2.30 on 2026-10-19 02:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("taskq", "0010_task_fire_id"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TaskPayload",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("data", models.BinaryField()),
+            ],
+        ),
+        migrations.AddField(
+            model_name="task",
+            name="payload_ref",
+            field=models.CharField(default=None, max_length=255, null=True),
+        ),
+    ]
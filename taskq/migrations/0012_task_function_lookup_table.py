@@ -0,0 +1,43 @@
+# Generated by Django 4.2.30 on 2026-10-19 02:24
+
+from django.db import migrations, models
+import taskq.fields
+import taskq.models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("taskq", "0011_task_payloads"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TaskFunction",
+            fields=[
+                ("id", models.SmallAutoField(primary_key=True, serialize=False)),
+                ("name", models.CharField(max_length=255, unique=True)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name="task",
+            name="fire_id",
+            field=taskq.fields.UUIDStringField(
+                db_index=True, default=None, max_length=36, null=True
+            ),
+        ),
+        migrations.AlterField(
+            model_name="task",
+            name="function_name",
+            field=taskq.fields.FunctionNameField(default=None, max_length=255),
+        ),
+        migrations.AlterField(
+            model_name="task",
+            name="uuid",
+            field=taskq.fields.UUIDStringField(
+                default=taskq.models.generate_task_uuid,
+                editable=False,
+                max_length=36,
+                unique=True,
+            ),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 4.2.30 on 2026-10-19 02:30
+
+from django.db import migrations, models
+import taskq.sharding
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("taskq", "0012_task_function_lookup_table"),
+    ]
+
+    operations = [
+        # The existing tasks are left without shard
+        migrations.AddField(
+            model_name="task",
+            name="shard",
+            field=models.SmallIntegerField(default=None, null=True),
+        ),
+        migrations.AlterField(
+            model_name="task",
+            name="shard",
+            field=models.SmallIntegerField(
+                default=taskq.sharding.assign_shard, null=True
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="task",
+            index=models.Index(
+                fields=["status", "shard", "due_at"], name="taskq_task_claim_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,110 @@
+# Generated by Django 4.2.30 on 2026-10-19 02:31
+
+import datetime
+from django.db import migrations, models
+import taskq.fields
+import taskq.json
+import taskq.models
+import taskq.sharding
+
+
+def set_unlogged(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute("ALTER TABLE taskq_ephemeraltask SET UNLOGGED")
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("taskq", "0013_task_shard"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="EphemeralTask",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "uuid",
+                    taskq.fields.UUIDStringField(
+                        default=taskq.models.generate_task_uuid,
+                        editable=False,
+                        max_length=36,
+                        unique=True,
+                    ),
+                ),
+                (
+                    "name",
+                    models.CharField(
+                        blank=True, db_index=True, default="", max_length=255
+                    ),
+                ),
+                (
+                    "function_name",
+                    taskq.fields.FunctionNameField(default=None, max_length=255),
+                ),
+                (
+                    "function_args",
+                    models.JSONField(
+                        decoder=taskq.json.JSONDecoder,
+                        default=dict,
+                        encoder=taskq.json.JSONEncoder,
+                    ),
+                ),
+                ("due_at", models.DateTimeField(db_index=True)),
+                (
+                    "status",
+                    models.IntegerField(
+                        choices=[
+                            (0, "Queued"),
+                            (1, "Running"),
+                            (2, "Success"),
+                            (3, "Failed"),
+                            (4, "Canceled"),
+                            (5, "Fetched"),
+                        ],
+                        db_index=True,
+                        default=0,
+                    ),
+                ),
+                ("retries", models.IntegerField(default=0)),
+                ("max_retries", models.IntegerField(default=3)),
+                ("retry_delay", models.DurationField(default=datetime.timedelta(0))),
+                ("retry_backoff", models.BooleanField(default=False)),
+                ("retry_backoff_factor", models.IntegerField(default=2)),
+                ("timeout", models.DurationField(default=None, null=True)),
+                (
+                    "fire_id",
+                    taskq.fields.UUIDStringField(
+                        db_index=True, default=None, max_length=36, null=True
+                    ),
+                ),
+                (
+                    "payload_ref",
+                    models.CharField(default=None, max_length=255, null=True),
+                ),
+                (
+                    "shard",
+                    models.SmallIntegerField(
+                        default=taskq.sharding.assign_shard, null=True
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["status", "shard", "due_at"],
+                        name="taskq_ephemeral_claim_idx",
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(set_unlogged, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 4.2.30 on 2026-10-19 02:43
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("taskq", "0014_ephemeraltask"),
+    ]
+
+    operations = [
+        # The existing tasks are left without created_at
+        migrations.AddField(
+            model_name="task",
+            name="created_at",
+            field=models.DateTimeField(default=None, null=True),
+        ),
+        migrations.AlterField(
+            model_name="task",
+            name="created_at",
+            field=models.DateTimeField(default=django.utils.timezone.now, null=True),
+        ),
+        migrations.AddField(
+            model_name="task",
+            name="started_at",
+            field=models.DateTimeField(default=None, null=True),
+        ),
+        migrations.AddField(
+            model_name="task",
+            name="finished_at",
+            field=models.DateTimeField(default=None, null=True),
+        ),
+        migrations.AddField(
+            model_name="ephemeraltask",
+            name="created_at",
+            field=models.DateTimeField(default=None, null=True),
+        ),
+        migrations.AlterField(
+            model_name="ephemeraltask",
+            name="created_at",
+            field=models.DateTimeField(default=django.utils.timezone.now, null=True),
+        ),
+        migrations.AddField(
+            model_name="ephemeraltask",
+            name="started_at",
+            field=models.DateTimeField(default=None, null=True),
+        ),
+        migrations.AddField(
+            model_name="ephemeraltask",
+            name="finished_at",
+            field=models.DateTimeField(default=None, null=True),
+        ),
+    ]
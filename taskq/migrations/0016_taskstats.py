@@ -0,0 +1,44 @@
+# Generated by Django 4.2.30 on 2026-10-19 02:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("taskq", "0015_task_timestamps"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TaskStats",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("function_name", models.CharField(max_length=255)),
+                ("minute", models.DateTimeField()),
+                ("executions", models.IntegerField(default=0)),
+                ("failures", models.IntegerField(default=0)),
+                ("retries", models.IntegerField(default=0)),
+                ("total_duration", models.FloatField(default=0)),
+                ("duration_sketch", models.JSONField(default=list)),
+            ],
+            options={
+                "indexes": [
+                    models.Index(fields=["minute"], name="taskq_taskstats_minute_idx")
+                ],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="taskstats",
+            constraint=models.UniqueConstraint(
+                fields=("function_name", "minute"), name="taskq_taskstats_unique"
+            ),
+        ),
+    ]
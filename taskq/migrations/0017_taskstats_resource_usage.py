@@ -0,0 +1,37 @@
+# Generated by Django 4.2.30 on 2026-10-19 02:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("taskq", "0016_taskstats"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="taskstats",
+            name="max_rss_delta",
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="taskstats",
+            name="queries",
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="taskstats",
+            name="query_time",
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddField(
+            model_name="taskstats",
+            name="system_time",
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddField(
+            model_name="taskstats",
+            name="user_time",
+            field=models.FloatField(default=0),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 4.2.30 on 2026-10-19 02:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("taskq", "0017_taskstats_resource_usage"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="ephemeraltask",
+            name="trace_context",
+            field=models.CharField(default=None, max_length=255, null=True),
+        ),
+        migrations.AddField(
+            model_name="task",
+            name="trace_context",
+            field=models.CharField(default=None, max_length=255, null=True),
+        ),
+    ]
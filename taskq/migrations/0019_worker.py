@@ -0,0 +1,60 @@
+# Generated by Django 4.2.30 on 2026-10-19 02:53
+
+from django.db import migrations, models
+import django.utils.timezone
+import taskq.fields
+import taskq.models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("taskq", "0018_task_trace_context"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Worker",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "uuid",
+                    taskq.fields.UUIDStringField(
+                        default=taskq.models.generate_task_uuid,
+                        max_length=36,
+                        unique=True,
+                    ),
+                ),
+                ("host", models.CharField(max_length=255)),
+                ("pid", models.IntegerField()),
+                ("databases", models.JSONField(default=list)),
+                ("shards", models.JSONField(default=None, null=True)),
+                ("started_at", models.DateTimeField(default=django.utils.timezone.now)),
+                (
+                    "last_heartbeat",
+                    models.DateTimeField(
+                        db_index=True, default=django.utils.timezone.now
+                    ),
+                ),
+                ("tasks_processed", models.IntegerField(default=0)),
+                ("busy_ratio", models.FloatField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name="ephemeraltask",
+            name="worker",
+            field=taskq.fields.UUIDStringField(default=None, max_length=36, null=True),
+        ),
+        migrations.AddField(
+            model_name="task",
+            name="worker",
+            field=taskq.fields.UUIDStringField(default=None, max_length=36, null=True),
+        ),
+    ]
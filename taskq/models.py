@@ -1,15 +1,21 @@
 import copy
 import datetime
-import importlib
 import logging
 import uuid
 
 from django.core.exceptions import ValidationError
-from django.db import models
+from django.db import connections, models
 from django.utils import timezone
 
 from .exceptions import TaskLoadingError
-from .json import JSONDecoder, JSONEncoder
+from .fields import FunctionNameField, UUIDStringField
+from .json import EncodedDict, JSONDecoder, JSONEncoder, get_codec
+from .payloads import compress, decompress, get_payload_store, get_payload_threshold
+from .profiling import profile
+from .registry import registry
+from .routing import db_for_task_name
+from .sharding import assign_shard
+from .tracing import get_trace_context, use_trace_context
 from .utils import parse_timedelta
 
 logger = logging.getLogger("taskq")
@@ -19,7 +25,99 @@ def generate_task_uuid():
     return str(uuid.uuid4())
 
 
-class Task(models.Model):
+class PercentileCont(models.Aggregate):
+    """The continuous `fraction` percentile of an expression (PostgreSQL)."""
+
+    function = "PERCENTILE_CONT"
+    template = "%(function)s(%(fraction)s) WITHIN GROUP (ORDER BY %(expressions)s)"
+
+    def __init__(self, expression, fraction, **extra):
+        super().__init__(expression, fraction=float(fraction), **extra)
+
+
+class TaskQuerySet(models.QuerySet):
+    def lag_percentiles(self, percentiles=(0.5, 0.9, 0.99), since=None, until=None):
+        """Return the percentiles of the lag of the tasks (the time between
+        their due_at and their started_at) started between `since` (default:
+        an hour ago) and `until`, per function name:
+
+            {"myapp.tasks.add": {"count": 12, "p50": timedelta, ...}}
+
+        The percentiles are computed by PostgreSQL in a single query, and in
+        Python on the other databases.
+        """
+        for fraction in percentiles:
+            if not 0 <= fraction <= 1:
+                raise ValueError(f"Invalid percentile {fraction}")
+
+        if since is None:
+            since = timezone.now() - datetime.timedelta(hours=1)
+        tasks = self.filter(started_at__gte=since)
+        if until is not None:
+            tasks = tasks.filter(started_at__lt=until)
+        lag = models.ExpressionWrapper(
+            models.F("started_at") - models.F("due_at"),
+            output_field=models.DurationField(),
+        )
+        keys = {fraction: f"p{fraction * 100:g}" for fraction in percentiles}
+
+        if connections[tasks.db].vendor != "postgresql":
+            return self._lag_percentiles_in_python(tasks, lag, keys)
+
+        rows = (
+            tasks.values("function_name")
+            .order_by("function_name")
+            .annotate(
+                count=models.Count("pk"),
+                **{
+                    key: PercentileCont(lag, fraction, output_field=lag.output_field)
+                    for fraction, key in keys.items()
+                },
+            )
+        )
+        return {row.pop("function_name"): row for row in rows}
+
+    def with_args(self, **kwargs):
+        """Filter the tasks whose function keyword arguments include `kwargs`:
+
+            Task.objects.with_args(customer_id=42).filter(status=Task.STATUS_QUEUED)
+
+        On PostgreSQL, the lookup is a jsonb containment (@>) which can use the
+        GIN index created by the taskqargsindex command. The tasks whose
+        arguments were offloaded to the payload store never match.
+        """
+        if connections[self.db].vendor == "postgresql":
+            return self.filter(function_args__contains=kwargs)
+        return self.filter(
+            **{f"function_args__{key}": value for key, value in kwargs.items()}
+        )
+
+    @staticmethod
+    def _lag_percentiles_in_python(tasks, lag, keys):
+        lags = {}
+        for function_name, task_lag in tasks.values_list("function_name", lag):
+            lags.setdefault(function_name, []).append(task_lag)
+
+        result = {}
+        for function_name, function_lags in lags.items():
+            function_lags.sort()
+            result[function_name] = {"count": len(function_lags)}
+            for fraction, key in keys.items():
+                # Linear interpolation between the closest ranks, as
+                # PERCENTILE_CONT
+                position = fraction * (len(function_lags) - 1)
+                lower = int(position)
+                upper = min(lower + 1, len(function_lags) - 1)
+                result[function_name][key] = function_lags[lower] + (
+                    function_lags[upper] - function_lags[lower]
+                ) * (position - lower)
+        return result
+
+
+class BaseTask(models.Model):
+    """The fields and behavior shared by the durable Task and the
+    EphemeralTask."""
+
     STATUS_QUEUED = 0  # Task was received and waiting to be run
     STATUS_RUNNING = 1  # Task was started by a worker
     STATUS_SUCCESS = 2  # Task succeeded
@@ -36,13 +134,16 @@ class Task(models.Model):
         (STATUS_FETCHED, "Fetched"),
     )
 
-    uuid = models.CharField(
+    # Statuses of the tasks which are waiting to be run or being run
+    ACTIVE_STATUSES = (STATUS_QUEUED, STATUS_FETCHED, STATUS_RUNNING)
+
+    uuid = UUIDStringField(
         max_length=36, unique=True, editable=False, default=generate_task_uuid
     )
     name = models.CharField(
         max_length=255, null=False, blank=True, default="", db_index=True
     )
-    function_name = models.CharField(
+    function_name = FunctionNameField(
         max_length=255, null=False, blank=False, default=None
     )
     function_args = models.JSONField(
@@ -61,6 +162,28 @@ class Task(models.Model):
     retry_backoff = models.BooleanField(null=False, default=False)
     retry_backoff_factor = models.IntegerField(null=False, default=2)
     timeout = models.DurationField(null=True, default=None)
+    # Shared by all the tasks created by the same fan-out scheduled task run
+    fire_id = UUIDStringField(max_length=36, null=True, default=None, db_index=True)
+    # Reference to the function args offloaded to the payload store (in which
+    # case function_args is empty)
+    payload_ref = models.CharField(max_length=255, null=True, default=None)
+    # Consumers claim the tasks of their preferred shards first, see
+    # settings.TASKQ["shards"] (None when sharding is disabled)
+    shard = models.SmallIntegerField(null=True, default=assign_shard)
+    # When the task was created, last started and finished (the tasks created
+    # before these columns were added have none)
+    created_at = models.DateTimeField(null=True, default=timezone.now)
+    started_at = models.DateTimeField(null=True, default=None)
+    finished_at = models.DateTimeField(null=True, default=None)
+    # The trace context of the code which created the task, see tracing.py
+    trace_context = models.CharField(max_length=255, null=True, default=None)
+    # The uuid of the Worker which last started the task
+    worker = UUIDStringField(max_length=36, null=True, default=None)
+
+    objects = TaskQuerySet.as_manager()
+
+    class Meta:
+        abstract = True
 
     def save(self, *args, **kwargs):
         """Do not allow the Task to be saved with an empty function name."""
@@ -69,27 +192,107 @@ class Task(models.Model):
 
         super().save(*args, **kwargs)
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # The decoded function_args were just built by the JSON decoder and
+        # nothing else holds a reference to them: the first call to
+        # decode_function_args() can hand them out without copying them.
+        instance._owned_function_args = instance.__dict__.get("function_args")
+        return instance
+
     @staticmethod
     def _function_args_and_kwargs_to_dict(args=None, kwargs=None):
-        args_dict = {}
-        if kwargs:
-            args_dict.update(copy.deepcopy(kwargs))
+        """Build the function_args dict from args and kwargs.
+
+        Only the top-level containers are copied: the arguments themselves are
+        serialized (and thus snapshotted) when the task is saved."""
+        args_dict = dict(kwargs) if kwargs else {}
         if args:
-            args_dict["__positional_args__"] = copy.deepcopy(args)
+            args_dict["__positional_args__"] = list(args)
         return args_dict
 
     @staticmethod
-    def _dict_to_function_args_and_kwargs(args_dict):
-        args_dict = copy.deepcopy(args_dict)
-        args = args_dict.pop("__positional_args__", [])
-        kwargs = args_dict
+    def _dict_to_function_args_and_kwargs(args_dict, copy_args=True):
+        """Split a function_args dict into (args, kwargs).
+
+        The returned arguments are deep copies of the ones in `args_dict`,
+        unless `copy_args` is False in which case they share their content
+        with `args_dict`."""
+        if copy_args:
+            args_dict = copy.deepcopy(args_dict)
+        kwargs = dict(args_dict)
+        args = kwargs.pop("__positional_args__", [])
         return args, kwargs
 
     def encode_function_args(self, args=None, kwargs=None):
-        self.function_args = self._function_args_and_kwargs_to_dict(args, kwargs)
+        """Set the function_args of the task, offloading them to the payload
+        store of the database of the task (see routing.db_for_task_name())
+        when they are larger than settings.TASKQ["payload_threshold"]: its
+        name must be set first.
+
+        The args are encoded a single time: the encoding measured against the
+        threshold is the one saved.
+        """
+        function_args = self._function_args_and_kwargs_to_dict(args, kwargs)
+        self.function_args = function_args
+        self.payload_ref = None
+
+        threshold = get_payload_threshold()
+        if threshold is None:
+            return
+
+        # Imported here as the backends depend on this module
+        from .backends import get_backend
+
+        if not get_backend().offloads_payloads:
+            return
+
+        encoded = get_codec().dumps(function_args)
+        if len(encoded) > threshold:
+            self.payload_ref = get_payload_store().save(
+                compress(encoded), using=self._payload_db()
+            )
+            self.function_args = {}
+        else:
+            self.function_args = EncodedDict(function_args, encoded)
+
+    def _payload_db(self):
+        """Return the alias of the database storing the task, and its
+        offloaded payload."""
+        return self._state.db or db_for_task_name(self.name)
 
     def decode_function_args(self):
-        return self._dict_to_function_args_and_kwargs(self.function_args)
+        """Return the (args, kwargs) to pass to the task function.
+
+        Function arguments offloaded to the payload store are loaded here.
+
+        The function arguments freshly loaded from the database are returned
+        without being copied the first time this method is called. In every
+        other case they are deep-copied, so that the task function cannot
+        modify the function_args of the task.
+        """
+        if self.payload_ref:
+            # The offloaded args are decoded on each call: no need to copy them
+            data = get_payload_store().load(self.payload_ref, using=self._payload_db())
+            encoded = decompress(data)
+            return self._dict_to_function_args_and_kwargs(
+                get_codec().loads(encoded), copy_args=False
+            )
+
+        owned = getattr(self, "_owned_function_args", None)
+        copy_args = owned is None or owned is not self.function_args
+        self._owned_function_args = None
+
+        return self._dict_to_function_args_and_kwargs(
+            self.function_args, copy_args=copy_args
+        )
+
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        if self.payload_ref:
+            get_payload_store().delete([self.payload_ref], using=self._payload_db())
+        return result
 
     def update_due_at_after_failure(self):
         """Update its due_at date taking into account the number of retries and
@@ -114,31 +317,28 @@ class Task(models.Model):
 
     @staticmethod
     def import_taskified_function(import_path):
-        """Load a @taskified function from a python module.
+        """Return the @taskified function registered as `import_path`,
+        autodiscovering the tasks.py modules first if they weren't.
 
-        Returns TaskLoadingError if loading of the function failed.
+        Modules are never imported from the function name (which may come from
+        an untrusted source): raises TaskLoadingError if no such function was
+        registered.
         """
-        # https://stackoverflow.com/questions/3606202
-        module_name, unit_name = import_path.rsplit(".", 1)
-        try:
-            module = importlib.import_module(module_name)
-        except (ImportError, SyntaxError) as e:
-            raise TaskLoadingError(e)
-
-        try:
-            obj = getattr(module, unit_name)
-        except AttributeError as e:
-            raise TaskLoadingError(e)
-
-        if not isinstance(obj, Taskify):
-            msg = f'Object "{import_path}" is not a task'
-            raise TaskLoadingError(msg)
+        obj = registry.get(import_path)
+        if obj is None and not registry.discovered:
+            registry.autodiscover()
+            obj = registry.get(import_path)
+        if obj is None:
+            raise TaskLoadingError(f'Unknown task function "{import_path}"')
 
         return obj
 
     def execute(self):
         taskified_function, args, kwargs = self.load_task()
-        taskified_function._protected_call(args, kwargs)
+        # The profiler is enabled around the call, without adding frames to
+        # the traceback of the task exceptions
+        with use_trace_context(self.trace_context), profile(self):
+            taskified_function._protected_call(args, kwargs)
 
     def __str__(self):
         status = dict(self.STATUS_CHOICES)[self.status]
@@ -151,10 +351,112 @@ class Task(models.Model):
         return str_repr
 
 
+class Task(BaseTask):
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["status", "shard", "due_at"], name="taskq_task_claim_idx"
+            ),
+        ]
+
+
+class EphemeralTask(BaseTask):
+    """A task of a Taskify(durable=False) function, stored in an UNLOGGED table
+    (on PostgreSQL): its changes are not written to the WAL, which makes them
+    much cheaper, but the table is emptied after a crash and not replicated.
+
+    Only use it for cheap tasks which are safe to lose (e.g. cache warming).
+    """
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["status", "shard", "due_at"],
+                name="taskq_ephemeral_claim_idx",
+            ),
+        ]
+
+
+# The tables the consumers claim their tasks from
+TASK_MODELS = (Task, EphemeralTask)
+
+
+class TaskFunction(models.Model):
+    """Lookup table of the function names, used by the compact layout of the
+    Task table (see the taskqcompactstorage command)."""
+
+    id = models.SmallAutoField(primary_key=True)
+    name = models.CharField(max_length=255, unique=True)
+
+
+class TaskPayload(models.Model):
+    """Compressed function arguments of a Task, see payloads.DatabasePayloadStore."""
+
+    data = models.BinaryField()
+
+
+class TaskStats(models.Model):
+    """Execution statistics of the tasks of a function finished during a
+    minute, maintained by the consumers (see stats.py)."""
+
+    function_name = models.CharField(max_length=255)
+    minute = models.DateTimeField()
+    executions = models.IntegerField(default=0)
+    failures = models.IntegerField(default=0)
+    retries = models.IntegerField(default=0)
+    # In seconds
+    total_duration = models.FloatField(default=0)
+    # The counts of a stats.DurationSketch
+    duration_sketch = models.JSONField(default=list)
+    # Resource usage, see stats.ResourceUsage: CPU times and queries
+    # durations in seconds, and max_rss_delta in KiB (the largest growth of
+    # the peak memory usage of a single task)
+    user_time = models.FloatField(default=0)
+    system_time = models.FloatField(default=0)
+    max_rss_delta = models.IntegerField(default=0)
+    queries = models.IntegerField(default=0)
+    query_time = models.FloatField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["function_name", "minute"], name="taskq_taskstats_unique"
+            ),
+        ]
+        indexes = [models.Index(fields=["minute"], name="taskq_taskstats_minute_idx")]
+
+
+class Worker(models.Model):
+    """A running consumer, which updates its last_heartbeat when it starts a
+    task and at each iteration of its run loop (see workers.py)."""
+
+    uuid = UUIDStringField(max_length=36, unique=True, default=generate_task_uuid)
+    host = models.CharField(max_length=255)
+    pid = models.IntegerField()
+    # The databases and the preferred shards the worker claims its tasks from
+    databases = models.JSONField(default=list)
+    shards = models.JSONField(null=True, default=None)
+    started_at = models.DateTimeField(default=timezone.now)
+    last_heartbeat = models.DateTimeField(default=timezone.now, db_index=True)
+    tasks_processed = models.IntegerField(default=0)
+    # The fraction of its last iteration the worker spent executing tasks
+    busy_ratio = models.FloatField(default=0)
+
+    def __str__(self):
+        return f"<Worker {self.host}:{self.pid}, {self.uuid}>"
+
+
 class Taskify:
-    def __init__(self, function, name=None):
+    def __init__(self, function, name=None, durable=True):
+        """
+        :param durable: When False, the tasks are stored as EphemeralTasks,
+        which are cheaper to write but lost if the database crashes.
+        """
         self._function = function
         self._name = name
+        self._durable = durable
+
+        registry.register(self)
 
     def __call__(self, *args, **kwargs):
         return self._function(*args, **kwargs)
@@ -166,7 +468,21 @@ class Taskify:
     def apply(self, *args, **kwargs):
         return self.__call__(*args, **kwargs)
 
-    def apply_async(
+    def apply_async(self, *args, **kwargs):
+        """Apply a task asynchronously.
+
+        Accepts the same arguments as new_task().
+        """
+        task = self.new_task(*args, **kwargs)
+
+        # Imported here as the backends depend on this module
+        from .backends import get_backend
+
+        get_backend().enqueue(task)
+
+        return task
+
+    def new_task(
         self,
         due_at=None,
         max_retries=3,
@@ -176,8 +492,9 @@ class Taskify:
         timeout=None,
         args=None,
         kwargs=None,
+        name=None,
     ):
-        """Apply a task asynchronously.
+        """Return a new (unsaved) task applying this function.
         .
                 :param Tuple args: The positional arguments to pass on to the task.
 
@@ -190,6 +507,9 @@ class Taskify:
                                 (None = no timeout)
                                 (int = number of seconds)
                 :type timeout: timedelta or int or None
+
+                :param str name: The name of the task.
+                                 (None = the name of this function)
         """
 
         if due_at is None:
@@ -199,9 +519,9 @@ class Taskify:
         if kwargs is None:
             kwargs = {}
 
-        task = Task()
+        task = Task() if self._durable else EphemeralTask()
         task.due_at = due_at
-        task.name = self.name
+        task.name = self.name if name is None else name
         task.status = Task.STATUS_QUEUED
         task.function_name = self.func_name
         task.encode_function_args(args, kwargs)
@@ -210,7 +530,7 @@ class Taskify:
         task.retry_backoff = retry_backoff
         task.retry_backoff_factor = retry_backoff_factor
         task.timeout = parse_timedelta(timeout, nullable=True)
-        task.save()
+        task.trace_context = get_trace_context()
 
         return task
 
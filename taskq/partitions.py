@@ -0,0 +1,302 @@
+"""Optional PostgreSQL range partitioning of the task table by due_at.
+
+Once converted with `taskqpartition convert`, the task table is a partitioned
+table with one partition per interval (day, week or month), a DEFAULT
+partition catching the tasks due after the last partition, and a legacy
+partition holding the tasks due before the conversion.
+
+The partitions must be created ahead of time with `taskqpartition create`,
+and the partitions which only contain expired finished tasks can be dropped
+as a whole instead of deleting their rows (see purge.purge_tasks).
+
+The consumers claim the queued tasks due before now, whatever their age, so
+the claim query can't prune the older partitions (nor the legacy one): it
+probes the claim index of every partition. This is a single index lookup for
+the partitions without queued tasks, but it grows with the number of
+partitions, which dropping the expired partitions keeps bounded.
+"""
+
+import datetime
+import logging
+import re
+from collections import namedtuple
+
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import Task
+from .payloads import get_payload_store
+
+logger = logging.getLogger("taskq")
+
+INTERVALS = ("day", "week", "month")
+
+Partition = namedtuple("Partition", ["name", "lower", "upper", "is_default"])
+
+_BOUNDS_RE = re.compile(r"FROM \((?:'(.+?)'|MINVALUE)\) TO \((?:'(.+?)'|MAXVALUE)\)")
+
+
+def interval_start(dt, interval):
+    """Return the start (in UTC) of the interval containing `dt`."""
+    dt = dt.astimezone(datetime.timezone.utc)
+    start = dt.replace(hour=0, minute=0, second=0, microsecond=0)
+    if interval == "week":
+        start -= datetime.timedelta(days=start.weekday())
+    elif interval == "month":
+        start = start.replace(day=1)
+    elif interval != "day":
+        raise ValueError(f'Unexpected partition interval "{interval}"')
+    return start
+
+
+def next_interval_start(start, interval):
+    if interval == "day":
+        return start + datetime.timedelta(days=1)
+    if interval == "week":
+        return start + datetime.timedelta(days=7)
+    # Jump in the next month, then go back to its first day
+    return interval_start(start + datetime.timedelta(days=32), "month")
+
+
+def partition_name(start):
+    return f"{Task._meta.db_table}_p{start:%Y%m%d}"
+
+
+def is_partitioned(using=DEFAULT_DB_ALIAS):
+    connection = connections[using]
+    if connection.vendor != "postgresql":
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT relkind FROM pg_class WHERE relname = %s",
+            [Task._meta.db_table],
+        )
+        row = cursor.fetchone()
+    return row is not None and row[0] == "p"
+
+
+def list_partitions(using=DEFAULT_DB_ALIAS):
+    """Return the partitions of the task table, ordered by lower bound."""
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            "SELECT c.relname, pg_get_expr(c.relpartbound, c.oid) "
+            "FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = %s::regclass",
+            [Task._meta.db_table],
+        )
+        rows = cursor.fetchall()
+
+    partitions = []
+    for name, bounds in rows:
+        if bounds == "DEFAULT":
+            partitions.append(Partition(name, None, None, True))
+            continue
+
+        lower, upper = _BOUNDS_RE.search(bounds).groups()
+        lower = parse_datetime(lower) if lower else None
+        upper = parse_datetime(upper) if upper else None
+        partitions.append(Partition(name, lower, upper, False))
+
+    min_datetime = datetime.datetime.min.replace(tzinfo=datetime.timezone.utc)
+    return sorted(partitions, key=lambda p: (p.is_default, p.lower or min_datetime))
+
+
+def convert_to_partitioned(interval, ahead, using=DEFAULT_DB_ALIAS):
+    """Convert the task table of the database `using` to a partitioned table,
+    in a single transaction.
+
+    The existing table becomes the partition of the tasks due before the
+    current interval, the tasks due later are moved to the new partitions.
+    """
+    connection = connections[using]
+    qn = connection.ops.quote_name
+    table = Task._meta.db_table
+    legacy_table = f"{table}_legacy"
+    sequence = f"{table}_partitioned_id_seq"
+    boundary = interval_start(timezone.now(), interval)
+
+    with transaction.atomic(using=using):
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(cursor, table)
+            pk_name = next(n for n, c in constraints.items() if c["primary_key"])
+
+            statements = [
+                f"LOCK TABLE {qn(table)} IN ACCESS EXCLUSIVE MODE",
+                f"ALTER TABLE {qn(table)} RENAME TO {qn(legacy_table)}",
+                f"CREATE SEQUENCE {qn(sequence)}",
+                f"SELECT setval('{sequence}', COALESCE(MAX(id), 0) + 1, false) "
+                f"FROM {qn(legacy_table)}",
+                f"CREATE TABLE {qn(table)} (LIKE {qn(legacy_table)} "
+                f"INCLUDING DEFAULTS INCLUDING CONSTRAINTS) PARTITION BY RANGE (due_at)",
+                f"ALTER TABLE {qn(table)} ALTER COLUMN id "
+                f"SET DEFAULT nextval('{sequence}')",
+                f"ALTER SEQUENCE {qn(sequence)} OWNED BY {qn(table)}.id",
+                # The unique constraints must include the partition key
+                f"ALTER TABLE {qn(table)} ADD PRIMARY KEY (id, due_at)",
+                f"CREATE UNIQUE INDEX ON {qn(table)} (uuid, due_at)",
+                f"CREATE INDEX ON {qn(table)} (due_at)",
+                f"CREATE INDEX ON {qn(table)} (status)",
+                f"CREATE INDEX ON {qn(table)} (name)",
+                f"CREATE INDEX ON {qn(table)} (fire_id)",
+                f"CREATE INDEX ON {qn(table)} (status, shard, due_at)",
+                f"CREATE TABLE {qn(table + '_default')} PARTITION OF {qn(table)} DEFAULT",
+            ]
+            for statement in statements:
+                cursor.execute(statement)
+
+        create_partitions(interval, ahead, using=using)
+
+        with connection.cursor() as cursor:
+            statements = [
+                f"WITH moved AS (DELETE FROM {qn(legacy_table)} WHERE due_at >= %s "
+                f"RETURNING *) INSERT INTO {qn(table)} SELECT * FROM moved",
+                # Lets ATTACH PARTITION skip the validation scan
+                f"ALTER TABLE {qn(legacy_table)} ADD CONSTRAINT "
+                f"{qn(legacy_table + '_due_at_check')} CHECK (due_at < %s)",
+            ]
+            for statement in statements:
+                cursor.execute(statement, [boundary])
+
+            # The identity column and the primary key of the legacy table are
+            # not allowed in a partition.
+            cursor.execute(
+                "SELECT attidentity FROM pg_attribute "
+                "WHERE attrelid = %s::regclass AND attname = 'id'",
+                [legacy_table],
+            )
+            if cursor.fetchone()[0]:
+                cursor.execute(
+                    f"ALTER TABLE {qn(legacy_table)} ALTER COLUMN id DROP IDENTITY"
+                )
+            cursor.execute(
+                f"ALTER TABLE {qn(legacy_table)} DROP CONSTRAINT {qn(pk_name)}"
+            )
+            cursor.execute(
+                f"ALTER TABLE {qn(table)} ATTACH PARTITION {qn(legacy_table)} "
+                f"FOR VALUES FROM (MINVALUE) TO (%s)",
+                [boundary],
+            )
+
+
+def create_partitions(interval, ahead, now=None, using=DEFAULT_DB_ALIAS):
+    """Create the partitions of the current interval and of the `ahead` next
+    ones in the database `using`, skipping the ranges already covered by a
+    partition.
+
+    The tasks of these ranges already stored in the DEFAULT partition are moved
+    to the new partitions. Returns the names of the created partitions.
+    """
+    connection = connections[using]
+    qn = connection.ops.quote_name
+    table = Task._meta.db_table
+    default_partition = None
+    covered = []
+    for partition in list_partitions(using):
+        if partition.is_default:
+            default_partition = partition.name
+        else:
+            covered.append(partition)
+
+    created = []
+    start = interval_start(now or timezone.now(), interval)
+    for _ in range(ahead + 1):
+        end = next_interval_start(start, interval)
+        overlaps = any(
+            (p.lower is None or p.lower < end) and (p.upper is None or start < p.upper)
+            for p in covered
+        )
+
+        if not overlaps:
+            name = partition_name(start)
+            with transaction.atomic(using=using), connection.cursor() as cursor:
+                if default_partition:
+                    cursor.execute(
+                        f"CREATE TEMPORARY TABLE taskq_moved_tasks "
+                        f"(LIKE {qn(table)}) ON COMMIT DROP"
+                    )
+                    cursor.execute(
+                        f"WITH moved AS (DELETE FROM {qn(default_partition)} "
+                        f"WHERE due_at >= %s AND due_at < %s RETURNING *) "
+                        f"INSERT INTO taskq_moved_tasks SELECT * FROM moved",
+                        [start, end],
+                    )
+                cursor.execute(
+                    f"CREATE TABLE {qn(name)} PARTITION OF {qn(table)} "
+                    f"FOR VALUES FROM (%s) TO (%s)",
+                    [start, end],
+                )
+                if default_partition:
+                    cursor.execute(
+                        f"INSERT INTO {qn(table)} SELECT * FROM taskq_moved_tasks"
+                    )
+                    cursor.execute("DROP TABLE taskq_moved_tasks")
+            created.append(name)
+            logger.info("Partition %s created", name)
+
+        start = end
+
+    return created
+
+
+def drop_expired_partitions(retention, archive=None, now=None, using=DEFAULT_DB_ALIAS):
+    """Drop the partitions which only contain finished tasks older than their
+    status retention: both their due_at (the partition key) and their
+    finished_at, see purge.purge_tasks().
+
+    :param retention: A dict {status: timedelta}, see purge.get_retention().
+    :param archive: A purge.TaskArchive the tasks are written to before their
+    partition is dropped.
+    :param using: The alias of the database storing the task table.
+
+    Returns the names of the dropped partitions.
+    """
+    if not retention:
+        return []
+
+    connection = connections[using]
+    qn = connection.ops.quote_name
+    cutoff = (now or timezone.now()) - max(retention.values())
+    statuses = list(retention)
+    fields = [field.attname for field in Task._meta.concrete_fields]
+
+    dropped = []
+    for partition in list_partitions(using):
+        if partition.is_default or partition.upper is None:
+            continue
+        if partition.upper > cutoff:
+            continue
+
+        with transaction.atomic(using=using), connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT EXISTS (SELECT 1 FROM {qn(partition.name)} "
+                f"WHERE NOT (status = ANY(%s)) OR finished_at >= %s)",
+                [statuses, cutoff],
+            )
+            if cursor.fetchone()[0]:
+                continue
+
+            partition_tasks = Task.objects.using(using).filter(
+                due_at__lt=partition.upper
+            )
+            if partition.lower is not None:
+                partition_tasks = partition_tasks.filter(due_at__gte=partition.lower)
+
+            if archive is not None:
+                archive.write(partition_tasks.values(*fields).iterator(), using=using)
+
+            payload_refs = list(
+                partition_tasks.filter(payload_ref__isnull=False).values_list(
+                    "payload_ref", flat=True
+                )
+            )
+
+            cursor.execute(f"DROP TABLE {qn(partition.name)}")
+
+        if payload_refs:
+            get_payload_store().delete(payload_refs, using=using)
+
+        dropped.append(partition.name)
+        logger.info("Partition %s dropped", partition.name)
+
+    return dropped
@@ -0,0 +1,128 @@
+import os
+import tempfile
+import uuid
+import zlib
+
+from django.apps import apps
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from .exceptions import PayloadNotFoundError
+from .utils import cached_setting
+
+
+class PayloadStore:
+    """Store the compressed function arguments of the tasks whose encoded
+    arguments are larger than settings.TASKQ["payload_threshold"] bytes.
+
+    Only a reference to the payload is kept in the Task row. `using` is the
+    alias of the database storing the task, which the stores keeping the
+    payloads in a database use as well.
+    """
+
+    def save(self, data, using=None):
+        """Store `data` (bytes) and return a reference (str) to it."""
+        raise NotImplementedError
+
+    def load(self, ref, using=None):
+        """Return the data stored for the reference `ref`, or raise a
+        PayloadNotFoundError."""
+        raise NotImplementedError
+
+    def delete(self, refs, using=None):
+        """Delete the payloads referenced by `refs`, ignoring the missing
+        ones."""
+        raise NotImplementedError
+
+
+class DatabasePayloadStore(PayloadStore):
+    """Store the payloads in the TaskPayload table of the database of their
+    task."""
+
+    @property
+    def _model(self):
+        return apps.get_model("taskq", "TaskPayload")
+
+    def save(self, data, using=None):
+        return str(self._model.objects.using(using).create(data=data).pk)
+
+    def load(self, ref, using=None):
+        payloads = self._model.objects.using(using)
+        try:
+            data = payloads.values_list("data", flat=True).get(pk=ref)
+        except self._model.DoesNotExist:
+            raise PayloadNotFoundError(f'Payload "{ref}" not found')
+        return bytes(data)
+
+    def delete(self, refs, using=None):
+        self._model.objects.using(using).filter(pk__in=refs).delete()
+
+
+class FileSystemPayloadStore(PayloadStore):
+    """Store the payloads as files in `directory`, which must be shared by
+    all the producers and consumers."""
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def _path(self, ref):
+        # Spread the files among 256 sub-directories
+        return os.path.join(self.directory, ref[:2], ref)
+
+    def save(self, data, using=None):
+        ref = str(uuid.uuid4())
+        path = self._path(ref)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        # Write to a temporary file first so that a payload is never read
+        # partially written.
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+        return ref
+
+    def load(self, ref, using=None):
+        try:
+            with open(self._path(ref), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            raise PayloadNotFoundError(f'Payload "{ref}" not found')
+
+    def delete(self, refs, using=None):
+        for ref in refs:
+            try:
+                os.remove(self._path(ref))
+            except FileNotFoundError:
+                pass
+
+
+def get_payload_threshold():
+    """Return the size in bytes above which the encoded function arguments of a
+    task are offloaded to the payload store, or None if offloading is
+    disabled."""
+    return getattr(settings, "TASKQ", {}).get("payload_threshold")
+
+
+@cached_setting
+def get_payload_store():
+    """Return the store configured with settings.TASKQ["payload_store"] and
+    settings.TASKQ["payload_store_options"] (cached).
+
+    Defaults to DatabasePayloadStore.
+    """
+    taskq_config = getattr(settings, "TASKQ", {})
+    store_cls_str = taskq_config.get(
+        "payload_store", "taskq.payloads.DatabasePayloadStore"
+    )
+    options = taskq_config.get("payload_store_options", {})
+    return import_string(store_cls_str)(**options)
+
+
+def compress(encoded):
+    return zlib.compress(encoded.encode("utf-8"))
+
+
+def decompress(data):
+    return zlib.decompress(data).decode("utf-8")
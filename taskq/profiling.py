@@ -0,0 +1,152 @@
+"""Profiling of a sample of the task executions, configured with
+settings.TASKQ["profiling"]:
+
+    TASKQ = {
+        "profiling": {
+            "directory": "/var/tmp/taskq-profiles",
+            # "cprofile" (default) or "tracemalloc"
+            "mode": "cprofile",
+            # The fraction of the executions to profile (default: 0)
+            "sample_rate": 0.01,
+            # The functions whose executions are all profiled
+            "functions": ["myapp.tasks.slow_task"],
+        }
+    }
+
+Each profiled execution writes a file named after the task uuid and its
+retries count in the directory:
+
+- cprofile: <uuid>-<retries>.pstats, to load with pstats or snakeviz,
+- tracemalloc: <uuid>-<retries>.tracemalloc.txt, the lines of code which
+  allocated the most memory during the execution ("top", default: 25).
+"""
+
+import cProfile
+import logging
+import os
+import random
+import tracemalloc
+from contextlib import contextmanager
+
+from django.conf import settings
+
+from .utils import cached_setting
+
+logger = logging.getLogger("taskq")
+
+PROFILING_MODES = ("cprofile", "tracemalloc")
+
+
+@cached_setting
+def get_profiling_config():
+    """Return settings.TASKQ["profiling"] with its defaults (cached), or None
+    when profiling is disabled."""
+    config = getattr(settings, "TASKQ", {}).get("profiling")
+    if not config:
+        return None
+
+    config = {
+        "mode": "cprofile",
+        "sample_rate": 0,
+        "functions": [],
+        "top": 25,
+        **config,
+    }
+    if "directory" not in config:
+        raise ValueError('Missing settings.TASKQ["profiling"]["directory"]')
+    if config["mode"] not in PROFILING_MODES:
+        raise ValueError(f"Unknown profiling mode \"{config['mode']}\"")
+    sample_rate = config["sample_rate"]
+    if (
+        not isinstance(sample_rate, (int, float))
+        or isinstance(sample_rate, bool)
+        or not 0 <= sample_rate <= 1
+    ):
+        raise ValueError(
+            'settings.TASKQ["profiling"]["sample_rate"] must be a number '
+            "between 0 and 1"
+        )
+    if isinstance(config["functions"], str):
+        raise ValueError(
+            'settings.TASKQ["profiling"]["functions"] must be a list of names'
+        )
+    config["functions"] = frozenset(config["functions"])
+    return config
+
+
+def should_profile(task, config):
+    return task.function_name in config["functions"] or (
+        random.random() < config["sample_rate"]
+    )
+
+
+@contextmanager
+def profile(task):
+    """Profile the block executing `task` when it is sampled, see the module
+    documentation."""
+    config = get_profiling_config()
+    if config is None or not should_profile(task, config):
+        yield
+        return
+
+    try:
+        os.makedirs(config["directory"], exist_ok=True)
+    except OSError:
+        # Profiling must never fail the task: run it without profiling
+        logger.exception(
+            "Couldn't create the profiling directory %s", config["directory"]
+        )
+        yield
+        return
+
+    path = os.path.join(config["directory"], f"{task.uuid}-{task.retries}")
+    if config["mode"] == "cprofile":
+        profiler = _profile_cpu(path)
+    else:
+        profiler = _profile_memory(path, config["top"])
+    with profiler:
+        yield
+
+
+@contextmanager
+def _profile_cpu(path):
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        try:
+            profiler.dump_stats(f"{path}.pstats")
+        except OSError:
+            logger.exception("Couldn't write the profile %s.pstats", path)
+
+
+@contextmanager
+def _profile_memory(path, top):
+    started = not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start()
+    tracemalloc.reset_peak()
+    before = tracemalloc.take_snapshot()
+    try:
+        yield
+    finally:
+        after = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+        if started:
+            tracemalloc.stop()
+
+        # Ignore the memory allocated by tracemalloc itself
+        ignored = [tracemalloc.Filter(False, tracemalloc.__file__)]
+        differences = after.filter_traces(ignored).compare_to(
+            before.filter_traces(ignored), "lineno"
+        )
+        try:
+            with open(f"{path}.tracemalloc.txt", "w") as f:
+                f.write(f"Peak traced memory: {peak / 1024:.1f} KiB\n")
+                f.write(f"Top {top} allocations:\n")
+                for difference in differences[:top]:
+                    f.write(f"{difference}\n")
+        except OSError:
+            logger.exception("Couldn't write the profile %s.tracemalloc.txt", path)
@@ -0,0 +1,146 @@
+import gzip
+import logging
+import os
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .constants import TASKQ_DEFAULT_PURGE_BATCH_SIZE
+from .json import get_codec
+from .models import TASK_MODELS, Task
+from .partitions import drop_expired_partitions, is_partitioned
+from .payloads import decompress, get_payload_store
+from .utils import parse_timedelta
+
+logger = logging.getLogger("taskq")
+
+RETENTION_STATUSES = {
+    "success": Task.STATUS_SUCCESS,
+    "failed": Task.STATUS_FAILED,
+    "canceled": Task.STATUS_CANCELED,
+}
+
+
+def get_retention():
+    """Return the retention of the finished tasks configured with
+    settings.TASKQ["retention"] as a dict {status: timedelta}.
+
+    e.g. TASKQ = {"retention": {"success": 7 * 24 * 3600, "failed": timedelta(days=30)}}
+
+    Tasks with a status missing from the settings are never purged.
+    """
+    retention = getattr(settings, "TASKQ", {}).get("retention", {})
+
+    unknown = set(retention) - set(RETENTION_STATUSES)
+    if unknown:
+        raise ValueError(f"Unexpected retention statuses: {', '.join(unknown)}")
+
+    return {
+        RETENTION_STATUSES[name]: parse_timedelta(delay)
+        for name, delay in retention.items()
+    }
+
+
+class TaskArchive:
+    """Write the purged tasks to a gzip compressed JSON Lines file created in
+    `directory`."""
+
+    def __init__(self, directory):
+        timestamp = timezone.now().strftime("%Y%m%dT%H%M%S%f")
+        self.path = os.path.join(directory, f"taskq-{timestamp}.jsonl.gz")
+        self._file = None
+
+    def write(self, rows, using=None):
+        """Write the task `rows` (dicts) of the database `using`."""
+        if self._file is None:
+            self._file = gzip.open(self.path, "wt", encoding="utf-8")
+
+        codec = get_codec()
+        for row in rows:
+            if row["payload_ref"]:
+                # The offloaded payload is deleted with the task: archive it
+                data = get_payload_store().load(row["payload_ref"], using=using)
+                row["function_args"] = codec.loads(decompress(data))
+            self._file.write(codec.dumps(row))
+            self._file.write("\n")
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def purge_tasks(
+    retention,
+    batch_size=TASKQ_DEFAULT_PURGE_BATCH_SIZE,
+    archive=None,
+    max_batches=None,
+    using=DEFAULT_DB_ALIAS,
+):
+    """Delete the finished tasks (durable and ephemeral) which finished longer
+    ago than their status retention, in batches of `batch_size` tasks
+    paginated by id so that no long lock is ever held. The tasks finished
+    before finished_at was recorded expire from their due_at instead.
+
+    :param retention: A dict {status: timedelta}, see get_retention().
+    :param archive: A TaskArchive the tasks are written to before being deleted.
+    :param max_batches: The maximum number of batches to delete (None = no limit).
+    :param using: The alias of the database to purge.
+
+    When the task table is partitioned (see the taskqpartition command), the
+    partitions only containing expired tasks are dropped first.
+
+    Returns the number of deleted tasks, not counting the dropped partitions.
+    """
+    now = timezone.now()
+    if is_partitioned(using):
+        drop_expired_partitions(retention, archive=archive, now=now, using=using)
+
+    fields = ["id", "payload_ref"]
+    if archive is not None:
+        fields = [field.attname for field in Task._meta.concrete_fields]
+
+    deleted_count = 0
+    batch_count = 0
+    for task_model in TASK_MODELS:
+        for status, delay in retention.items():
+            last_id = 0
+            while max_batches is None or batch_count < max_batches:
+                rows = list(
+                    task_model.objects.using(using)
+                    .alias(expires_from=Coalesce("finished_at", "due_at"))
+                    .filter(status=status, expires_from__lt=now - delay, id__gt=last_id)
+                    .order_by("id")
+                    .values(*fields)[:batch_size]
+                )
+                if not rows:
+                    break
+
+                last_id = rows[-1]["id"]
+                if archive is not None:
+                    archive.write(rows, using=using)
+
+                task_model.objects.using(using).filter(
+                    id__in=[row["id"] for row in rows]
+                ).delete()
+
+                payload_refs = [
+                    row["payload_ref"] for row in rows if row["payload_ref"]
+                ]
+                if payload_refs:
+                    get_payload_store().delete(payload_refs, using=using)
+
+                deleted_count += len(rows)
+                batch_count += 1
+
+    if deleted_count:
+        logger.info("%s finished tasks purged", deleted_count)
+
+    return deleted_count
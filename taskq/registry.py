@@ -0,0 +1,41 @@
+import logging
+
+from django.utils.module_loading import autodiscover_modules
+
+logger = logging.getLogger("taskq")
+
+
+class TaskRegistry:
+    """Keep track of every @taskified function by its function name
+    ("module.function"), so that they can be resolved without importing their
+    module each time a task is executed.
+    """
+
+    def __init__(self):
+        self._tasks = {}
+        # Whether the tasks modules were autodiscovered
+        self.discovered = False
+
+    def register(self, taskified_function):
+        self._tasks[taskified_function.func_name] = taskified_function
+
+    def get(self, function_name):
+        """Return the @taskified function registered as `function_name`, or
+        None if no such function was registered."""
+        return self._tasks.get(function_name)
+
+    def autodiscover(self):
+        """Import the `tasks` module of each application in INSTALLED_APPS,
+        registering all the @taskified functions they define."""
+        autodiscover_modules("tasks")
+        self.discovered = True
+        logger.info("%s tasks registered", len(self._tasks))
+
+    def __contains__(self, function_name):
+        return function_name in self._tasks
+
+    def __len__(self):
+        return len(self._tasks)
+
+
+registry = TaskRegistry()
@@ -0,0 +1,98 @@
+"""Spread the tasks over several databases.
+
+    TASKQ = {
+        "databases": ["queue1", "queue2"],
+        "database_routes": {"myapp.tasks.send_email": "queue2"},
+    }
+
+Each task is stored in the database its name is routed to, or else in the
+database picked by a rendezvous (highest random weight) hash of its name, so
+that adding a database only moves the tasks of 1/N of the names. All the tasks
+of a name (e.g. all the runs of a scheduled task) are stored in the same
+database.
+"""
+
+import hashlib
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+from .utils import cached_setting
+
+
+@cached_setting
+def get_databases():
+    """Return the aliases of the databases storing the tasks, configured with
+    settings.TASKQ["databases"] (cached). Defaults to the default database.
+    """
+    databases = getattr(settings, "TASKQ", {}).get("databases") or [DEFAULT_DB_ALIAS]
+
+    unknown = [alias for alias in databases if alias not in settings.DATABASES]
+    if unknown:
+        raise ValueError(f"Unexpected databases: {', '.join(unknown)}")
+
+    return list(databases)
+
+
+def get_consumer_databases(databases=None):
+    """Validate and return the aliases of the databases a consumer claims its
+    tasks from.
+
+    :param databases: An iterable of aliases, or None for all the databases.
+    """
+    all_databases = get_databases()
+    if databases is None:
+        return all_databases
+
+    unknown = [alias for alias in databases if alias not in all_databases]
+    if unknown or not databases:
+        raise ValueError(
+            f"Unexpected databases {list(databases)}, expected databases among "
+            f"{', '.join(all_databases)}"
+        )
+    return list(databases)
+
+
+@cached_setting
+def get_database_routes():
+    """Return the {task name: database alias} routes configured with
+    settings.TASKQ["database_routes"] (cached)."""
+    routes = getattr(settings, "TASKQ", {}).get("database_routes", {})
+
+    databases = get_databases()
+    unknown = [alias for alias in routes.values() if alias not in databases]
+    if unknown:
+        raise ValueError(
+            f'Databases missing from TASKQ["databases"]: {", ".join(unknown)}'
+        )
+
+    return dict(routes)
+
+
+def _rendezvous_weight(alias, name):
+    digest = hashlib.blake2b(f"{alias}:{name}".encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big")
+
+
+def db_for_task_name(name):
+    """Return the alias of the database storing the tasks named `name`."""
+    route = get_database_routes().get(name)
+    if route is not None:
+        return route
+
+    databases = get_databases()
+    if len(databases) == 1:
+        return databases[0]
+    return max(databases, key=lambda alias: _rendezvous_weight(alias, name))
+
+
+def bulk_create_tasks(tasks, batch_size=None):
+    """Insert the (unsaved) `tasks` in their database, with one bulk insert per
+    database and task model."""
+    grouped_tasks = defaultdict(list)
+    for task in tasks:
+        grouped_tasks[(type(task), db_for_task_name(task.name))].append(task)
+
+    for (task_model, alias), group in grouped_tasks.items():
+        task_model.objects.using(alias).bulk_create(group, batch_size=batch_size)
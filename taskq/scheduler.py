@@ -3,12 +3,20 @@ import datetime
 from croniter import croniter
 from django.conf import settings
 from django.utils import timezone
+from django.utils.module_loading import import_string
 
-from .models import Task
+from .models import Task, generate_task_uuid
+from .routing import db_for_task_name
 from .utils import parse_timedelta
 
 
 class ScheduledTask:
+    OVERLAP_QUEUE = "queue"  # Always create a new task (default)
+    OVERLAP_SKIP = "skip"  # Don't create a task while a previous one is active
+    OVERLAP_REPLACE = "replace"  # Cancel the previous queued tasks
+
+    OVERLAP_CHOICES = (OVERLAP_QUEUE, OVERLAP_SKIP, OVERLAP_REPLACE)
+
     def __init__(
         self,
         name,
@@ -20,7 +28,13 @@ class ScheduledTask:
         retry_backoff=False,
         retry_backoff_factor=2,
         timeout=None,
+        overlap=OVERLAP_QUEUE,
+        generator=None,
+        chunk_size=1000,
     ):
+        if overlap not in self.OVERLAP_CHOICES:
+            raise ValueError(f'Unexpected overlap value "{overlap}"')
+
         self.name = name
         self.task = task  # The function to be executed
         self.args = args if args else {}
@@ -30,6 +44,12 @@ class ScheduledTask:
         self.retry_backoff = retry_backoff
         self.retry_backoff_factor = retry_backoff_factor
         self.timeout = parse_timedelta(timeout, nullable=True)
+        self.overlap = overlap
+        # Import path of a generator function yielding (args, kwargs) tuples.
+        # When set, one Task is created per yielded tuple each time the
+        # scheduled task is due (fan-out).
+        self.generator = generator
+        self.chunk_size = chunk_size
 
         self.update_due_at()
 
@@ -50,16 +70,40 @@ class ScheduledTask:
         now = timezone.now()
         return self.due_at <= now
 
+    @property
+    def is_fanout(self):
+        return self.generator is not None
+
     @property
     def as_task(self):
         """
         Note that the returned Task is not saved in database, you still need to call.save() on it.
         """
+        return self._new_task(kwargs=self.args)
+
+    def generate_tasks(self):
+        """Yield a new Task for each (args, kwargs) tuple produced by the
+        generator function of a fan-out scheduled task.
+
+        The generator function is called with the scheduled task `args` as
+        keyword arguments. All the created tasks share the same fire_id.
+
+        Note that the yielded Tasks are not saved in database.
+        """
+        fire_id = generate_task_uuid()
+        generator = import_string(self.generator)
+
+        for args, kwargs in generator(**self.args):
+            task = self._new_task(args, kwargs)
+            task.fire_id = fire_id
+            yield task
+
+    def _new_task(self, args=None, kwargs=None):
         task = Task()
         task.name = self.name
         task.due_at = self.due_at
         task.function_name = self.function_name
-        task.encode_function_args(kwargs=self.args)
+        task.encode_function_args(args, kwargs)
         task.max_retries = self.max_retries
         task.retry_delay = self.retry_delay
         task.retry_backoff = self.retry_backoff
@@ -68,8 +112,16 @@ class ScheduledTask:
 
         return task
 
+    @property
+    def database(self):
+        """The alias of the database storing the tasks of this scheduled task."""
+        return db_for_task_name(self.name)
+
     def create_task(self):
-        self.as_task.save()
+        # Imported here as the backends depend on this module
+        from .backends import get_backend
+
+        get_backend().enqueue(self.as_task)
 
 
 class Scheduler:
@@ -83,6 +135,10 @@ class Scheduler:
             new_task = ScheduledTask(name=task_name, **task_config)
             self._tasks.append(new_task)
 
+    @property
+    def tasks(self):
+        return list(self._tasks)
+
     @property
     def due_tasks(self):
         """Returns all the task which are due (task.is_due == True)"""
@@ -0,0 +1,53 @@
+import random
+
+from django.conf import settings
+
+from .utils import cached_setting
+
+
+@cached_setting
+def get_shard_count():
+    """Return the number of shards the tasks are spread over, configured with
+    settings.TASKQ["shards"] (cached). None if sharding is disabled.
+    """
+    shard_count = getattr(settings, "TASKQ", {}).get("shards")
+    if shard_count is not None and shard_count < 1:
+        raise ValueError(f"Unexpected shard count {shard_count}")
+    return shard_count
+
+
+def assign_shard():
+    """Return the shard of a new task, or None if sharding is disabled.
+
+    The shards are assigned uniformly at random (like the task uuids they
+    would otherwise be hashed from), so that each shard holds the same share
+    of the queue.
+    """
+    shard_count = get_shard_count()
+    if shard_count is None:
+        return None
+    return random.randrange(shard_count)
+
+
+def get_preferred_shards(shards=None):
+    """Validate and return the shards a consumer claims its tasks from first.
+
+    :param shards: An iterable of shards, or None to pick one at random.
+
+    Returns None if sharding is disabled.
+    """
+    shard_count = get_shard_count()
+    if shard_count is None:
+        return None
+
+    if shards is None:
+        return [random.randrange(shard_count)]
+
+    shards = sorted(set(shards))
+    invalid = [shard for shard in shards if not 0 <= shard < shard_count]
+    if not shards or invalid:
+        raise ValueError(
+            f"Unexpected shards {shards}, expected shards between 0 and "
+            f"{shard_count - 1}"
+        )
+    return shards
@@ -0,0 +1,347 @@
+"""Per function and per minute execution statistics of the tasks.
+
+The consumers buffer the statistics of the tasks they execute, and write them
+to the TaskStats table at most once per run loop iteration, with a single
+upsert on PostgreSQL. Dashboards read a few rows per function and minute
+instead of aggregating the Task table:
+
+    >>> get_stats(since=now() - timedelta(hours=1))
+    {"myapp.tasks.add": {"executions": 120, "failures": 2, "p95": timedelta, ...}}
+
+With settings.TASKQ["resource_accounting"] = True, the statistics also count
+the CPU time, the growth of the peak memory usage and the SQL queries of the
+tasks (see ResourceUsage).
+
+The statistics are disabled with settings.TASKQ["stats"] = False, and the rows
+older than settings.TASKQ["stats_retention"] (default: 30 days) are deleted
+when the tasks are purged.
+"""
+
+import bisect
+import datetime
+import math
+import sys
+import time
+from contextlib import ExitStack
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from django.conf import settings
+from django.db import connections, router, transaction
+from django.utils import timezone
+
+from .constants import TASKQ_DEFAULT_STATS_RETENTION
+from .json import get_codec
+from .models import Task, TaskStats
+from .utils import parse_timedelta
+
+# The bucket i of a DurationSketch counts the durations up to
+# SKETCH_MIN_DURATION * SKETCH_GROWTH ** i seconds (i.e. 1ms to ~2h, with a
+# relative error below 19%). The last bucket counts the longer durations.
+SKETCH_MIN_DURATION = 0.001
+SKETCH_GROWTH = 2**0.25
+SKETCH_BOUNDS = [SKETCH_MIN_DURATION * SKETCH_GROWTH**i for i in range(92)]
+
+
+def stats_enabled():
+    return getattr(settings, "TASKQ", {}).get("stats", True)
+
+
+def resource_accounting_enabled():
+    return getattr(settings, "TASKQ", {}).get("resource_accounting", False)
+
+
+class ResourceUsage:
+    """Measure the resources used by the code run in the block: user and
+    system CPU time (in seconds), growth of the peak resident set size (in
+    KiB), and number and duration (in seconds) of the SQL queries run on any
+    database connection of the current thread.
+
+    The CPU time is the one of the current thread where the platform supports
+    it (Linux), and of the whole process elsewhere, which includes the other
+    threads (e.g. the metrics exporters). The peak resident set size is always
+    the one of the process.
+
+        with ResourceUsage() as usage:
+            task.execute()
+        usage.user_time
+    """
+
+    def __init__(self):
+        self.user_time = 0.0
+        self.system_time = 0.0
+        self.max_rss_delta = 0
+        self.queries = 0
+        self.query_time = 0.0
+        self._stack = None
+
+    def __enter__(self):
+        self._stack = ExitStack()
+        for connection in connections.all():
+            self._stack.enter_context(connection.execute_wrapper(self._count_query))
+        self._start = _getrusage()
+        return self
+
+    def __exit__(self, *exc_info):
+        end = _getrusage()
+        self._stack.close()
+        if self._start is not None:
+            self.user_time = end.ru_utime - self._start.ru_utime
+            self.system_time = end.ru_stime - self._start.ru_stime
+            self.max_rss_delta = _max_rss_kib(end) - _max_rss_kib(self._start)
+
+    def _count_query(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.query_time += time.perf_counter() - start
+
+
+def _getrusage():
+    if resource is None:
+        return None
+    return resource.getrusage(getattr(resource, "RUSAGE_THREAD", resource.RUSAGE_SELF))
+
+
+def _max_rss_kib(usage):
+    # ru_maxrss is in bytes on macOS, and in KiB elsewhere
+    if sys.platform == "darwin":
+        return usage.ru_maxrss // 1024
+    return usage.ru_maxrss
+
+
+class DurationSketch:
+    """A histogram of durations with exponential buckets. Sketches are merged
+    by adding their counts."""
+
+    def __init__(self, counts=None):
+        self.counts = list(counts) if counts else [0] * (len(SKETCH_BOUNDS) + 1)
+
+    def add(self, seconds):
+        self.counts[bisect.bisect_left(SKETCH_BOUNDS, seconds)] += 1
+
+    def merge(self, other):
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+
+    @property
+    def total(self):
+        return sum(self.counts)
+
+    def quantile(self, fraction):
+        """Return the upper bound of the bucket of the `fraction` quantile in
+        seconds (None when the sketch is empty)."""
+        rank = math.ceil(fraction * self.total)
+        cumulated = 0
+        for i, count in enumerate(self.counts):
+            cumulated += count
+            if count and cumulated >= rank:
+                return SKETCH_BOUNDS[min(i, len(SKETCH_BOUNDS) - 1)]
+        return None
+
+
+class StatsBuffer:
+    """Accumulate the statistics of the finished tasks until they are
+    written."""
+
+    def __init__(self):
+        self._rows = {}
+
+    def record(self, task, duration, usage=None):
+        """Count the execution of `task` which took `duration` seconds, given
+        its new status, and the ResourceUsage of its execution."""
+        minute = timezone.now().replace(second=0, microsecond=0)
+        key = (task.function_name, minute)
+        if key not in self._rows:
+            row = TaskStats(function_name=task.function_name, minute=minute)
+            self._rows[key] = (row, DurationSketch())
+        row, sketch = self._rows[key]
+
+        row.executions += 1
+        if task.status == Task.STATUS_FAILED:
+            row.failures += 1
+        elif task.status == Task.STATUS_QUEUED:
+            row.retries += 1
+        row.total_duration += duration
+        sketch.add(duration)
+        if usage is not None:
+            row.user_time += usage.user_time
+            row.system_time += usage.system_time
+            row.max_rss_delta = max(row.max_rss_delta, usage.max_rss_delta)
+            row.queries += usage.queries
+            row.query_time += usage.query_time
+
+    def pop(self):
+        """Return the buffered (unsaved) TaskStats and empty the buffer."""
+        rows = []
+        for row, sketch in self._rows.values():
+            row.duration_sketch = sketch.counts
+            rows.append(row)
+        self._rows = {}
+        return rows
+
+
+def update_stats(rows, using=None):
+    """Add the counts of the (unsaved) TaskStats `rows` to the TaskStats
+    table."""
+    if not rows:
+        return
+
+    using = using or router.db_for_write(TaskStats)
+    connection = connections[using]
+    if connection.vendor == "postgresql":
+        _upsert_stats(rows, connection)
+        return
+
+    with transaction.atomic(using=using):
+        for row in rows:
+            existing = (
+                TaskStats.objects.using(using)
+                .select_for_update()
+                .filter(function_name=row.function_name, minute=row.minute)
+                .first()
+            )
+            if existing is None:
+                row.save(using=using)
+                continue
+
+            existing.executions += row.executions
+            existing.failures += row.failures
+            existing.retries += row.retries
+            existing.total_duration += row.total_duration
+            existing.user_time += row.user_time
+            existing.system_time += row.system_time
+            existing.max_rss_delta = max(existing.max_rss_delta, row.max_rss_delta)
+            existing.queries += row.queries
+            existing.query_time += row.query_time
+            sketch = DurationSketch(existing.duration_sketch)
+            sketch.merge(DurationSketch(row.duration_sketch))
+            existing.duration_sketch = sketch.counts
+            existing.save(using=using)
+
+
+# The columns of TaskStats summed by the upserts
+SUMMED_COLUMNS = [
+    "executions",
+    "failures",
+    "retries",
+    "total_duration",
+    "user_time",
+    "system_time",
+    "queries",
+    "query_time",
+]
+
+
+def _upsert_stats(rows, connection):
+    table = connection.ops.quote_name(TaskStats._meta.db_table)
+    columns = ["function_name", "minute", *SUMMED_COLUMNS, "max_rss_delta"]
+    placeholders = ", ".join(["%s"] * len(columns) + ["%s::jsonb"])
+    values = ", ".join([f"({placeholders})"] * len(rows))
+    params = []
+    for row in rows:
+        params += [getattr(row, column) for column in columns]
+        params.append(get_codec().dumps(row.duration_sketch))
+
+    updates = "".join(
+        f"{column} = stats.{column} + EXCLUDED.{column}, " for column in SUMMED_COLUMNS
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {table} AS stats ({', '.join(columns)}, duration_sketch) "
+            f"VALUES {values} "
+            f"ON CONFLICT (function_name, minute) DO UPDATE SET {updates}"
+            "max_rss_delta = GREATEST(stats.max_rss_delta, EXCLUDED.max_rss_delta), "
+            "duration_sketch = ("
+            "  SELECT jsonb_agg(old.count::bigint + new.count::bigint ORDER BY i) "
+            "  FROM jsonb_array_elements_text(stats.duration_sketch) "
+            "    WITH ORDINALITY AS old(count, i) "
+            "  JOIN jsonb_array_elements_text(EXCLUDED.duration_sketch) "
+            "    WITH ORDINALITY AS new(count, i) USING (i)"
+            ")",
+            params,
+        )
+
+
+def get_stats(since=None, until=None, percentiles=(0.5, 0.95, 0.99), using=None):
+    """Return the statistics of the tasks finished between `since` (default:
+    an hour ago) and `until`, per function name:
+
+        {"myapp.tasks.add": {
+            "executions": 120,
+            "failures": 2,
+            "retries": 5,
+            "failure_rate": 0.016,
+            "mean_duration": timedelta,
+            "p50": timedelta,
+            ...
+            "user_time": timedelta,
+            "system_time": timedelta,
+            "max_rss_delta": 1024,
+            "queries": 360,
+            "query_time": timedelta,
+        }}
+
+    The percentiles are approximated from the duration sketches. The resource
+    usage is only counted with settings.TASKQ["resource_accounting"].
+    """
+    if since is None:
+        since = timezone.now() - datetime.timedelta(hours=1)
+    rows = TaskStats.objects.using(using).filter(minute__gte=since)
+    if until is not None:
+        rows = rows.filter(minute__lt=until)
+
+    totals = {}
+    for row in rows:
+        if row.function_name not in totals:
+            totals[row.function_name] = (TaskStats(), DurationSketch())
+        total, sketch = totals[row.function_name]
+        total.executions += row.executions
+        total.failures += row.failures
+        total.retries += row.retries
+        total.total_duration += row.total_duration
+        total.user_time += row.user_time
+        total.system_time += row.system_time
+        total.max_rss_delta = max(total.max_rss_delta, row.max_rss_delta)
+        total.queries += row.queries
+        total.query_time += row.query_time
+        sketch.merge(DurationSketch(row.duration_sketch))
+
+    stats = {}
+    for function_name, (total, sketch) in totals.items():
+        function_stats = stats[function_name] = {
+            "executions": total.executions,
+            "failures": total.failures,
+            "retries": total.retries,
+            "failure_rate": total.failures / total.executions,
+            "mean_duration": datetime.timedelta(
+                seconds=total.total_duration / total.executions
+            ),
+            "user_time": datetime.timedelta(seconds=total.user_time),
+            "system_time": datetime.timedelta(seconds=total.system_time),
+            "max_rss_delta": total.max_rss_delta,
+            "queries": total.queries,
+            "query_time": datetime.timedelta(seconds=total.query_time),
+        }
+        for fraction in percentiles:
+            function_stats[f"p{fraction * 100:g}"] = datetime.timedelta(
+                seconds=sketch.quantile(fraction)
+            )
+    return stats
+
+
+def purge_stats(using=None):
+    """Delete the statistics older than settings.TASKQ["stats_retention"].
+    Returns the number of deleted rows."""
+    retention = getattr(settings, "TASKQ", {}).get(
+        "stats_retention", TASKQ_DEFAULT_STATS_RETENTION
+    )
+    expired = TaskStats.objects.using(using).filter(
+        minute__lt=timezone.now() - parse_timedelta(retention)
+    )
+    deleted_count, _ = expired.delete()
+    return deleted_count
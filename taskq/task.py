@@ -1,18 +1,22 @@
-import importlib
-
 from django.conf import settings
+from django.utils.module_loading import import_string
 
 from taskq.models import Taskify
+from taskq.utils import cached_setting
+
+
+@cached_setting
+def get_default_taskify_class():
+    """Return the Taskify class configured in settings.TASKQ (cached)."""
+    default_cls_str = getattr(settings, "TASKQ", {}).get("default_taskify_class")
+    if default_cls_str:
+        return import_string(default_cls_str)
+    return Taskify
 
 
 def taskify(func=None, *, name=None, base=None, **kwargs):
     if base is None:
-        default_cls_str = getattr(settings, "TASKQ", {}).get("default_taskify_class")
-        if default_cls_str:
-            module_name, unit_name = default_cls_str.rsplit(".", 1)
-            base = getattr(importlib.import_module(module_name), unit_name)
-        else:
-            base = Taskify
+        base = get_default_taskify_class()
 
     def wrapper_taskify(_func):
         return base(_func, name=name, **kwargs)
@@ -0,0 +1,88 @@
+"""Timing of the phases of the consumer run loop iterations.
+
+Each iteration of Consumer.run() times its phases:
+
+- schedule: creating the tasks of the due scheduled tasks, including
+  schedule_lock_wait, the time spent waiting for the lock shared by the
+  consumers,
+- claim: claiming the due tasks,
+- process: executing the claimed tasks,
+- purge: purging the finished tasks (including purge_lock_wait),
+- stats: writing the execution statistics,
+- sleep.
+
+The timings of each iteration are passed to the callables listed (as import
+strings) in settings.TASKQ["iteration_hooks"] and appended to
+Consumer.iteration_hooks:
+
+    def on_iteration(consumer, timings):
+        statsd.timing("taskq.claim", timings.phases.get("claim", 0))
+
+The iterations slower than settings.TASKQ["slow_iteration_threshold"] (in
+seconds, sleep excluded) are logged as warnings.
+"""
+
+import contextvars
+from contextlib import ExitStack, contextmanager
+from time import perf_counter
+
+# The timings of the iteration run by the current thread
+_current_timings = contextvars.ContextVar("taskq_iteration_timings", default=None)
+
+
+class IterationTimings:
+    """The duration of the phases of an iteration, in seconds."""
+
+    def __init__(self):
+        self.phases = {}
+        self._started_at = perf_counter()
+        self.duration = None
+
+    @contextmanager
+    def phase(self, name):
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0) + perf_counter() - start
+
+    @contextmanager
+    def activate(self):
+        """Collect the phases timed by phase() in the block, and set the
+        duration of the iteration (sleep excluded) at its end."""
+        token = _current_timings.set(self)
+        try:
+            yield self
+        finally:
+            _current_timings.reset(token)
+            self.duration = (
+                perf_counter() - self._started_at - self.phases.get("sleep", 0)
+            )
+
+    def __str__(self):
+        phases = ", ".join(
+            f"{name} {seconds:.3f}s" for name, seconds in self.phases.items()
+        )
+        return f"{self.duration:.3f}s ({phases})"
+
+
+@contextmanager
+def phase(name):
+    """Time the block as the phase `name` of the current iteration, if any."""
+    timings = _current_timings.get()
+    if timings is None:
+        yield
+        return
+
+    with timings.phase(name):
+        yield
+
+
+@contextmanager
+def timed_enter(context_manager, name):
+    """Enter `context_manager`, timing its entrance (e.g. waiting for a lock)
+    as the phase `name`."""
+    with ExitStack() as stack:
+        with phase(name):
+            value = stack.enter_context(context_manager)
+        yield value
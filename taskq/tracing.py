@@ -0,0 +1,97 @@
+"""Propagation of a trace context (e.g. a W3C traceparent or a correlation id)
+from the code creating the tasks to their execution.
+
+The trace context set in the current context is stored with the tasks created
+by apply_async(), and restored while they are executed (so the tasks they
+create inherit it):
+
+    with use_trace_context(request.headers.get("traceparent")):
+        send_email.apply_async(...)
+
+The consumers report two spans per execution to the tracer configured with
+settings.TASKQ["tracer"] and settings.TASKQ["tracer_options"]:
+
+- taskq.queue_wait, from when the task was created (or due, if later) to when
+  it was started,
+- taskq.execute, around the execution of the task function.
+
+The default Tracer does nothing, LoggingTracer logs the spans.
+"""
+
+import contextvars
+import logging
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .utils import cached_setting
+
+logger = logging.getLogger("taskq")
+
+_trace_context = contextvars.ContextVar("taskq_trace_context", default=None)
+
+
+def get_trace_context():
+    """Return the trace context of the current context (or None)."""
+    return _trace_context.get()
+
+
+@contextmanager
+def use_trace_context(trace_context):
+    """Set the trace context of the code run in the block."""
+    token = _trace_context.set(trace_context)
+    try:
+        yield
+    finally:
+        _trace_context.reset(token)
+
+
+class Tracer:
+    """The interface of the tracers, which does nothing."""
+
+    def record_span(self, name, task, start, end):
+        """Report the span `name` of `task` which lasted from the `start` to
+        the `end` datetimes."""
+
+    @contextmanager
+    def span(self, name, task):
+        """Report the span `name` of `task` lasting for the block."""
+        yield
+
+
+class LoggingTracer(Tracer):
+    """Log the spans with their trace context."""
+
+    def __init__(self, level=logging.INFO):
+        self.level = level
+
+    def record_span(self, name, task, start, end):
+        logger.log(
+            self.level,
+            "%s : Span %s took %.3fs (trace context %s)",
+            task,
+            name,
+            (end - start).total_seconds(),
+            task.trace_context,
+            extra={"span": name, "trace_context": task.trace_context},
+        )
+
+    @contextmanager
+    def span(self, name, task):
+        start = timezone.now()
+        try:
+            yield
+        finally:
+            self.record_span(name, task, start, timezone.now())
+
+
+@cached_setting
+def get_tracer():
+    """Return the tracer configured with settings.TASKQ["tracer"] and
+    settings.TASKQ["tracer_options"] (cached)."""
+    taskq_config = getattr(settings, "TASKQ", {})
+    tracer_cls_str = taskq_config.get("tracer", "taskq.tracing.Tracer")
+    options = taskq_config.get("tracer_options", {})
+    return import_string(tracer_cls_str)(**options)
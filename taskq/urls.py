@@ -0,0 +1,9 @@
+from django.urls import path
+
+from . import views
+
+app_name = "taskq"
+
+urlpatterns = [
+    path("tasks/", views.ingest_tasks, name="ingest_tasks"),
+]
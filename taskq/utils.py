@@ -1,6 +1,10 @@
 import datetime
+import functools
+import itertools
 import traceback
 
+from django.core.signals import setting_changed
+
 
 def ordinal(n: int):
     """Output the ordinal representation ("1st", "2nd", "3rd", etc.) of any number."""
@@ -12,6 +16,31 @@ def ordinal(n: int):
     return str(n) + suffix
 
 
+def cached_setting(func):
+    """Cache the result of `func`, a function without arguments reading
+    settings.TASKQ, until settings.TASKQ changes (e.g. with override_settings
+    in the tests)."""
+    cached_func = functools.lru_cache(maxsize=None)(func)
+
+    def clear_cache(setting, **kwargs):
+        if setting == "TASKQ":
+            cached_func.cache_clear()
+
+    setting_changed.connect(clear_cache, weak=False)
+    return cached_func
+
+
+def chunks(iterable, size):
+    """Split any iterable into lists of at most `size` items, without
+    consuming more than `size` items of the iterable at a time."""
+    iterator = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
 def parse_timedelta(delay, nullable=False):
     """A convenience function to create a timedelta from seconds.
 
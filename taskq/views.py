@@ -0,0 +1,124 @@
+"""HTTP ingestion of tasks, for producers which are not written in Python.
+
+    urlpatterns = [path("taskq/", include("taskq.urls"))]
+
+    POST /taskq/tasks/
+    Authorization: Bearer <token>
+
+    {"tasks": [{"function_name": "myapp.tasks.send_email", "kwargs": {...}}]}
+
+Each task is a record as accepted by taskqimport (see taskq.ingest). The
+tasks without a trace_context get the traceparent header of the request. The
+response contains the uuids of the created tasks:
+
+    {"created": 1, "uuids": ["..."]}
+
+Only the registered @taskified functions are accepted. Either all the tasks
+are created or the response is an error: 400 for invalid tasks (with the
+error of each one), 409 when a uuid already exists.
+
+The requests are authorized by the callable (taking the request and returning
+a bool) configured with settings.TASKQ["ingest_auth"]. All the requests are
+rejected when it is not set. taskq.views.token_auth accepts the bearer tokens
+listed in settings.TASKQ["ingest_tokens"].
+"""
+
+import functools
+import hmac
+import json
+
+from django.conf import settings
+from django.db import DataError, IntegrityError
+from django.http import JsonResponse
+from django.utils.module_loading import import_string
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+
+from .backends import get_backend
+from .constants import TASKQ_DEFAULT_INGEST_MAX_TASKS
+from .exceptions import InvalidTaskRecord
+from .ingest import task_from_record
+from .registry import registry
+from .tracing import use_trace_context
+
+
+def token_auth(request):
+    """Accept the requests with an "Authorization: Bearer <token>" header
+    whose token is listed in settings.TASKQ["ingest_tokens"]."""
+    scheme, _, token = request.headers.get("Authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return False
+
+    tokens = getattr(settings, "TASKQ", {}).get("ingest_tokens", [])
+    # Compare every token in constant time
+    matches = [hmac.compare_digest(token.encode(), t.encode()) for t in tokens]
+    return any(matches)
+
+
+@functools.lru_cache(maxsize=None)
+def _autodiscover():
+    # Register the @taskified functions the tasks are validated against
+    registry.autodiscover()
+
+
+def _error(message, status=400, **kwargs):
+    return JsonResponse({"error": message, **kwargs}, status=status)
+
+
+@csrf_exempt
+@require_POST
+def ingest_tasks(request):
+    taskq_config = getattr(settings, "TASKQ", {})
+    auth = taskq_config.get("ingest_auth")
+    if auth is None or not import_string(auth)(request):
+        return _error("Forbidden", status=403)
+
+    try:
+        body = json.loads(request.body)
+    except ValueError:
+        return _error("Invalid JSON")
+
+    records = body.get("tasks") if isinstance(body, dict) else None
+    if not isinstance(records, list) or not records:
+        return _error('Expected a non empty "tasks" list')
+
+    max_tasks = taskq_config.get("ingest_max_tasks", TASKQ_DEFAULT_INGEST_MAX_TASKS)
+    if len(records) > max_tasks:
+        return _error(f"Too many tasks, the maximum is {max_tasks}")
+
+    traceparent = request.headers.get("traceparent")
+    if traceparent is not None and len(traceparent) > 255:
+        return _error("Invalid traceparent header")
+
+    _autodiscover()
+
+    tasks = []
+    errors = {}
+    uuids = set()
+    # The tasks without trace_context are linked to the request trace
+    with use_trace_context(traceparent):
+        for index, record in enumerate(records):
+            try:
+                task = task_from_record(record)
+            except InvalidTaskRecord as e:
+                errors[index] = str(e)
+                continue
+            if task.uuid in uuids:
+                errors[index] = f'Duplicate uuid "{task.uuid}"'
+            uuids.add(task.uuid)
+            tasks.append(task)
+
+    # Either all the tasks are created, or none of them
+    if errors:
+        return _error("Invalid tasks", errors=errors)
+
+    try:
+        get_backend().bulk_enqueue(tasks)
+    except IntegrityError:
+        return _error("A task with one of these uuids already exists", status=409)
+    except DataError as e:
+        return _error(f"Invalid tasks: {e}")
+
+    return JsonResponse(
+        {"created": len(tasks), "uuids": [task.uuid for task in tasks]}, status=201
+    )
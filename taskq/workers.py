@@ -0,0 +1,84 @@
+"""Registry of the running consumers.
+
+Each consumer registers a Worker row when its run loop starts, before it
+claims any task, and deletes it when it stops. It updates the row with a single
+UPDATE (last_heartbeat, tasks_processed and busy_ratio, the fraction of the
+iteration spent executing tasks) when each task starts and after each
+iteration. The tasks reference the worker which started them with their
+`worker` field.
+
+The workers whose last heartbeat is older than settings.TASKQ["worker_timeout"]
+(default: 15 minutes) are dead (e.g. killed) and pruned by the other consumers.
+The timeout must be longer than the longest time between two heartbeats, i.e.
+the longest task timeout plus the sleep rate and the other phases of the run
+loop (e.g. the creation of the scheduled tasks, or the purge).
+
+The taskqworkers command lists the workers, their running task and the ratio of
+idle workers.
+"""
+
+import os
+import socket
+
+from django.conf import settings
+from django.db import router
+from django.utils import timezone
+
+from .constants import TASKQ_DEFAULT_WORKER_TIMEOUT
+from .models import Worker
+from .utils import parse_timedelta
+
+
+def get_worker_timeout():
+    return parse_timedelta(
+        getattr(settings, "TASKQ", {}).get(
+            "worker_timeout", TASKQ_DEFAULT_WORKER_TIMEOUT
+        )
+    )
+
+
+def new_worker(databases, shards=None):
+    """Return an unsaved Worker for the current process."""
+    return Worker(
+        host=socket.gethostname(),
+        pid=os.getpid(),
+        databases=list(databases),
+        shards=sorted(shards) if shards is not None else None,
+    )
+
+
+def heartbeat(worker):
+    """Update the heartbeat and the counters of `worker`, and register it when
+    it is new or was pruned."""
+    worker.last_heartbeat = timezone.now()
+    if worker.pk is None:
+        worker.save()
+        return
+
+    updated = (
+        Worker.objects.using(router.db_for_write(Worker))
+        .filter(pk=worker.pk)
+        .update(
+            last_heartbeat=worker.last_heartbeat,
+            tasks_processed=worker.tasks_processed,
+            busy_ratio=worker.busy_ratio,
+        )
+    )
+    if not updated:
+        worker.pk = None
+        worker.save()
+
+
+def unregister_worker(worker):
+    Worker.objects.using(router.db_for_write(Worker)).filter(uuid=worker.uuid).delete()
+
+
+def prune_workers(timeout=None):
+    """Delete the workers whose last heartbeat is older than `timeout` (default:
+    settings.TASKQ["worker_timeout"]). Returns the number of deleted
+    workers."""
+    if timeout is None:
+        timeout = get_worker_timeout()
+    dead = Worker.objects.filter(last_heartbeat__lt=timezone.now() - timeout)
+    deleted_count, _ = dead.delete()
+    return deleted_count
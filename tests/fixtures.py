@@ -1,7 +1,7 @@
 import threading
 
 from taskq.exceptions import Cancel
-from taskq.models import Taskify
+from taskq.models import Task, Taskify
 from taskq.task import taskify
 
 
@@ -82,6 +82,21 @@ def d():
     raise ValueError('I don\'t know what comes after "d"')
 
 
+@taskify
+def count_tasks():
+    return Task.objects.count() + Task.objects.count()
+
+
+def fanout_arguments(count):
+    for i in range(count):
+        yield [i], {"b": 1}
+
+
+def fanout_failing():
+    yield [1], {"b": 1}
+    raise ValueError("Fan-out is failing")
+
+
 class MyTaskify(Taskify):
     def __init__(self, func, name=None, foo=None):
         self.foo = foo
@@ -117,3 +132,10 @@ def counter_increment():
     global _COUNTER_LOCK
     with _COUNTER_LOCK:
         _COUNTER += 1
+
+
+@taskify(durable=False)
+def ephemeral_counter_increment():
+    global _COUNTER
+    with _COUNTER_LOCK:
+        _COUNTER += 1
@@ -15,10 +15,25 @@ DATABASES = {
         "PASSWORD": "IN0vRycvrF",
         "HOST": "localhost",
         "PORT": "",
-    }
+    },
+    # Only used by the tests spreading the tasks over several databases
+    "secondary": {
+        "ENGINE": "django.db.backends.postgresql",
+        "NAME": "taskq_secondary",
+        "USER": "postgres",
+        "PASSWORD": "IN0vRycvrF",
+        "HOST": "localhost",
+        "PORT": "",
+    },
+    # Only used by the tests of the SQLite backend
+    "sqlite": {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": "taskq.sqlite3",
+    },
 }
 
-INSTALLED_APPS = ["taskq"]
+# The tests app registers the @taskified functions of tests/fixtures.py
+INSTALLED_APPS = ["taskq", "tests"]
 
 if django.VERSION >= (1, 10):
     MIDDLEWARE = ()
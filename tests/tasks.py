@@ -0,0 +1,3 @@
+# Register the @taskified functions of the fixtures when the tasks modules are
+# autodiscovered
+from . import fixtures  # noqa: F401
@@ -0,0 +1,59 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import TransactionTestCase
+from django.utils.timezone import now
+
+from taskq.models import Task
+
+
+class ArgsIndexTestCase(TransactionTestCase):
+    databases = {"default", "sqlite"}
+
+    def test_with_args(self):
+        """with_args() returns the tasks whose kwargs include the given ones."""
+        for using in ("default", "sqlite"):
+            with self.subTest(using=using):
+                tasks = Task.objects.using(using)
+                tasks.create(
+                    function_name="tests.fixtures.do_nothing",
+                    function_args={"customer_id": 42, "notify": True},
+                    due_at=now(),
+                )
+                tasks.create(
+                    function_name="tests.fixtures.do_nothing",
+                    function_args={"customer_id": 43},
+                    due_at=now(),
+                )
+
+                self.assertEqual(
+                    [task.function_args for task in tasks.with_args(customer_id=42)],
+                    [{"customer_id": 42, "notify": True}],
+                )
+                self.assertFalse(tasks.with_args(customer_id=42, notify=False).exists())
+
+    def test_args_index_command(self):
+        """taskqargsindex creates a GIN index used by with_args()."""
+        call_command("taskqargsindex", "create", stdout=StringIO())
+        self.addCleanup(call_command, "taskqargsindex", "drop", stdout=StringIO())
+
+        with connection.cursor() as cursor:
+            cursor.execute("SET enable_seqscan = off")
+        try:
+            plan = Task.objects.with_args(customer_id=42).explain()
+        finally:
+            with connection.cursor() as cursor:
+                cursor.execute("RESET enable_seqscan")
+        self.assertIn("taskq_task_args_gin", plan)
+
+    def test_args_index_command_dry_run(self):
+        """taskqargsindex --dry-run prints the statements."""
+        out = StringIO()
+        call_command("taskqargsindex", "create", "--dry-run", stdout=out)
+
+        self.assertIn(
+            'CREATE INDEX CONCURRENTLY IF NOT EXISTS "taskq_task_args_gin" '
+            'ON "taskq_task" USING gin (function_args jsonb_path_ops);',
+            out.getvalue(),
+        )
@@ -0,0 +1,134 @@
+from datetime import timedelta
+
+from django.test import SimpleTestCase, TransactionTestCase, override_settings
+from django.utils.timezone import now
+
+from taskq.backends import get_backend
+from taskq.consumer import Consumer
+from taskq.models import Task
+from . import fixtures
+
+MEMORY = {"backend": "taskq.backends.MemoryBackend"}
+MEMORY_EAGER = {
+    "backend": "taskq.backends.MemoryBackend",
+    "backend_options": {"eager": True},
+}
+
+
+class MemoryBackendTestCase(SimpleTestCase):
+    """SimpleTestCase fails on any database query."""
+
+    def setUp(self):
+        fixtures.counter_reset()
+
+    @override_settings(TASKQ=MEMORY)
+    def test_tasks_are_executed_without_database(self):
+        """The memory backend stores the tasks in memory, and the consumers
+        execute them as usual."""
+        task = fixtures.counter_increment.apply_async()
+        future_task = fixtures.counter_increment.apply_async(
+            due_at=now() + timedelta(hours=1)
+        )
+        self.assertEqual(get_backend().tasks, [task, future_task])
+
+        Consumer().execute_tasks()
+
+        self.assertEqual(fixtures.counter_get_value(), 1)
+        self.assertEqual(task.status, Task.STATUS_SUCCESS)
+        self.assertEqual(future_task.status, Task.STATUS_QUEUED)
+
+    @override_settings(TASKQ=MEMORY)
+    def test_failed_tasks_are_retried(self):
+        """The failed tasks are queued again until they exceed their
+        max_retries."""
+        task = fixtures.failing.apply_async(max_retries=1)
+        consumer = Consumer()
+
+        with self.assertLogs("taskq", "ERROR"):
+            consumer.execute_tasks()
+            self.assertEqual(task.status, Task.STATUS_QUEUED)
+            self.assertEqual(task.retries, 1)
+            consumer.execute_tasks()
+
+        self.assertEqual(task.status, Task.STATUS_FAILED)
+
+    @override_settings(TASKQ=MEMORY_EAGER)
+    def test_eager_tasks_are_executed_when_enqueued(self):
+        """With eager=True, tasks are executed by apply_async and their
+        exceptions are raised."""
+        task = fixtures.task_add.apply_async(args=[1, 2])
+        self.assertEqual(task.status, Task.STATUS_SUCCESS)
+
+        self.assertRaises(Exception, fixtures.failing.apply_async)
+        self.assertEqual(get_backend().tasks[-1].status, Task.STATUS_FAILED)
+
+        task = fixtures.self_cancelling.apply_async()
+        self.assertEqual(task.status, Task.STATUS_CANCELED)
+
+    @override_settings(
+        TASKQ={
+            **MEMORY,
+            "schedule": {
+                "my-scheduled-task": {
+                    "task": "tests.fixtures.do_nothing",
+                    "cron": "0 1 * * *",
+                    "overlap": "skip",
+                },
+                "my-fanout-task": {
+                    "task": "tests.fixtures.counter_increment",
+                    "generator": "tests.fixtures.fanout_arguments",
+                    "args": {"count": 3},
+                    "cron": "0 1 * * *",
+                },
+            },
+        }
+    )
+    def test_scheduled_tasks(self):
+        """The memory backend creates the tasks of the scheduled tasks."""
+        consumer = Consumer()
+        for scheduled_task in consumer._scheduler._tasks:
+            scheduled_task.due_at -= timedelta(days=1)
+
+        consumer.create_scheduled_tasks()
+
+        names = [task.name for task in get_backend().tasks]
+        self.assertEqual(names.count("my-scheduled-task"), 1)
+        self.assertEqual(names.count("my-fanout-task"), 3)
+
+    @override_settings(TASKQ=MEMORY)
+    def test_purge(self):
+        """The memory backend purges the finished tasks."""
+        task = fixtures.counter_increment.apply_async(due_at=now() - timedelta(days=8))
+        task.status = Task.STATUS_SUCCESS
+
+        retention = {Task.STATUS_SUCCESS: timedelta(days=7)}
+        self.assertEqual(get_backend().purge(retention), 1)
+        self.assertEqual(get_backend().tasks, [])
+
+
+@override_settings(
+    TASKQ={"backend": "taskq.backends.SQLiteBackend", "databases": ["sqlite"]}
+)
+class SQLiteBackendTestCase(TransactionTestCase):
+    databases = {"default", "sqlite"}
+
+    def setUp(self):
+        fixtures.counter_reset()
+
+    def test_tasks_are_executed(self):
+        """The SQLite backend stores and claims the tasks in SQLite."""
+        task = fixtures.counter_increment.apply_async()
+        self.assertEqual(Task.objects.using("sqlite").count(), 1)
+
+        Consumer().execute_tasks()
+
+        self.assertEqual(fixtures.counter_get_value(), 1)
+        task = Task.objects.using("sqlite").get(pk=task.pk)
+        self.assertEqual(task.status, Task.STATUS_SUCCESS)
+
+    def test_tasks_are_claimed_once(self):
+        """A task claimed by a consumer is not claimed by the others."""
+        fixtures.counter_increment.apply_async()
+
+        self.assertEqual(len(Consumer().fetch_due_tasks()), 1)
+        self.assertEqual(Consumer().fetch_due_tasks(), [])
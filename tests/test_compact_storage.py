@@ -0,0 +1,81 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+
+from taskq.consumer import Consumer
+from taskq.fields import function_names
+from taskq.models import Task, TaskFunction
+from . import fixtures
+from .utils import create_task
+
+
+class CompactStorageTestCase(TestCase):
+    """The schema changes made by taskqcompactstorage are rolled back at the
+    end of each test, as TestCase runs each test in a transaction."""
+
+    def setUp(self):
+        function_names.clear()
+        self.addCleanup(function_names.clear)
+
+    def _column_types(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT column_name, data_type FROM information_schema.columns "
+                "WHERE table_name = 'taskq_task'"
+            )
+            return dict(cursor.fetchall())
+
+    def test_compact_storage_converts_columns(self):
+        """taskqcompactstorage converts the task table columns to compact
+        types."""
+        call_command("taskqcompactstorage", stdout=StringIO())
+
+        column_types = self._column_types()
+        self.assertEqual(column_types["uuid"], "uuid")
+        self.assertEqual(column_types["fire_id"], "uuid")
+        self.assertEqual(column_types["status"], "smallint")
+        self.assertEqual(column_types["retries"], "smallint")
+        self.assertEqual(column_types["function_name"], "smallint")
+
+    def test_compact_storage_dry_run(self):
+        """taskqcompactstorage --dry-run prints the SQL statements without
+        executing them."""
+        out = StringIO()
+        call_command("taskqcompactstorage", dry_run=True, stdout=out)
+
+        self.assertIn("ALTER TABLE", out.getvalue())
+        self.assertEqual(self._column_types()["uuid"], "character varying")
+
+    def test_compact_storage_keeps_existing_tasks(self):
+        """Existing tasks are readable after the conversion."""
+        task = create_task(function_name="tests.fixtures.task_add", name="Banana")
+
+        call_command("taskqcompactstorage", stdout=StringIO())
+
+        converted = Task.objects.get(pk=task.pk)
+        self.assertEqual(converted.uuid, task.uuid)
+        self.assertEqual(converted.function_name, "tests.fixtures.task_add")
+        self.assertEqual(str(converted), str(task))
+        self.assertEqual(TaskFunction.objects.get().name, "tests.fixtures.task_add")
+
+    def test_compact_storage_is_transparent(self):
+        """Tasks can be created, queried and executed with the compact
+        layout."""
+        call_command("taskqcompactstorage", stdout=StringIO())
+
+        task = fixtures.task_add.apply_async(args=[1, 2])
+        fixtures.task_add.apply_async(args=[3, 4])
+        fixtures.do_nothing.apply_async()
+
+        self.assertEqual(
+            Task.objects.filter(function_name="tests.fixtures.task_add").count(), 2
+        )
+        self.assertEqual(TaskFunction.objects.count(), 2)
+        self.assertEqual(Task.objects.get(uuid=task.uuid).pk, task.pk)
+
+        consumer = Consumer()
+        consumer.execute_tasks()
+
+        self.assertEqual(Task.objects.filter(status=Task.STATUS_SUCCESS).count(), 3)
@@ -132,7 +132,7 @@ class ConsumerTestCase(TransactionTestCase):
                 running_tasks = set()
                 error_task = None
 
-                def raise_if_last_running_task(self):
+                def raise_if_last_running_task(self, *args, **kwargs):
                     nonlocal error_task
                     print(f"MOCK SAVE {self.uuid} {self.get_status_display()}")
                     if self.status == Task.STATUS_RUNNING:
@@ -143,7 +143,7 @@ class ConsumerTestCase(TransactionTestCase):
                             )
                             error_task = self
                             raise OperationalError()
-                    return Model.save(self)
+                    return Model.save(self, *args, **kwargs)
 
                 mock_task_save.side_effect = raise_if_last_running_task
 
@@ -192,88 +192,100 @@ class ConsumerTestCase(TransactionTestCase):
         for i, expected_function in enumerate(expected_functions):
             self.assertIn(expected_function, relevant_lines[i])
 
-    @override_settings(TASKQ_FETCHED_TASKS_COUNT_LOGGED_AS_ERROR_THRESHOLD=4)
-    def test_consumer_taskq_fetched_tasks_count_logging_threshold(self):
+    @override_settings(TASKQ={"oldest_due_task_age_threshold": 60})
+    def test_consumer_oldest_due_task_age_logging_threshold(self):
         consumer = Consumer()
-        for i in range(3):
-            create_task()
+        create_task(due_at=now() - timedelta(seconds=30))
 
         with self.assertRaises(AssertionError):
             with self.assertLogs("taskq", ERROR):
                 consumer.execute_tasks()
 
-        for i in range(4):
-            create_task()
+        create_task(due_at=now() - timedelta(seconds=30))
+        create_task(due_at=now() - timedelta(seconds=90))
 
         with self.assertLogs("taskq", ERROR) as log_check:
             consumer.execute_tasks()
             assert log_check.output
-            assert "more than 4 tasks fetched" in "\n".join(log_check.output)
+            assert "task started more than 0:01:00 after its due date" in "\n".join(
+                log_check.output
+            )
 
     @override_settings(
-        TASKQ_FETCHED_TASKS_COUNT_LOGGED_AS_ERROR_THRESHOLD=3,
-        TASKQ_FETCHED_TASKS_COUNT_ABOVE_ERROR_THRESHOLD_COUNTER_TRIGGER=3,
+        TASKQ={"oldest_due_task_age_threshold": 60, "oldest_due_task_age_trigger": 3}
     )
-    def test_consumer_taskq_fetched_tasks_count_logging_threshold_counter_trigger(self):
+    def test_consumer_oldest_due_task_age_logging_threshold_counter_trigger(self):
         consumer = Consumer()
-        for i in range(3):
-            create_task()
-
-        with self.assertRaises(AssertionError):
-            with self.assertLogs("taskq", ERROR):
-                consumer.execute_tasks()
-
-        for i in range(3):
-            create_task()
+        for i in range(2):
+            create_task(due_at=now() - timedelta(seconds=90))
 
-        with self.assertRaises(AssertionError):
-            with self.assertLogs("taskq", ERROR):
-                consumer.execute_tasks()
+            with self.assertRaises(AssertionError):
+                with self.assertLogs("taskq", ERROR):
+                    consumer.execute_tasks()
 
-        for i in range(3):
-            create_task()
+        create_task(due_at=now() - timedelta(seconds=90))
 
         with self.assertLogs("taskq", ERROR) as log_check:
             consumer.execute_tasks()
             assert log_check.output
-            assert "more than 3 tasks fetched" in "\n".join(log_check.output)
+            assert "task started more than 0:01:00 after its due date" in "\n".join(
+                log_check.output
+            )
 
     @override_settings(
-        TASKQ_FETCHED_TASKS_COUNT_LOGGED_AS_ERROR_THRESHOLD=3,
-        TASKQ_FETCHED_TASKS_COUNT_ABOVE_ERROR_THRESHOLD_COUNTER_TRIGGER=3,
+        TASKQ={"oldest_due_task_age_threshold": 60, "oldest_due_task_age_trigger": 3}
     )
-    def test_consumer_taskq_fetched_tasks_count_logging_threshold_counter_reset(self):
+    def test_consumer_oldest_due_task_age_logging_threshold_counter_reset(self):
         consumer = Consumer()
-        for i in range(3):
-            create_task()
+        for i in range(2):
+            create_task(due_at=now() - timedelta(seconds=90))
 
-        with self.assertRaises(AssertionError):
-            with self.assertLogs("taskq", ERROR):
-                consumer.execute_tasks()
+            with self.assertRaises(AssertionError):
+                with self.assertLogs("taskq", ERROR):
+                    consumer.execute_tasks()
 
-        for i in range(3):
-            create_task()
+        create_task(due_at=now() - timedelta(seconds=30))
 
         with self.assertRaises(AssertionError):
             with self.assertLogs("taskq", ERROR):
                 consumer.execute_tasks()
 
-        for i in range(2):
-            create_task()
+        # counter is reset
+        assert consumer._oldest_due_task_age_above_threshold_counter == 0
+
+        create_task(due_at=now() - timedelta(seconds=90))
 
         with self.assertRaises(AssertionError):
             with self.assertLogs("taskq", ERROR):
                 consumer.execute_tasks()
 
-        # counter is reset
-        assert consumer._fetched_tasks_count_above_error_threshold_counter == 0
+    @override_settings(TASKQ={"oldest_due_task_age_threshold": 60})
+    def test_consumer_oldest_due_task_age_is_measured_at_start(self):
+        """The tasks waiting behind a long batch are reported when they start
+        late, even though they were claimed in time."""
+        consumer = Consumer()
+        create_task(due_at=now() - timedelta(seconds=30))
+        due_tasks = consumer.fetch_due_tasks()
 
-        for i in range(3):
-            create_task()
+        later = now() + timedelta(seconds=60)
+        with patch("django.utils.timezone.now", return_value=later):
+            with self.assertLogs("taskq", ERROR) as log_check:
+                consumer.process_tasks(due_tasks)
 
-        with self.assertRaises(AssertionError):
-            with self.assertLogs("taskq", ERROR):
-                consumer.execute_tasks()
+        self.assertIn(
+            "task started more than 0:01:00 after its due date", log_check.output[0]
+        )
+
+    def test_consumer_records_task_timestamps(self):
+        """The consumer records when the tasks are started and finished."""
+        task = create_task(due_at=now() - timedelta(seconds=30))
+        self.assertIsNotNone(task.created_at)
+
+        Consumer().execute_tasks()
+
+        task.refresh_from_db()
+        self.assertGreaterEqual(task.started_at, task.due_at + timedelta(seconds=30))
+        self.assertGreaterEqual(task.finished_at, task.started_at)
 
     @override_settings(
         TASKQ={
@@ -327,3 +339,187 @@ class ConsumerTestCase(TransactionTestCase):
 
         self.assertIn(task.uuid, output)
         self.assertIn("Started (1st retry)", output)
+
+    def _create_scheduled_tasks_once_due(self, consumer):
+        """Hack the due_at date of the scheduled tasks to simulate the fact
+        that they were run once already, then create the due tasks.
+        """
+        for scheduled_task in consumer._scheduler._tasks:
+            scheduled_task.due_at -= timedelta(days=1)
+
+        consumer.create_scheduled_tasks()
+
+    @override_settings(
+        TASKQ={
+            "schedule": {
+                "my-scheduled-task": {
+                    "task": "tests.fixtures.do_nothing",
+                    "cron": "0 1 * * *",
+                    "overlap": "skip",
+                }
+            }
+        }
+    )
+    def test_consumer_skips_scheduled_task_if_previous_run_is_active(self):
+        """Consumer does not create a task for a scheduled task with
+        overlap="skip" if a previous run is still active.
+        """
+        previous = create_task(name="my-scheduled-task", status=Task.STATUS_RUNNING)
+
+        consumer = Consumer()
+        self._create_scheduled_tasks_once_due(consumer)
+
+        self.assertEqual(Task.objects.count(), 1)
+        self.assertEqual(Task.objects.get().pk, previous.pk)
+
+    @override_settings(
+        TASKQ={
+            "schedule": {
+                "my-scheduled-task": {
+                    "task": "tests.fixtures.do_nothing",
+                    "cron": "0 1 * * *",
+                    "overlap": "skip",
+                }
+            }
+        }
+    )
+    def test_consumer_creates_skip_scheduled_task_if_previous_run_is_done(self):
+        """Consumer creates a task for a scheduled task with overlap="skip"
+        once the previous run is finished.
+        """
+        create_task(name="my-scheduled-task", status=Task.STATUS_SUCCESS)
+
+        consumer = Consumer()
+        self._create_scheduled_tasks_once_due(consumer)
+
+        queued_tasks = Task.objects.filter(status=Task.STATUS_QUEUED).count()
+        self.assertEqual(queued_tasks, 1)
+
+    @override_settings(
+        TASKQ={
+            "schedule": {
+                "my-scheduled-task": {
+                    "task": "tests.fixtures.do_nothing",
+                    "cron": "0 1 * * *",
+                    "overlap": "replace",
+                }
+            }
+        }
+    )
+    def test_consumer_replaces_queued_scheduled_task(self):
+        """Consumer cancels the queued tasks of a scheduled task with
+        overlap="replace" before creating a new one.
+        """
+        previous = create_task(
+            name="my-scheduled-task", due_at=now() + timedelta(hours=1)
+        )
+
+        consumer = Consumer()
+        self._create_scheduled_tasks_once_due(consumer)
+
+        previous.refresh_from_db()
+        self.assertEqual(previous.status, Task.STATUS_CANCELED)
+        queued_tasks = Task.objects.filter(status=Task.STATUS_QUEUED).count()
+        self.assertEqual(queued_tasks, 1)
+
+    @override_settings(
+        TASKQ={
+            "schedule": {
+                "my-scheduled-task": {
+                    "task": "tests.fixtures.do_nothing",
+                    "cron": "0 1 * * *",
+                }
+            }
+        }
+    )
+    def test_consumer_queues_scheduled_task_by_default(self):
+        """Consumer creates a task for a scheduled task even if a previous run
+        is still active when no overlap policy is set.
+        """
+        create_task(name="my-scheduled-task", status=Task.STATUS_RUNNING)
+
+        consumer = Consumer()
+        self._create_scheduled_tasks_once_due(consumer)
+
+        queued_tasks = Task.objects.filter(status=Task.STATUS_QUEUED).count()
+        self.assertEqual(queued_tasks, 1)
+
+    @override_settings(
+        TASKQ={
+            "schedule": {
+                "my-scheduled-task": {
+                    "task": "tests.fixtures.do_nothing",
+                    "cron": "0 1 * * *",
+                }
+            }
+        }
+    )
+    def test_consumer_does_not_create_scheduled_task_twice(self):
+        """Consumer does not create a second task for a scheduled task which
+        already has a task for the same due date.
+        """
+        consumer = Consumer()
+        scheduled_task = consumer._scheduler._tasks[0]
+        scheduled_task.due_at -= timedelta(days=1)
+        create_task(name="my-scheduled-task", due_at=scheduled_task.due_at)
+
+        consumer.create_scheduled_tasks()
+
+        self.assertEqual(Task.objects.count(), 1)
+
+    @override_settings(
+        TASKQ={
+            "schedule": {
+                "my-fanout-task": {
+                    "task": "tests.fixtures.task_divide",
+                    "generator": "tests.fixtures.fanout_arguments",
+                    "args": {"count": 5},
+                    "chunk_size": 2,
+                    "cron": "0 1 * * *",
+                }
+            }
+        }
+    )
+    def test_consumer_create_tasks_for_due_fanout_scheduled_task(self):
+        """Consumer creates one task per item yielded by the generator of a
+        fan-out scheduled task, all sharing the same fire_id.
+        """
+        consumer = Consumer()
+        self._create_scheduled_tasks_once_due(consumer)
+
+        tasks = Task.objects.order_by("id")
+        self.assertEqual(len(tasks), 5)
+        self.assertEqual(len({task.fire_id for task in tasks}), 1)
+        self.assertIsNotNone(tasks[0].fire_id)
+        self.assertEqual(
+            [task.decode_function_args() for task in tasks],
+            [([i], {"b": 1}) for i in range(5)],
+        )
+        self.assertTrue(
+            all(t.function_name == "tests.fixtures.task_divide" for t in tasks)
+        )
+
+    @override_settings(
+        TASKQ={
+            "schedule": {
+                "my-fanout-task": {
+                    "task": "tests.fixtures.task_divide",
+                    "generator": "tests.fixtures.fanout_failing",
+                    "chunk_size": 1,
+                    "cron": "0 1 * * *",
+                }
+            }
+        }
+    )
+    def test_consumer_does_not_create_tasks_for_failing_fanout(self):
+        """Consumer does not create any task for a fan-out scheduled task whose
+        generator fails.
+        """
+        consumer = Consumer()
+
+        with self.assertLogs("taskq", level="ERROR") as context_manager:
+            self._create_scheduled_tasks_once_due(consumer)
+            output = "".join(context_manager.output)
+
+        self.assertIn("Fan-out failed", output)
+        self.assertEqual(Task.objects.count(), 0)
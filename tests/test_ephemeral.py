@@ -0,0 +1,55 @@
+from datetime import timedelta
+
+from django.db import connection
+from django.test import TransactionTestCase
+from django.utils.timezone import now
+
+from taskq.consumer import Consumer
+from taskq.models import EphemeralTask, Task
+from taskq.purge import purge_tasks
+from . import fixtures
+
+
+class EphemeralTaskTestCase(TransactionTestCase):
+    def setUp(self):
+        fixtures.counter_reset()
+
+    def test_ephemeral_table_is_unlogged(self):
+        """The EphemeralTask table is an UNLOGGED table."""
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT relpersistence FROM pg_class WHERE relname = %s",
+                [EphemeralTask._meta.db_table],
+            )
+            self.assertEqual(cursor.fetchone()[0], "u")
+
+    def test_non_durable_tasks_are_ephemeral(self):
+        """Taskify(durable=False) functions create EphemeralTasks."""
+        task = fixtures.ephemeral_counter_increment.apply_async()
+
+        self.assertIsInstance(task, EphemeralTask)
+        self.assertEqual(EphemeralTask.objects.count(), 1)
+        self.assertEqual(Task.objects.count(), 0)
+
+    def test_consumer_executes_ephemeral_tasks(self):
+        """Consumer executes the durable and the ephemeral tasks."""
+        ephemeral_task = fixtures.ephemeral_counter_increment.apply_async()
+        task = fixtures.counter_increment.apply_async()
+
+        Consumer().execute_tasks()
+
+        self.assertEqual(fixtures.counter_get_value(), 2)
+        ephemeral_task.refresh_from_db()
+        self.assertEqual(ephemeral_task.status, Task.STATUS_SUCCESS)
+        task.refresh_from_db()
+        self.assertEqual(task.status, Task.STATUS_SUCCESS)
+
+    def test_purge_tasks_deletes_ephemeral_tasks(self):
+        """purge_tasks also deletes the expired ephemeral tasks."""
+        task = fixtures.ephemeral_counter_increment.apply_async(
+            due_at=now() - timedelta(days=10)
+        )
+        EphemeralTask.objects.filter(pk=task.pk).update(status=Task.STATUS_SUCCESS)
+
+        self.assertEqual(purge_tasks({Task.STATUS_SUCCESS: timedelta(days=7)}), 1)
+        self.assertEqual(EphemeralTask.objects.count(), 0)
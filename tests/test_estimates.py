@@ -0,0 +1,106 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import SimpleTestCase, TransactionTestCase, override_settings
+from django.utils.timezone import now
+
+from taskq.estimates import Count, Snapshot
+from taskq.models import Task, TaskStats
+from .utils import create_task
+
+
+class CountTestCase(SimpleTestCase):
+    def test_str(self):
+        """The counts are displayed with units, and "~" when estimated."""
+        self.assertEqual(str(Count(999, True)), "999")
+        self.assertEqual(str(Count(1234, False)), "~1.2k")
+        self.assertEqual(str(Count(50200000, False)), "~50.2M")
+        self.assertEqual(str(Count(1, True) + Count(2, False)), "~3")
+
+
+class SnapshotTestCase(TransactionTestCase):
+    def test_counts_are_exact_below_limit(self):
+        """Without planner statistics, the tasks are counted."""
+        create_task(function_name="tests.fixtures.do_nothing")
+        create_task(
+            function_name="tests.fixtures.do_nothing",
+            due_at=now() - timedelta(minutes=1),
+        )
+        create_task(status=Task.STATUS_SUCCESS)
+
+        snapshot = Snapshot()
+
+        self.assertEqual(snapshot.total, Count(3, True))
+        self.assertEqual(snapshot.statuses[Task.STATUS_QUEUED], Count(2, True))
+        self.assertEqual(snapshot.statuses[Task.STATUS_SUCCESS], Count(1, True))
+        self.assertEqual(
+            snapshot.functions, {"tests.fixtures.do_nothing": Count(2, True)}
+        )
+        self.assertGreaterEqual(snapshot.oldest_due_age, timedelta(minutes=1))
+
+    @override_settings(TASKQ={"shards": 4})
+    def test_oldest_due_age_of_all_shards(self):
+        """The oldest due task is looked up in each shard, and among the tasks
+        created before sharding was enabled."""
+        create_task(due_at=now() - timedelta(minutes=1))
+        create_task(due_at=now() - timedelta(minutes=2), shard=None)
+        create_task(due_at=now() - timedelta(minutes=3), shard=3)
+        create_task(due_at=now() + timedelta(minutes=10), shard=0)
+
+        snapshot = Snapshot()
+
+        self.assertGreaterEqual(snapshot.oldest_due_age, timedelta(minutes=3))
+        self.assertLess(snapshot.oldest_due_age, timedelta(minutes=4))
+
+        Task.objects.filter(shard=3).delete()
+        snapshot = Snapshot()
+
+        self.assertGreaterEqual(snapshot.oldest_due_age, timedelta(minutes=2))
+        self.assertLess(snapshot.oldest_due_age, timedelta(minutes=3))
+
+    def test_counts_are_estimated_above_limit(self):
+        """The counts above the limit are estimated from the planner
+        statistics."""
+        for _ in range(6):
+            create_task(function_name="tests.fixtures.do_nothing")
+        for _ in range(4):
+            create_task(status=Task.STATUS_SUCCESS)
+        with connection.cursor() as cursor:
+            cursor.execute(f"ANALYZE {Task._meta.db_table}")
+
+        snapshot = Snapshot(limit=2)
+
+        self.assertEqual(snapshot.total, Count(10, False))
+        self.assertEqual(snapshot.statuses[Task.STATUS_QUEUED], Count(6, False))
+        self.assertEqual(snapshot.statuses[Task.STATUS_SUCCESS], Count(4, False))
+        self.assertEqual(snapshot.statuses[Task.STATUS_RUNNING], Count(0, True))
+        self.assertEqual(
+            snapshot.functions, {"tests.fixtures.do_nothing": Count(6, False)}
+        )
+
+    def test_throughput(self):
+        """The throughput is computed from the statistics of the last
+        minutes."""
+        minute = now().replace(second=0, microsecond=0) - timedelta(minutes=1)
+        TaskStats.objects.create(
+            function_name="tests.fixtures.do_nothing", minute=minute, executions=600
+        )
+
+        snapshot = Snapshot()
+
+        self.assertEqual(snapshot.executions, {"tests.fixtures.do_nothing": 120})
+        self.assertEqual(snapshot.throughput, 2)
+
+    def test_top_command(self):
+        """taskqtop displays the counts of each status and function."""
+        create_task(function_name="tests.fixtures.do_nothing")
+
+        out = StringIO()
+        call_command("taskqtop", iterations=1, stdout=out)
+
+        lines = out.getvalue().splitlines()
+        self.assertIn("1 tasks", lines[0])
+        self.assertIn("queued 1  running 0", lines[1])
+        self.assertEqual(lines[-1].split(), ["tests.fixtures.do_nothing", "1", "0.0"])
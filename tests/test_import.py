@@ -0,0 +1,206 @@
+import json
+import tempfile
+from datetime import timedelta
+from io import StringIO
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TransactionTestCase, override_settings
+from django.utils.dateparse import parse_datetime
+
+from taskq.exceptions import InvalidTaskRecord
+from taskq.ingest import create_tasks, task_from_record
+from taskq.models import EphemeralTask, Task, TaskPayload
+from taskq.registry import registry
+
+
+class ImportTestCase(TransactionTestCase):
+    databases = {"default", "sqlite"}
+
+    def setUp(self):
+        # Register the functions the records are validated against
+        registry.autodiscover()
+
+    def _import(self, content, suffix=".jsonl", **options):
+        with tempfile.NamedTemporaryFile("w", suffix=suffix) as f:
+            f.write(content)
+            f.flush()
+            out = StringIO()
+            call_command("taskqimport", f.name, stdout=out, **options)
+        return out.getvalue()
+
+    def _jsonl(self, records):
+        return "".join(json.dumps(record) + "\n" for record in records)
+
+    def test_task_from_record(self):
+        """task_from_record builds a task from a record."""
+        task = task_from_record(
+            {
+                "function_name": "tests.fixtures.task_add",
+                "args": [1],
+                "kwargs": {"b": 2},
+                "due_at": "2030-01-02T03:04:05",
+                "max_retries": 5,
+                "timeout": 60,
+            }
+        )
+
+        self.assertEqual(task.function_name, "tests.fixtures.task_add")
+        self.assertEqual(task.decode_function_args(), ([1], {"b": 2}))
+        self.assertEqual(task.due_at, parse_datetime("2030-01-02T03:04:05+00:00"))
+        self.assertEqual(task.max_retries, 5)
+        self.assertEqual(task.timeout, timedelta(seconds=60))
+
+    def test_task_from_record_validates_record(self):
+        """task_from_record raises an InvalidTaskRecord for invalid records."""
+        invalid_records = [
+            [],
+            {},
+            {"function_name": "tests.fixtures.unknown"},
+            {"function_name": "tests.fixtures.naked_function"},
+            {"function_name": "tests.fixtures.task_add", "foo": 1},
+            {"function_name": "tests.fixtures.task_add", "args": "ab"},
+            {"function_name": "tests.fixtures.task_add", "due_at": "tomorrow"},
+            {"function_name": "tests.fixtures.task_add", "retry_delay": 1.5},
+        ]
+        for record in invalid_records:
+            with self.subTest(record=record):
+                self.assertRaises(InvalidTaskRecord, task_from_record, record)
+
+    def test_create_tasks(self):
+        """create_tasks copies the tasks in their table, and preserves the
+        special characters of their arguments."""
+        args = ["tab\there", "new\nline", "back\\slash", None, {"x": [1.5, True]}]
+        tasks = [
+            task_from_record(
+                {"function_name": "tests.fixtures.task_add", "args": args}
+            ),
+            task_from_record({"function_name": "tests.fixtures.counter_increment"}),
+            task_from_record(
+                {"function_name": "tests.fixtures.ephemeral_counter_increment"}
+            ),
+        ]
+
+        self.assertEqual(create_tasks(tasks), 3)
+
+        task = Task.objects.get(function_name="tests.fixtures.task_add")
+        self.assertEqual(task.decode_function_args(), (args, {}))
+        self.assertEqual(task.uuid, tasks[0].uuid)
+        self.assertEqual(task.status, Task.STATUS_QUEUED)
+        self.assertEqual(Task.objects.count(), 2)
+        self.assertEqual(EphemeralTask.objects.count(), 1)
+
+    def test_import_jsonl(self):
+        """taskqimport creates the tasks of a JSON Lines file, ignoring the
+        tasks already created."""
+        records = [
+            {"function_name": "tests.fixtures.task_add", "args": [i, 1], "uuid": uuid}
+            for i, uuid in enumerate(
+                [
+                    "00000000-0000-0000-0000-000000000001",
+                    "00000000-0000-0000-0000-000000000002",
+                ]
+            )
+        ]
+
+        output = self._import(self._jsonl(records[:1]))
+        self.assertIn("1 tasks created", output)
+        output = self._import(self._jsonl(records), batch_size=1)
+        self.assertIn("1 tasks created", output)
+
+        self.assertEqual(Task.objects.count(), 2)
+
+    def test_import_csv(self):
+        """taskqimport creates the tasks of a CSV file."""
+        content = (
+            "function_name,args,kwargs,due_at,max_retries\n"
+            'tests.fixtures.task_add,"[1, 2]",,2030-01-01T00:00:00Z,\n'
+            'tests.fixtures.task_divide,"[1]","{""b"": 2}",,5\n'
+        )
+
+        output = self._import(content, suffix=".csv")
+
+        self.assertIn("2 tasks created", output)
+        task = Task.objects.get(function_name="tests.fixtures.task_divide")
+        self.assertEqual(task.decode_function_args(), ([1], {"b": 2}))
+        self.assertEqual(task.max_retries, 5)
+
+    def test_import_reports_invalid_line(self):
+        """taskqimport reports the line of the first invalid record."""
+        records = [
+            {"function_name": "tests.fixtures.task_add", "args": [1, 2]},
+            {"function_name": "tests.fixtures.unknown"},
+        ]
+
+        with self.assertRaisesRegex(CommandError, "Line 2: Unknown function"):
+            self._import(self._jsonl(records))
+
+    def test_import_reports_wrongly_typed_field(self):
+        """taskqimport reports the line of a record with a field of the wrong
+        type."""
+        records = [
+            {"function_name": "tests.fixtures.task_add", "args": [1, 2]},
+            {"function_name": "tests.fixtures.task_add", "max_retries": "x"},
+        ]
+
+        with self.assertRaisesRegex(
+            CommandError, "Line 2: max_retries must be an integer"
+        ):
+            self._import(self._jsonl(records))
+        self.assertEqual(Task.objects.count(), 0)
+
+    def test_import_reports_batch_of_database_error(self):
+        """taskqimport reports the lines of the batch the database rejected."""
+        records = [
+            {"function_name": "tests.fixtures.task_add", "args": [1, 2]},
+            {"function_name": "tests.fixtures.task_add", "max_retries": 2**40},
+        ]
+
+        with self.assertRaisesRegex(
+            CommandError, "(?s)Lines 1-2: .*out of range.*0 tasks created"
+        ):
+            self._import(self._jsonl(records))
+        self.assertEqual(Task.objects.count(), 0)
+
+    def test_import_csv_rejects_extra_fields(self):
+        """taskqimport reports the CSV rows with more fields than the header."""
+        content = "function_name\ntests.fixtures.task_add,oops\n"
+
+        with self.assertRaisesRegex(CommandError, "Line 2: more fields"):
+            self._import(content, suffix=".csv")
+
+    @override_settings(
+        TASKQ={
+            "payload_threshold": 10,
+            "databases": ["default", "sqlite"],
+            "database_routes": {"on-sqlite": "sqlite"},
+        }
+    )
+    def test_create_tasks_deletes_unused_payloads(self):
+        """The payloads of the tasks which were not created because their uuid
+        already exists are deleted."""
+        records = [
+            {
+                "function_name": "tests.fixtures.task_add",
+                "args": ["x" * 100],
+                "uuid": f"00000000-0000-0000-0000-00000000000{i}",
+                "name": name,
+            }
+            for i, name in enumerate(["on-default", "on-sqlite"])
+        ]
+        for _ in range(2):
+            tasks = [task_from_record(record) for record in records * 2]
+            create_tasks(tasks)
+
+        refs = [
+            task.payload_ref
+            for using in ("default", "sqlite")
+            for task in Task.objects.using(using).all()
+        ]
+        self.assertEqual(len(refs), 2)
+        stored = [
+            str(pk)
+            for using in ("default", "sqlite")
+            for pk in TaskPayload.objects.using(using).values_list("pk", flat=True)
+        ]
+        self.assertCountEqual(stored, refs)
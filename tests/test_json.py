@@ -1,9 +1,11 @@
 import datetime
+import decimal
 import json
+import uuid
 
-from django.test import TestCase
+from django.test import TestCase, override_settings
 
-from taskq.json import JSONEncoder, JSONDecoder
+from taskq.json import JSONCodec, JSONDecoder, JSONEncoder, OrjsonCodec, get_codec
 
 
 class JSONEncoderTestCase(TestCase):
@@ -28,12 +30,17 @@ class JSONEncoderTestCase(TestCase):
         )
         json_repr = json.dumps(value, cls=JSONEncoder)
 
-        expected = (
-            '{"__type__": "datetime", '
-            '"year": 1975, "month": 4, "day": 3, '
-            '"hour": 14, "minute": 44, "second": 26, '
-            '"microsecond": 0}'
+        expected = '{"__type__":"datetime","value":"1975-04-03T14:44:26"}'
+        self.assertEqual(json_repr, expected)
+
+    def test_json_encoding_aware_datetime(self):
+        """JSONEncoder keeps the UTC offset of aware datetimes."""
+        value = datetime.datetime(
+            year=1975, month=4, day=3, hour=14, tzinfo=datetime.timezone.utc
         )
+        json_repr = json.dumps(value, cls=JSONEncoder)
+
+        expected = '{"__type__":"datetime","value":"1975-04-03T14:00:00+00:00"}'
         self.assertEqual(json_repr, expected)
 
     def test_json_encoding_timedelta(self):
@@ -49,13 +56,16 @@ class JSONEncoderTestCase(TestCase):
 
         # timedelta only uses days, seconds and microseconds internally
         serialized_seconds = hours * 3600 + minutes * 60 + seconds
-        expected = (
-            '{"__type__": "timedelta", '
-            f'"days": 3, "seconds": {serialized_seconds}, '
-            '"microseconds": 0}'
-        )
+        expected = '{"__type__":"timedelta",' f'"value":[3,{serialized_seconds},0]}}'
         self.assertEqual(json_repr, expected)
 
+    def test_json_encoding_uuid(self):
+        """JSONEncoder encodes UUIDs as strings."""
+        value = uuid.UUID("0b9a6a1c-2d0e-4a4f-9a8e-6f4c3b2a1d0e")
+        json_repr = json.dumps(value, cls=JSONEncoder)
+
+        self.assertEqual(json_repr, '"0b9a6a1c-2d0e-4a4f-9a8e-6f4c3b2a1d0e"')
+
     def test_json_encoding_unexpected_type(self):
         """JSONEncoder cannot encode arbitrary types and raises a TypeError."""
 
@@ -124,3 +134,83 @@ class JSONDecoderTestCase(TestCase):
         self.assertEqual(decoded["__type__"], "cheese")
         self.assertEqual(decoded["holes"], 6)
         self.assertEqual(decoded["country"], "France")
+
+    def test_json_decoding_compact_datetime(self):
+        """JSONDecoder can decode datetimes."""
+        json_value = '{"__type__": "datetime", "value": "1971-09-28T20:03:00+00:00"}'
+        decoded = json.loads(json_value, cls=JSONDecoder)
+
+        expected = datetime.datetime(
+            year=1971, month=9, day=28, hour=20, minute=3, tzinfo=datetime.timezone.utc
+        )
+        self.assertEqual(decoded, expected)
+
+    def test_json_decoding_nested_types(self):
+        """JSONDecoder decodes the extended types nested in lists and dicts."""
+        json_value = (
+            '{"a": [{"__type__": "decimal", "value": "1.10"}], '
+            '"b": {"c": {"__type__": "date", "value": "2001-02-03"}}}'
+        )
+        decoded = json.loads(json_value, cls=JSONDecoder)
+
+        self.assertEqual(
+            decoded,
+            {
+                "a": [decimal.Decimal("1.10")],
+                "b": {"c": datetime.date(year=2001, month=2, day=3)},
+            },
+        )
+
+
+class CodecsTestCase(TestCase):
+    codecs = [JSONCodec(), OrjsonCodec()]
+
+    def test_codecs_round_trip_extended_types(self):
+        """Codecs can encode and decode all the supported extended types."""
+        value = {
+            "datetime": datetime.datetime(
+                2020, 1, 2, 3, 4, 5, 6, tzinfo=datetime.timezone.utc
+            ),
+            "date": datetime.date(2020, 1, 2),
+            "time": datetime.time(3, 4, 5),
+            "timedelta": datetime.timedelta(days=1, seconds=2, microseconds=3),
+            "decimal": decimal.Decimal("3.14"),
+            "bytes": b"\x00\xffcheese",
+            "nested": [{"price": decimal.Decimal("1.5")}, None, True, 1.5],
+        }
+
+        for codec in self.codecs:
+            with self.subTest(codec=type(codec).__name__):
+                self.assertEqual(codec.loads(codec.dumps(value)), value)
+
+    def test_codecs_produce_same_documents(self):
+        """Codecs produce the same JSON documents."""
+        value = {
+            "when": datetime.datetime(2020, 1, 2, 3, 4, 5),
+            "id": uuid.UUID("0b9a6a1c-2d0e-4a4f-9a8e-6f4c3b2a1d0e"),
+            "names": ["Graham", "John"],
+        }
+
+        encoded = [codec.dumps(value) for codec in self.codecs]
+        self.assertEqual(encoded[0], encoded[1])
+
+    def test_codecs_encode_big_integers(self):
+        """Codecs can encode integers which don't fit in 64 bits."""
+        for codec in self.codecs:
+            with self.subTest(codec=type(codec).__name__):
+                self.assertEqual(codec.loads(codec.dumps([2**70])), [2**70])
+
+    def test_codecs_raise_for_unexpected_types(self):
+        """Codecs raise a TypeError for unsupported types."""
+        for codec in self.codecs:
+            with self.subTest(codec=type(codec).__name__):
+                self.assertRaises(TypeError, codec.dumps, object())
+
+    def test_default_codec_is_orjson(self):
+        """The default codec is OrjsonCodec when orjson is installed."""
+        self.assertIsInstance(get_codec(), OrjsonCodec)
+
+    @override_settings(TASKQ={"codec": "taskq.json.JSONCodec"})
+    def test_codec_can_be_defined_in_settings(self):
+        """The codec can be defined in settings."""
+        self.assertEqual(type(get_codec()), JSONCodec)
@@ -0,0 +1,174 @@
+import socket
+import urllib.request
+from datetime import timedelta
+from unittest.mock import patch
+
+from django.test import SimpleTestCase, TransactionTestCase, override_settings
+
+from taskq.consumer import Consumer
+from taskq.metrics import PrometheusExporter, StatsDExporter, get_metrics
+from taskq.models import Task
+from .utils import create_task
+
+PROMETHEUS = {"metrics_exporters": {"taskq.metrics.PrometheusExporter": {"port": 0}}}
+
+
+class MetricsTestCase(TransactionTestCase):
+    def test_metrics_without_exporters(self):
+        """The metrics are discarded when no exporter is configured."""
+        metrics = get_metrics()
+        self.assertEqual(metrics.exporters, [])
+
+        metrics.increment("taskq_tasks_started_total", function="foo")
+        with metrics.timer("taskq_claim_duration_seconds"):
+            pass
+
+    @override_settings(TASKQ=PROMETHEUS)
+    def test_consumer_reports_task_metrics(self):
+        """The consumer reports the fetched tasks, their outcome and their
+        duration per function."""
+        create_task(function_name="tests.fixtures.do_nothing")
+        create_task(function_name="tests.fixtures.failing", max_retries=1)
+
+        with self.assertLogs("taskq", "INFO"):
+            Consumer().execute_tasks()
+
+        output = get_metrics().exporters[0].render()
+        for line in [
+            'taskq_tasks_fetched_total{function="tests.fixtures.do_nothing"} 1',
+            'taskq_tasks_started_total{function="tests.fixtures.failing"} 1',
+            'taskq_tasks_succeeded_total{function="tests.fixtures.do_nothing"} 1',
+            'taskq_tasks_retried_total{function="tests.fixtures.failing"} 1',
+            'taskq_task_duration_seconds_count{function="tests.fixtures.failing"} 1',
+            "taskq_claim_duration_seconds_count 1",
+        ]:
+            self.assertIn(line, output)
+
+    @override_settings(TASKQ=PROMETHEUS)
+    def test_consumer_reports_timed_out_tasks(self):
+        """Timed out tasks are counted as timed out and failed."""
+        create_task(
+            function_name="tests.fixtures.never_return", timeout=timedelta(seconds=1)
+        )
+
+        with self.assertLogs("taskq", "ERROR"):
+            Consumer().execute_tasks()
+
+        output = get_metrics().exporters[0].render()
+        function = 'function="tests.fixtures.never_return"'
+        self.assertIn(f"taskq_tasks_timed_out_total{{{function}}} 1", output)
+        self.assertIn(f"taskq_tasks_failed_total{{{function}}} 1", output)
+
+    @override_settings(TASKQ=PROMETHEUS)
+    def test_interrupted_tasks_have_no_outcome(self):
+        """A BaseException escaping a task is raised to the consumer, without
+        counting an outcome."""
+        task = create_task(function_name="tests.fixtures.do_nothing", timeout=0)
+
+        with patch.object(Task, "execute", side_effect=KeyboardInterrupt):
+            with self.assertRaises(KeyboardInterrupt):
+                Consumer().execute_tasks()
+
+        task.refresh_from_db()
+        self.assertEqual(task.status, Task.STATUS_RUNNING)
+        output = get_metrics().exporters[0].render()
+        self.assertIn("taskq_tasks_started_total", output)
+        self.assertNotIn("taskq_tasks_succeeded_total", output)
+
+
+class PrometheusExporterTestCase(SimpleTestCase):
+    def test_render_histogram(self):
+        """Observations are counted in every bucket they fit in."""
+        exporter = PrometheusExporter(buckets=[1, 10])
+        exporter.observe("duration", 5, {"function": 'a"b'})
+
+        self.assertEqual(
+            exporter.render(),
+            "# TYPE duration histogram\n"
+            'duration_bucket{function="a\\"b",le="1"} 0\n'
+            'duration_bucket{function="a\\"b",le="10"} 1\n'
+            'duration_bucket{function="a\\"b",le="+Inf"} 1\n'
+            'duration_count{function="a\\"b"} 1\n'
+            'duration_sum{function="a\\"b"} 5\n',
+        )
+
+    def test_http_server(self):
+        """The exporter serves the metrics over HTTP once started."""
+        exporter = PrometheusExporter(port=0)
+        exporter.increment("taskq_tasks_started_total", 2, {})
+        exporter.start()
+        self.addCleanup(exporter.stop)
+
+        url = f"http://127.0.0.1:{exporter.port}/metrics"
+        with urllib.request.urlopen(url) as response:
+            output = response.read().decode()
+
+        self.assertIn("taskq_tasks_started_total 2\n", output)
+
+    def test_port_range(self):
+        """The exporters serve the metrics on the first free port of their
+        range."""
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            first = sock.getsockname()[1]
+        exporters = [PrometheusExporter(port=[first, first + 10]) for _ in range(2)]
+        for exporter in exporters:
+            exporter.start()
+            self.addCleanup(exporter.stop)
+
+        self.assertEqual(exporters[0].port, first)
+        self.assertGreater(exporters[1].port, first)
+        self.assertLessEqual(exporters[1].port, first + 10)
+
+    def test_port_in_use(self):
+        """The exporter logs the error when its port is in use, instead of
+        stopping the consumer."""
+        running = PrometheusExporter(port=0)
+        running.start()
+        self.addCleanup(running.stop)
+
+        exporter = PrometheusExporter(port=running.port)
+        with self.assertLogs("taskq", "ERROR") as logs:
+            exporter.start()
+        self.addCleanup(exporter.stop)
+
+        self.assertIn("Couldn't serve the metrics", logs.output[0])
+        exporter.increment("taskq_tasks_started_total", 1, {})
+
+
+class StatsDExporterTestCase(SimpleTestCase):
+    def setUp(self):
+        self.server = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.server.bind(("127.0.0.1", 0))
+        self.server.settimeout(5)
+        self.addCleanup(self.server.close)
+
+    def _exporter(self, **options):
+        exporter = StatsDExporter("127.0.0.1", self.server.getsockname()[1], **options)
+        self.addCleanup(exporter.stop)
+        return exporter
+
+    def test_metrics_are_sent(self):
+        """Counters and timings are sent in the StatsD format, with the labels
+        appended to their name."""
+        exporter = self._exporter()
+
+        exporter.increment("taskq_tasks_started_total", 1, {"function": "app.add"})
+        self.assertEqual(
+            self.server.recv(1024), b"taskq.tasks_started_total.app_add:1|c"
+        )
+
+        exporter.observe("taskq_claim_duration_seconds", 0.25, {})
+        self.assertEqual(
+            self.server.recv(1024), b"taskq.claim_duration_seconds:250.000|ms"
+        )
+
+    def test_metrics_are_sent_with_tags(self):
+        """With tags=True, the labels are sent as DogStatsD tags."""
+        exporter = self._exporter(tags=True)
+
+        exporter.increment("taskq_tasks_started_total", 1, {"function": "app.add"})
+        self.assertEqual(
+            self.server.recv(1024),
+            b"taskq.tasks_started_total:1|c|#function:app.add",
+        )
@@ -1,4 +1,7 @@
+import copy
 import datetime
+import time
+from unittest.mock import patch
 
 from django.core.exceptions import ValidationError
 from django.db.utils import IntegrityError
@@ -261,7 +264,7 @@ class ImportTaskifiedFunctionTestCase(TransactionTestCase):
 
     def test_fails_import_non_taskified_functions(self):
         """Consumer raises when trying to import a function not decorated with
-        @taskify.
+        @taskify, which is not registered.
         """
         self.assertRaises(
             TaskLoadingError,
@@ -294,3 +297,145 @@ class ImportTaskifiedFunctionTestCase(TransactionTestCase):
             Task.import_taskified_function,
             "tests.fixtures_broken.broken_function",
         )
+
+
+class TaskFunctionArgsCopyTestCase(TransactionTestCase):
+    def test_decoding_loaded_function_args_does_not_copy_them(self):
+        """decode_function_args() does not copy the function args of a task
+        freshly loaded from the database.
+        """
+        create_task(function_args={"__positional_args__": [[1, 2]], "b": {"c": 3}})
+        task = Task.objects.get()
+
+        with patch("copy.deepcopy") as mock_deepcopy:
+            args, kwargs = task.decode_function_args()
+
+        mock_deepcopy.assert_not_called()
+        self.assertEqual(args, [[1, 2]])
+        self.assertEqual(kwargs, {"b": {"c": 3}})
+
+    def test_decoding_function_args_twice_copies_them(self):
+        """decode_function_args() copies the function args if they were already
+        handed out once.
+        """
+        create_task(function_args={"b": {"c": 3}})
+        task = Task.objects.get()
+
+        _, kwargs = task.decode_function_args()
+        kwargs["b"]["c"] = 4
+
+        _, kwargs = task.decode_function_args()
+        kwargs["b"]["c"] = 5
+        self.assertEqual(task.function_args, {"b": {"c": 4}})
+
+    def test_decoding_assigned_function_args_copies_them(self):
+        """decode_function_args() copies function args which were assigned to
+        the task instead of being loaded from the database.
+        """
+        function_args = {"b": {"c": 3}}
+        task = create_task(function_args=function_args)
+
+        _, kwargs = task.decode_function_args()
+        kwargs["b"]["c"] = 4
+
+        self.assertEqual(function_args, {"b": {"c": 3}})
+
+    def test_encoding_function_args_does_not_modify_kwargs(self):
+        """encode_function_args() does not modify the passed kwargs."""
+        kwargs = {"cheese": "blue"}
+        task = Task()
+        task.encode_function_args([1], kwargs)
+
+        self.assertEqual(kwargs, {"cheese": "blue"})
+        self.assertEqual(
+            task.function_args, {"cheese": "blue", "__positional_args__": [1]}
+        )
+
+
+class TaskFunctionArgsBenchmarkTestCase(TransactionTestCase):
+    """Micro-benchmark guarding the cost of decoding large function args."""
+
+    def _large_function_args(self):
+        rows = [
+            {"id": i, "label": f"row {i}", "values": list(range(10))}
+            for i in range(20000)
+        ]
+        return {"__positional_args__": [rows], "options": {"dry_run": False}}
+
+    def test_decoding_large_function_args_is_cheaper_than_deepcopy(self):
+        """Decoding the function args of a loaded task costs a small fraction
+        of deep-copying them.
+        """
+        function_args = self._large_function_args()
+        create_task(function_args=function_args)
+
+        start = time.perf_counter()
+        copy.deepcopy(function_args)
+        deepcopy_duration = time.perf_counter() - start
+
+        decode_durations = []
+        for _ in range(5):
+            task = Task.objects.get()
+            start = time.perf_counter()
+            args, _ = task.decode_function_args()
+            decode_durations.append(time.perf_counter() - start)
+
+        self.assertEqual(len(args[0]), 20000)
+        self.assertLess(min(decode_durations), deepcopy_duration / 10)
+
+
+class TaskLagTestCase(TransactionTestCase):
+    databases = {"default", "sqlite"}
+
+    def _create_started_tasks(self, using):
+        started_at = now()
+        for lag, function_name in [
+            (1, "tests.fixtures.do_nothing"),
+            (2, "tests.fixtures.do_nothing"),
+            (3, "tests.fixtures.do_nothing"),
+            (5, "tests.fixtures.task_add"),
+        ]:
+            Task.objects.using(using).create(
+                function_name=function_name,
+                due_at=started_at - datetime.timedelta(seconds=lag),
+                started_at=started_at,
+            )
+        # Not started, or started before the window
+        Task.objects.using(using).create(
+            function_name="tests.fixtures.do_nothing", due_at=started_at
+        )
+        Task.objects.using(using).create(
+            function_name="tests.fixtures.do_nothing",
+            due_at=started_at - datetime.timedelta(days=1),
+            started_at=started_at - datetime.timedelta(days=1),
+        )
+
+    def test_lag_percentiles(self):
+        """lag_percentiles returns the lag percentiles per function of the
+        tasks started in the window, on PostgreSQL and the other databases."""
+        for using in ("default", "sqlite"):
+            with self.subTest(using=using):
+                self._create_started_tasks(using)
+
+                lags = Task.objects.using(using).lag_percentiles([0.5, 0.75])
+
+                seconds = datetime.timedelta(seconds=1)
+                self.assertEqual(
+                    lags,
+                    {
+                        "tests.fixtures.do_nothing": {
+                            "count": 3,
+                            "p50": 2 * seconds,
+                            "p75": 2.5 * seconds,
+                        },
+                        "tests.fixtures.task_add": {
+                            "count": 1,
+                            "p50": 5 * seconds,
+                            "p75": 5 * seconds,
+                        },
+                    },
+                )
+
+    def test_lag_percentiles_are_validated(self):
+        """Percentiles must be between 0 and 1."""
+        self.assertRaises(ValueError, Task.objects.lag_percentiles, [50])
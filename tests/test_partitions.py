@@ -0,0 +1,218 @@
+import datetime
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.utils.timezone import now
+
+from taskq.consumer import Consumer
+from taskq.models import Task
+from taskq.partitions import (
+    create_partitions,
+    drop_expired_partitions,
+    interval_start,
+    is_partitioned,
+    list_partitions,
+    next_interval_start,
+)
+from taskq.purge import get_retention, purge_tasks
+from . import fixtures
+from .utils import create_task
+
+UTC = datetime.timezone.utc
+
+
+class PartitionIntervalsTestCase(TestCase):
+    def test_interval_start(self):
+        """interval_start truncates a datetime to the start of its interval."""
+        dt = datetime.datetime(2024, 2, 29, 13, 45, tzinfo=UTC)
+        self.assertEqual(
+            interval_start(dt, "day"), datetime.datetime(2024, 2, 29, tzinfo=UTC)
+        )
+        self.assertEqual(
+            interval_start(dt, "week"), datetime.datetime(2024, 2, 26, tzinfo=UTC)
+        )
+        self.assertEqual(
+            interval_start(dt, "month"), datetime.datetime(2024, 2, 1, tzinfo=UTC)
+        )
+        self.assertRaises(ValueError, interval_start, dt, "year")
+
+    def test_next_interval_start(self):
+        """next_interval_start returns the start of the following interval."""
+        start = datetime.datetime(2024, 1, 1, tzinfo=UTC)
+        self.assertEqual(
+            next_interval_start(start, "day"), datetime.datetime(2024, 1, 2, tzinfo=UTC)
+        )
+        self.assertEqual(
+            next_interval_start(start, "week"),
+            datetime.datetime(2024, 1, 8, tzinfo=UTC),
+        )
+        self.assertEqual(
+            next_interval_start(start, "month"),
+            datetime.datetime(2024, 2, 1, tzinfo=UTC),
+        )
+
+
+class PartitionsTestCase(TestCase):
+    """The schema changes made by taskqpartition are rolled back at the end of
+    each test, as TestCase runs each test in a transaction."""
+
+    databases = {"default", "secondary"}
+
+    def _partition_of(self, task):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT tableoid::regclass::text FROM taskq_task WHERE id = %s",
+                [task.pk],
+            )
+            return cursor.fetchone()[0]
+
+    def test_convert(self):
+        """taskqpartition convert partitions the task table and keeps the
+        existing tasks."""
+        old_task = create_task(due_at=now() - timedelta(days=400))
+        future_task = create_task(due_at=now() + timedelta(days=40))
+
+        call_command("taskqpartition", "convert", ahead=2, stdout=StringIO())
+
+        self.assertTrue(is_partitioned())
+        partitions = list_partitions()
+        self.assertEqual(partitions[0].name, "taskq_task_legacy")
+        self.assertIsNone(partitions[0].lower)
+        self.assertEqual(partitions[0].upper, interval_start(now(), "month"))
+        self.assertEqual(len(partitions), 5)
+        self.assertTrue(partitions[-1].is_default)
+
+        self.assertEqual(self._partition_of(old_task), "taskq_task_legacy")
+        self.assertEqual(
+            self._partition_of(future_task),
+            f"taskq_task_p{interval_start(future_task.due_at, 'month'):%Y%m%d}",
+        )
+
+    def test_tasks_are_created_and_executed_in_partitions(self):
+        """Tasks are created in their partition and executed as usual."""
+        call_command("taskqpartition", "convert", stdout=StringIO())
+        old_task = create_task(due_at=now() - timedelta(days=400))
+        task = fixtures.task_add.apply_async(args=[1, 2])
+
+        self.assertGreater(task.pk, old_task.pk)
+        Consumer().execute_tasks()
+
+        task.refresh_from_db()
+        self.assertEqual(task.status, Task.STATUS_SUCCESS)
+
+    def test_create_partitions_moves_tasks_from_default_partition(self):
+        """create_partitions moves the tasks stored in the DEFAULT partition to
+        the new partitions."""
+        call_command("taskqpartition", "convert", ahead=0, stdout=StringIO())
+        task = create_task(due_at=now() + timedelta(days=40))
+        self.assertEqual(self._partition_of(task), "taskq_task_default")
+
+        created = create_partitions("month", ahead=3)
+
+        self.assertEqual(len(created), 3)
+        self.assertIn(self._partition_of(task), created)
+        self.assertEqual(create_partitions("month", ahead=3), [])
+
+    def _convert_in_the_past(self, days):
+        """Convert the task table as if it happened `days` days ago, with the
+        partitions of the following months."""
+        past = now() - timedelta(days=days)
+        with mock.patch("taskq.partitions.timezone.now", return_value=past):
+            call_command(
+                "taskqpartition", "convert", ahead=days // 28 + 1, stdout=StringIO()
+            )
+        return past
+
+    def test_drop_expired_partitions(self):
+        """drop_expired_partitions drops the partitions older than the
+        retention which only contain finished tasks with a retention."""
+        old = self._convert_in_the_past(days=120)
+        create_task(status=Task.STATUS_SUCCESS, due_at=old)
+        kept_task = create_task(
+            status=Task.STATUS_SUCCESS, due_at=old + timedelta(days=31)
+        )
+        failed_task = create_task(
+            status=Task.STATUS_FAILED, due_at=old + timedelta(days=31)
+        )
+        legacy_task = create_task(
+            status=Task.STATUS_QUEUED, due_at=old - timedelta(days=40)
+        )
+
+        retention = {Task.STATUS_SUCCESS: timedelta(days=7)}
+        dropped = drop_expired_partitions(retention)
+
+        self.assertIn(f"taskq_task_p{interval_start(old, 'month'):%Y%m%d}", dropped)
+        self.assertEqual(
+            set(Task.objects.values_list("pk", flat=True)),
+            {kept_task.pk, failed_task.pk, legacy_task.pk},
+        )
+        names = [partition.name for partition in list_partitions()]
+        self.assertNotIn(dropped[0], names)
+        self.assertIn("taskq_task_legacy", names)
+        self.assertIn("taskq_task_default", names)
+
+    def test_drop_expired_partitions_keeps_recently_finished_tasks(self):
+        """drop_expired_partitions keeps the partitions of the tasks finished
+        within the retention, whatever their due_at."""
+        old = self._convert_in_the_past(days=120)
+        task = create_task(
+            status=Task.STATUS_SUCCESS,
+            due_at=old,
+            finished_at=now() - timedelta(days=1),
+        )
+
+        retention = {Task.STATUS_SUCCESS: timedelta(days=7)}
+        dropped = drop_expired_partitions(retention)
+
+        self.assertNotIn(f"taskq_task_p{interval_start(old, 'month'):%Y%m%d}", dropped)
+        self.assertTrue(Task.objects.filter(pk=task.pk).exists())
+
+    @override_settings(TASKQ={"retention": {"success": 7 * 24 * 3600}})
+    def test_purge_tasks_drops_expired_partitions(self):
+        """purge_tasks drops the expired partitions, then deletes the
+        remaining expired tasks."""
+        old = self._convert_in_the_past(days=120)
+        partition_count = len(list_partitions())
+        create_task(status=Task.STATUS_SUCCESS, due_at=old)
+        create_task(status=Task.STATUS_SUCCESS, due_at=old - timedelta(days=40))
+        legacy_task = create_task(
+            status=Task.STATUS_QUEUED, due_at=old - timedelta(days=40)
+        )
+
+        self.assertEqual(purge_tasks(get_retention()), 1)
+        self.assertEqual(
+            list(Task.objects.values_list("pk", flat=True)), [legacy_task.pk]
+        )
+        self.assertLess(len(list_partitions()), partition_count)
+
+    def test_convert_other_database(self):
+        """taskqpartition --database partitions the task table of another
+        database."""
+        call_command(
+            "taskqpartition", "convert", database="secondary", stdout=StringIO()
+        )
+
+        self.assertTrue(is_partitioned("secondary"))
+        self.assertFalse(is_partitioned())
+        out = StringIO()
+        call_command("taskqpartition", "list", database="secondary", stdout=out)
+        self.assertIn("taskq_task_default: DEFAULT", out.getvalue())
+
+    def test_commands_require_partitioned_table(self):
+        """taskqpartition create, drop and list require a partitioned table."""
+        self.assertFalse(is_partitioned())
+        self.assertRaises(CommandError, call_command, "taskqpartition", "create")
+
+    def test_list(self):
+        """taskqpartition list prints the partitions and their bounds."""
+        call_command("taskqpartition", "convert", ahead=0, stdout=StringIO())
+        out = StringIO()
+        call_command("taskqpartition", "list", stdout=out)
+
+        self.assertIn("taskq_task_legacy: MINVALUE - ", out.getvalue())
+        self.assertIn("taskq_task_default: DEFAULT", out.getvalue())
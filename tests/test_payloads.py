@@ -0,0 +1,146 @@
+import tempfile
+from unittest.mock import patch
+
+from django.test import SimpleTestCase, TransactionTestCase, override_settings
+
+from taskq.consumer import Consumer
+from taskq.exceptions import PayloadNotFoundError
+from taskq.json import get_codec
+from taskq.models import Task, TaskPayload
+from taskq.payloads import FileSystemPayloadStore
+from . import fixtures
+
+
+@override_settings(TASKQ={"payload_threshold": 100})
+class DatabasePayloadStoreTestCase(TransactionTestCase):
+    def test_large_function_args_are_offloaded(self):
+        """Function args larger than the payload threshold are stored in the
+        payload store."""
+        task = fixtures.task_add.apply_async(args=["a" * 200, "b"])
+
+        task = Task.objects.get(pk=task.pk)
+        self.assertEqual(task.function_args, {})
+        self.assertIsNotNone(task.payload_ref)
+        self.assertEqual(TaskPayload.objects.count(), 1)
+        self.assertEqual(task.decode_function_args(), (["a" * 200, "b"], {}))
+
+    def test_small_function_args_are_kept_inline(self):
+        """Function args smaller than the payload threshold are stored in the
+        Task row."""
+        task = fixtures.task_add.apply_async(args=[1, 2])
+
+        task = Task.objects.get(pk=task.pk)
+        self.assertEqual(task.function_args, {"__positional_args__": [1, 2]})
+        self.assertIsNone(task.payload_ref)
+        self.assertEqual(TaskPayload.objects.count(), 0)
+
+    def test_consumer_runs_task_with_offloaded_function_args(self):
+        """Consumer loads the offloaded function args of a task."""
+        task = fixtures.task_add.apply_async(args=["a" * 200, "b"])
+
+        consumer = Consumer()
+        consumer.execute_tasks()
+
+        task.refresh_from_db()
+        self.assertEqual(task.status, Task.STATUS_SUCCESS)
+
+    def test_consumer_fails_task_with_missing_payload(self):
+        """Consumer fails a task whose offloaded function args are missing."""
+        task = fixtures.task_add.apply_async(args=["a" * 200, "b"])
+        TaskPayload.objects.all().delete()
+
+        consumer = Consumer()
+        consumer.execute_tasks()
+
+        task.refresh_from_db()
+        self.assertEqual(task.status, Task.STATUS_FAILED)
+
+    def test_deleting_task_deletes_its_payload(self):
+        """Deleting a Task deletes its offloaded function args."""
+        task = fixtures.task_add.apply_async(args=["a" * 200, "b"])
+        task.delete()
+
+        self.assertEqual(TaskPayload.objects.count(), 0)
+
+    def test_function_args_are_encoded_once(self):
+        """The encoding of the function args measured against the threshold
+        is the one saved in the Task row."""
+        codec = get_codec()
+        with patch.object(codec, "dumps", wraps=codec.dumps) as dumps:
+            task = fixtures.task_add.apply_async(args=[1, 2])
+
+        self.assertEqual(dumps.call_count, 1)
+        task = Task.objects.get(pk=task.pk)
+        self.assertEqual(task.function_args, {"__positional_args__": [1, 2]})
+
+
+class RoutedPayloadTestCase(TransactionTestCase):
+    databases = {"default", "secondary"}
+
+    @override_settings(
+        TASKQ={
+            "payload_threshold": 100,
+            "databases": ["default", "secondary"],
+            "database_routes": {"tests.fixtures.task_add": "secondary"},
+        }
+    )
+    def test_payloads_are_stored_in_database_of_task(self):
+        """The offloaded function args are stored in the database the task is
+        routed to."""
+        task = fixtures.task_add.apply_async(args=["a" * 200, "b"])
+
+        self.assertEqual(TaskPayload.objects.using("secondary").count(), 1)
+        self.assertEqual(TaskPayload.objects.using("default").count(), 0)
+
+        task = Task.objects.using("secondary").get(pk=task.pk)
+        self.assertEqual(task.decode_function_args(), (["a" * 200, "b"], {}))
+        task.delete()
+        self.assertEqual(TaskPayload.objects.using("secondary").count(), 0)
+
+
+class MemoryBackendPayloadTestCase(SimpleTestCase):
+    """SimpleTestCase fails on any database query."""
+
+    @override_settings(
+        TASKQ={"backend": "taskq.backends.MemoryBackend", "payload_threshold": 100}
+    )
+    def test_function_args_are_not_offloaded(self):
+        """The memory backend keeps all the function args in the tasks."""
+        task = fixtures.task_add.apply_async(args=["a" * 200, "b"])
+
+        self.assertIsNone(task.payload_ref)
+        self.assertEqual(task.decode_function_args(), (["a" * 200, "b"], {}))
+
+
+class FileSystemPayloadStoreTestCase(TransactionTestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def test_store_save_load_delete(self):
+        """FileSystemPayloadStore can save, load and delete payloads."""
+        store = FileSystemPayloadStore(self.directory.name)
+
+        ref = store.save(b"cheese")
+        self.assertEqual(store.load(ref), b"cheese")
+
+        store.delete([ref, "missing"])
+        self.assertRaises(PayloadNotFoundError, store.load, ref)
+
+    def test_large_function_args_are_offloaded_to_files(self):
+        """Function args larger than the payload threshold can be stored in
+        files."""
+        settings = {
+            "payload_threshold": 100,
+            "payload_store": "taskq.payloads.FileSystemPayloadStore",
+            "payload_store_options": {"directory": self.directory.name},
+        }
+        with override_settings(TASKQ=settings):
+            task = fixtures.task_add.apply_async(kwargs={"a": "a" * 200, "b": "b"})
+            task = Task.objects.get(pk=task.pk)
+
+            self.assertEqual(task.function_args, {})
+            self.assertEqual(TaskPayload.objects.count(), 0)
+            self.assertEqual(
+                task.decode_function_args(), ([], {"a": "a" * 200, "b": "b"})
+            )
@@ -0,0 +1,123 @@
+import os
+import pstats
+import re
+import traceback
+import tempfile
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TransactionTestCase, override_settings
+
+from taskq.consumer import Consumer
+from taskq.models import Task
+from taskq.profiling import get_profiling_config
+from taskq.utils import traceback_filter_taskq_frames
+from .utils import create_task
+
+
+class ProfilingTestCase(TransactionTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def _profiling(self, **config):
+        return override_settings(
+            TASKQ={"profiling": {"directory": self.directory, **config}}
+        )
+
+    def test_chosen_functions_are_profiled(self):
+        """All the executions of the chosen functions are profiled with
+        cProfile, in a file named after the task uuid."""
+        with self._profiling(functions=["tests.fixtures.task_add"]):
+            task = create_task(
+                function_name="tests.fixtures.task_add",
+                function_args={"a": 1, "b": 2},
+            )
+            create_task(function_name="tests.fixtures.do_nothing")
+            Consumer().execute_tasks()
+
+        self.assertEqual(os.listdir(self.directory), [f"{task.uuid}-0.pstats"])
+        stats = pstats.Stats(os.path.join(self.directory, f"{task.uuid}-0.pstats"))
+        functions = {function for _, _, function in stats.stats}
+        self.assertIn("task_add", functions)
+
+    def test_executions_are_sampled(self):
+        """A fraction of the executions is profiled."""
+        with self._profiling(sample_rate=1):
+            tasks = [create_task() for _ in range(3)]
+            Consumer().execute_tasks()
+
+        self.assertEqual(
+            sorted(os.listdir(self.directory)),
+            sorted(f"{task.uuid}-0.pstats" for task in tasks),
+        )
+
+    def test_failing_tasks_are_profiled(self):
+        """The failing executions are profiled, and the profiler doesn't add
+        frames to their traceback."""
+        with self._profiling(functions=["tests.fixtures.failing"]):
+            task = create_task(function_name="tests.fixtures.failing")
+            try:
+                task.execute()
+            except ValueError as e:
+                exception = e
+
+        self.assertEqual(os.listdir(self.directory), [f"{task.uuid}-0.pstats"])
+        frames = traceback.extract_tb(traceback_filter_taskq_frames(exception))
+        self.assertEqual(
+            [frame.name for frame in frames], ["_protected_call", "__call__", "failing"]
+        )
+
+    def test_tracemalloc(self):
+        """In tracemalloc mode, the peak memory usage and the top retained
+        allocations are reported."""
+        with self._profiling(mode="tracemalloc", functions=["tests.fixtures.task_add"]):
+            task = Task.objects.get(
+                pk=create_task(
+                    function_name="tests.fixtures.task_add",
+                    function_args={"__positional_args__": [[1], [2] * 100000]},
+                ).pk
+            )
+            task.execute()
+
+        with open(os.path.join(self.directory, f"{task.uuid}-0.tracemalloc.txt")) as f:
+            report = f.read()
+        # The list built by task_add is freed when it returns, but is counted
+        # in the peak memory
+        peak = float(re.match(r"Peak traced memory: ([\d.]+) KiB", report)[1])
+        self.assertGreater(peak, 700)
+
+    def test_unwritable_directory(self):
+        """The task is executed without profiling when the profiling directory
+        can't be created."""
+        path = os.path.join(self.directory, "file")
+        open(path, "w").close()
+        settings = {"directory": path, "functions": ["tests.fixtures.task_add"]}
+        with override_settings(TASKQ={"profiling": settings}):
+            task = create_task(
+                function_name="tests.fixtures.task_add",
+                function_args={"a": 1, "b": 2},
+            )
+            with self.assertLogs("taskq", "ERROR"):
+                Consumer().execute_tasks()
+
+        task.refresh_from_db()
+        self.assertEqual(task.status, Task.STATUS_SUCCESS)
+
+    def test_invalid_config(self):
+        """The profiling settings are validated."""
+        for config in [{"mode": "unknown"}, {"sample_rate": "1"}, {"sample_rate": 2}]:
+            with self.subTest(config=config), self._profiling(**config):
+                self.assertRaises(ValueError, get_profiling_config)
+
+    def test_consumer_rejects_invalid_config(self):
+        """The consumers fail to start with invalid profiling settings, instead
+        of failing the tasks."""
+        with self._profiling(mode="unknown"):
+            with self.assertRaisesMessage(
+                ValueError, 'Unknown profiling mode "unknown"'
+            ):
+                Consumer()
+            with self.assertRaisesMessage(CommandError, "Unknown profiling mode"):
+                call_command("taskqrunworker")
@@ -0,0 +1,176 @@
+import gzip
+import json
+import tempfile
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TransactionTestCase, override_settings
+from django.utils.timezone import now
+
+from taskq.consumer import Consumer
+from taskq.models import Task, TaskPayload
+from taskq.purge import TaskArchive, get_retention, purge_tasks
+from . import fixtures
+from .utils import create_task
+
+RETENTION = {"success": timedelta(days=7), "failed": 30 * 24 * 3600}
+
+
+class PurgeTestCase(TransactionTestCase):
+    def _create_old_task(self, status, days=10, **kwargs):
+        return create_task(status=status, due_at=now() - timedelta(days=days), **kwargs)
+
+    @override_settings(TASKQ={"retention": RETENTION})
+    def test_get_retention(self):
+        """get_retention returns the retention of each status from settings."""
+        self.assertEqual(
+            get_retention(),
+            {
+                Task.STATUS_SUCCESS: timedelta(days=7),
+                Task.STATUS_FAILED: timedelta(days=30),
+            },
+        )
+
+    @override_settings(TASKQ={"retention": {"queued": 3600}})
+    def test_get_retention_rejects_unfinished_statuses(self):
+        """get_retention raises a ValueError for statuses of unfinished tasks."""
+        self.assertRaises(ValueError, get_retention)
+
+    @override_settings(TASKQ={"retention": RETENTION})
+    def test_purge_tasks_deletes_tasks_older_than_retention(self):
+        """purge_tasks deletes the finished tasks older than the retention of
+        their status only."""
+        old_success = self._create_old_task(Task.STATUS_SUCCESS)
+        old_failed = self._create_old_task(Task.STATUS_FAILED)
+        old_canceled = self._create_old_task(Task.STATUS_CANCELED)
+        old_queued = self._create_old_task(Task.STATUS_QUEUED)
+        recent_success = self._create_old_task(Task.STATUS_SUCCESS, days=1)
+
+        deleted_count = purge_tasks(get_retention())
+
+        self.assertEqual(deleted_count, 1)
+        remaining = set(Task.objects.values_list("pk", flat=True))
+        self.assertNotIn(old_success.pk, remaining)
+        self.assertIn(old_failed.pk, remaining)
+        self.assertIn(old_canceled.pk, remaining)
+        self.assertIn(old_queued.pk, remaining)
+        self.assertIn(recent_success.pk, remaining)
+
+    def test_purge_tasks_retention_starts_when_tasks_finish(self):
+        """purge_tasks measures the retention from finished_at, or from due_at
+        for the tasks finished before it was recorded."""
+        finished_long_ago = self._create_old_task(
+            Task.STATUS_SUCCESS, finished_at=now() - timedelta(days=8)
+        )
+        finished_recently = self._create_old_task(
+            Task.STATUS_SUCCESS, finished_at=now() - timedelta(days=1)
+        )
+        never_recorded = self._create_old_task(Task.STATUS_SUCCESS)
+
+        retention = {Task.STATUS_SUCCESS: timedelta(days=7)}
+        self.assertEqual(purge_tasks(retention), 2)
+
+        remaining = set(Task.objects.values_list("pk", flat=True))
+        self.assertNotIn(finished_long_ago.pk, remaining)
+        self.assertIn(finished_recently.pk, remaining)
+        self.assertNotIn(never_recorded.pk, remaining)
+
+    def test_purge_tasks_in_batches(self):
+        """purge_tasks deletes the tasks in batches and stops after
+        max_batches batches."""
+        for _ in range(5):
+            self._create_old_task(Task.STATUS_SUCCESS)
+
+        retention = {Task.STATUS_SUCCESS: timedelta(days=7)}
+        self.assertEqual(purge_tasks(retention, batch_size=2, max_batches=2), 4)
+        self.assertEqual(Task.objects.count(), 1)
+        self.assertEqual(purge_tasks(retention, batch_size=2), 1)
+        self.assertEqual(Task.objects.count(), 0)
+
+    @override_settings(TASKQ={"payload_threshold": 100})
+    def test_purge_tasks_deletes_payloads(self):
+        """purge_tasks deletes the offloaded function args of the tasks."""
+        task = fixtures.task_add.apply_async(
+            due_at=now() - timedelta(days=10), args=["a" * 200, "b"]
+        )
+        Task.objects.filter(pk=task.pk).update(status=Task.STATUS_SUCCESS)
+
+        purge_tasks({Task.STATUS_SUCCESS: timedelta(days=7)})
+
+        self.assertEqual(Task.objects.count(), 0)
+        self.assertEqual(TaskPayload.objects.count(), 0)
+
+    def test_purge_tasks_archives_tasks(self):
+        """purge_tasks writes the deleted tasks to the archive."""
+        task = self._create_old_task(
+            Task.STATUS_SUCCESS, function_args={"__positional_args__": [1, 2]}
+        )
+
+        with tempfile.TemporaryDirectory() as directory:
+            with TaskArchive(directory) as archive:
+                purge_tasks({Task.STATUS_SUCCESS: timedelta(days=7)}, archive=archive)
+
+            with gzip.open(archive.path, "rt") as f:
+                rows = [json.loads(line) for line in f]
+
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]["uuid"], task.uuid)
+        self.assertEqual(rows[0]["function_name"], "tests.fixtures.do_nothing")
+        self.assertEqual(rows[0]["function_args"], {"__positional_args__": [1, 2]})
+
+    @override_settings(TASKQ={"retention": RETENTION})
+    def test_purge_command(self):
+        """taskqpurge deletes the finished tasks older than their retention."""
+        self._create_old_task(Task.STATUS_SUCCESS)
+
+        out = StringIO()
+        call_command("taskqpurge", stdout=out)
+
+        self.assertIn("1 tasks deleted", out.getvalue())
+        self.assertEqual(Task.objects.count(), 0)
+
+    def test_purge_command_requires_retention(self):
+        """taskqpurge fails if no retention is defined in settings."""
+        self.assertRaises(CommandError, call_command, "taskqpurge")
+
+    @override_settings(TASKQ={"retention": RETENTION, "purge_interval": 3600})
+    def test_consumer_purges_tasks_at_purge_interval(self):
+        """Consumer purges the finished tasks at most once per purge
+        interval."""
+        consumer = Consumer()
+
+        self._create_old_task(Task.STATUS_SUCCESS)
+        consumer.purge_tasks()
+        self.assertEqual(Task.objects.count(), 0)
+
+        self._create_old_task(Task.STATUS_SUCCESS)
+        consumer.purge_tasks()
+        self.assertEqual(Task.objects.count(), 1)
+
+    @override_settings(TASKQ={"retention": RETENTION, "purge_interval": 3600})
+    def test_consumer_iterations_purge_once_per_interval(self):
+        """The iterations of the consumer within the purge interval don't
+        purge the tasks again."""
+        consumer = Consumer()
+
+        with mock.patch.object(
+            consumer._backend, "purge", wraps=consumer._backend.purge
+        ) as purge:
+            consumer.run_iteration()
+            consumer.run_iteration()
+
+        self.assertEqual(purge.call_count, len(consumer._databases))
+
+    @override_settings(TASKQ={"retention": RETENTION})
+    def test_consumer_does_not_purge_tasks_by_default(self):
+        """Consumer does not purge the finished tasks without a purge
+        interval."""
+        self._create_old_task(Task.STATUS_SUCCESS)
+
+        consumer = Consumer()
+        consumer.purge_tasks()
+
+        self.assertEqual(Task.objects.count(), 1)
@@ -0,0 +1,80 @@
+from unittest.mock import patch
+
+from django.test import TransactionTestCase, override_settings
+
+from taskq.consumer import Consumer
+from taskq.exceptions import TaskLoadingError
+from taskq.models import Task
+from taskq.registry import TaskRegistry, registry
+from taskq.task import taskify
+from . import fixtures
+
+
+class TaskRegistryTestCase(TransactionTestCase):
+    def test_taskified_functions_are_registered(self):
+        """@taskified functions are registered using their function name."""
+        self.assertIn("tests.fixtures.do_nothing", registry)
+        self.assertIs(registry.get("tests.fixtures.do_nothing"), fixtures.do_nothing)
+
+    def test_registry_get_unknown_function(self):
+        """TaskRegistry.get returns None for an unknown function name."""
+        self.assertIsNone(registry.get("tests.fixtures.not_a_known_function"))
+
+    def test_registry_register(self):
+        """TaskRegistry.register adds a taskified function to the registry."""
+        local_registry = TaskRegistry()
+
+        def my_function():
+            pass
+
+        obj = taskify(my_function)
+        local_registry.register(obj)
+
+        self.assertEqual(len(local_registry), 1)
+        self.assertIs(local_registry.get("tests.test_registry.my_function"), obj)
+
+    def test_import_taskified_function_uses_registry(self):
+        """Task.import_taskified_function does not import the module of a
+        registered function.
+        """
+        with patch("importlib.import_module") as mock_import_module:
+            func = Task.import_taskified_function("tests.fixtures.task_add")
+
+        mock_import_module.assert_not_called()
+        self.assertIs(func, fixtures.task_add)
+
+    def test_import_taskified_function_never_imports_modules(self):
+        """Task.import_taskified_function fails for the functions which are not
+        registered once the tasks modules are autodiscovered, without
+        importing their module.
+        """
+        registry.autodiscover()
+        with patch("importlib.import_module") as mock_import_module:
+            self.assertRaises(
+                TaskLoadingError, Task.import_taskified_function, "os.system"
+            )
+
+        mock_import_module.assert_not_called()
+
+    @override_settings(
+        TASKQ={
+            "schedule": {
+                "my-scheduled-task": {
+                    "task": "tests.fixtures.not_a_known_function",
+                    "cron": "0 1 * * *",
+                }
+            }
+        }
+    )
+    def test_consumer_warm_up_reports_unknown_scheduled_functions(self):
+        """Consumer.warm_up logs an error for each scheduled task referencing
+        an unknown function.
+        """
+        consumer = Consumer()
+
+        with self.assertLogs("taskq", level="ERROR") as context_manager:
+            consumer.warm_up()
+            output = "".join(context_manager.output)
+
+        self.assertIn("my-scheduled-task", output)
+        self.assertIn("tests.fixtures.not_a_known_function", output)
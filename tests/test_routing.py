@@ -0,0 +1,108 @@
+from datetime import timedelta
+
+from django.test import TransactionTestCase, override_settings
+from django.utils.timezone import now
+
+from taskq.consumer import Consumer
+from taskq.models import Task
+from taskq.routing import bulk_create_tasks, db_for_task_name, get_consumer_databases
+from . import fixtures
+
+DATABASES = {"databases": ["default", "secondary"]}
+
+
+class RoutingTestCase(TransactionTestCase):
+    databases = {"default", "secondary"}
+
+    def setUp(self):
+        fixtures.counter_reset()
+
+    def test_tasks_are_stored_in_default_database(self):
+        """Tasks are stored in the default database when
+        settings.TASKQ["databases"] is not set."""
+        self.assertEqual(db_for_task_name("tests.fixtures.task_add"), "default")
+        self.assertEqual(get_consumer_databases(), ["default"])
+
+    @override_settings(TASKQ={"databases": ["default", "unknown"]})
+    def test_unknown_databases_are_rejected(self):
+        """Databases missing from settings.DATABASES raise a ValueError."""
+        self.assertRaises(ValueError, db_for_task_name, "tests.fixtures.task_add")
+
+    @override_settings(TASKQ=DATABASES)
+    def test_tasks_names_are_hashed_to_databases(self):
+        """Task names are consistently spread over the databases."""
+        names = [f"task-{i}" for i in range(50)]
+        databases = [db_for_task_name(name) for name in names]
+
+        self.assertEqual(set(databases), {"default", "secondary"})
+        self.assertEqual(databases, [db_for_task_name(name) for name in names])
+
+    @override_settings(
+        TASKQ={
+            "databases": ["default", "secondary"],
+            "database_routes": {"tests.fixtures.counter_increment": "secondary"},
+        }
+    )
+    def test_apply_async_uses_routed_database(self):
+        """apply_async stores the task in the database its name is routed to,
+        and only the consumers of this database execute it."""
+        task = fixtures.counter_increment.apply_async()
+
+        self.assertEqual(Task.objects.using("secondary").count(), 1)
+        self.assertEqual(Task.objects.using("default").count(), 0)
+
+        Consumer(databases=["default"]).execute_tasks()
+        self.assertEqual(fixtures.counter_get_value(), 0)
+
+        Consumer(databases=["secondary"]).execute_tasks()
+        self.assertEqual(fixtures.counter_get_value(), 1)
+        task = Task.objects.using("secondary").get(pk=task.pk)
+        self.assertEqual(task.status, Task.STATUS_SUCCESS)
+
+    @override_settings(TASKQ=DATABASES)
+    def test_consumer_databases_are_validated(self):
+        """Consumers reject the databases missing from TASKQ["databases"]."""
+        self.assertRaises(ValueError, Consumer, databases=["unknown"])
+        self.assertRaises(ValueError, Consumer, databases=[])
+
+    @override_settings(TASKQ=DATABASES)
+    def test_bulk_create_tasks(self):
+        """bulk_create_tasks inserts each task in its database."""
+        tasks = [
+            Task(
+                name=f"task-{i}",
+                function_name="tests.fixtures.do_nothing",
+                due_at=now(),
+            )
+            for i in range(20)
+        ]
+
+        bulk_create_tasks(tasks)
+
+        for alias in ("default", "secondary"):
+            names = set(Task.objects.using(alias).values_list("name", flat=True))
+            self.assertTrue(names)
+            self.assertTrue(all(db_for_task_name(name) == alias for name in names))
+
+    @override_settings(
+        TASKQ={
+            "databases": ["default", "secondary"],
+            "database_routes": {"my-scheduled-task": "secondary"},
+            "schedule": {
+                "my-scheduled-task": {
+                    "task": "tests.fixtures.do_nothing",
+                    "cron": "0 1 * * *",
+                }
+            },
+        }
+    )
+    def test_scheduled_tasks_use_routed_database(self):
+        """Scheduled tasks are created in the database their name is routed
+        to."""
+        consumer = Consumer()
+        consumer._scheduler._tasks[0].due_at -= timedelta(days=1)
+
+        consumer.create_scheduled_tasks()
+
+        self.assertEqual(Task.objects.using("secondary").count(), 1)
+        self.assertEqual(Task.objects.using("default").count(), 0)
@@ -29,3 +29,14 @@ class TaskFromScheduledTaskTestCase(TransactionTestCase):
         self.assertEqual(task.retry_delay, datetime.timedelta(seconds=22))
         self.assertEqual(task.retry_backoff, True)
         self.assertEqual(task.retry_backoff_factor, 2)
+
+    def test_scheduled_task_rejects_unknown_overlap_policy(self):
+        """ScheduledTask raises a ValueError for an unknown overlap policy."""
+        self.assertRaises(
+            ValueError,
+            ScheduledTask,
+            name="Cooking pie",
+            task="kitchen.chef.cook_pie",
+            cron="0 19 * * *",
+            overlap="sometimes",
+        )
@@ -0,0 +1,57 @@
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TransactionTestCase, override_settings
+
+from taskq.consumer import Consumer
+from taskq.models import Task
+from taskq.sharding import assign_shard, get_preferred_shards
+from .utils import create_task
+
+
+class ShardingTestCase(TransactionTestCase):
+    def test_sharding_is_disabled_by_default(self):
+        """Tasks have no shard when settings.TASKQ["shards"] is not set."""
+        self.assertIsNone(assign_shard())
+        self.assertIsNone(create_task().shard)
+        self.assertIsNone(get_preferred_shards([1]))
+
+    @override_settings(TASKQ={"shards": 4})
+    def test_tasks_are_assigned_a_shard(self):
+        """Tasks are assigned a shard when they are created."""
+        shards = {create_task().shard for _ in range(50)}
+        self.assertTrue(shards <= {0, 1, 2, 3})
+        self.assertGreater(len(shards), 1)
+
+    @override_settings(TASKQ={"shards": 4})
+    def test_preferred_shards_are_validated(self):
+        """get_preferred_shards raises a ValueError for unexpected shards."""
+        self.assertEqual(get_preferred_shards([3, 1, 1]), [1, 3])
+        self.assertIn(get_preferred_shards()[0], range(4))
+        self.assertRaises(ValueError, get_preferred_shards, [4])
+        self.assertRaises(ValueError, get_preferred_shards, [])
+        self.assertRaises(CommandError, call_command, "taskqrunworker", "--shards=1,9")
+
+    @override_settings(TASKQ={"shards": 4})
+    def test_consumer_claims_preferred_shards_first(self):
+        """Consumer only claims the tasks of its shards when there are some."""
+        own_task = create_task(shard=1)
+        other_task = create_task(shard=2)
+
+        fetched_tasks = Consumer(shards=[1]).fetch_due_tasks()
+
+        self.assertEqual([task.pk for task in fetched_tasks], [own_task.pk])
+        other_task.refresh_from_db()
+        self.assertEqual(other_task.status, Task.STATUS_QUEUED)
+
+    @override_settings(TASKQ={"shards": 4})
+    def test_consumer_steals_tasks_from_other_shards(self):
+        """Consumer claims the tasks of the other shards, and the tasks without
+        shard, when its shards have none."""
+        other_task = create_task(shard=2)
+        unsharded_task = create_task(shard=None)
+
+        fetched_tasks = Consumer(shards=[1]).fetch_due_tasks()
+
+        self.assertEqual(
+            {task.pk for task in fetched_tasks}, {other_task.pk, unsharded_task.pk}
+        )
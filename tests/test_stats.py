@@ -0,0 +1,194 @@
+import threading
+import time
+from datetime import timedelta
+from unittest import skipUnless
+from unittest.mock import patch
+
+from django.test import SimpleTestCase, TransactionTestCase, override_settings
+from django.utils.timezone import now
+
+from taskq.consumer import Consumer
+from taskq.models import Task, TaskStats
+from taskq import stats as taskq_stats
+from taskq.stats import (
+    SKETCH_BOUNDS,
+    DurationSketch,
+    ResourceUsage,
+    StatsBuffer,
+    get_stats,
+    purge_stats,
+    update_stats,
+)
+from .utils import create_task
+
+
+class DurationSketchTestCase(SimpleTestCase):
+    def test_quantile(self):
+        """Quantiles are approximated within 19%."""
+        sketch = DurationSketch()
+        for i in range(1, 101):
+            sketch.add(i / 100)
+
+        self.assertAlmostEqual(sketch.quantile(0.5), 0.5, delta=0.5 * 0.19)
+        self.assertAlmostEqual(sketch.quantile(0.95), 0.95, delta=0.95 * 0.19)
+        self.assertIsNone(DurationSketch().quantile(0.5))
+
+    def test_merge(self):
+        """Merged sketches count the durations of both sketches."""
+        sketch = DurationSketch()
+        sketch.add(0.01)
+        other = DurationSketch()
+        other.add(10)
+        other.add(100000)
+
+        sketch.merge(other)
+
+        self.assertEqual(sketch.total, 3)
+        # The longest durations are counted in the last bucket
+        self.assertEqual(sketch.quantile(1), SKETCH_BOUNDS[-1])
+
+
+class StatsTestCase(TransactionTestCase):
+    databases = {"default", "sqlite"}
+
+    def setUp(self):
+        self.now = now()
+
+    def _buffer(self, *executions):
+        stats = StatsBuffer()
+        # All the executions are counted in the same minute
+        with patch("taskq.stats.timezone.now", return_value=self.now):
+            for function_name, status, duration in executions:
+                task = Task(function_name=function_name, status=status)
+                stats.record(task, duration)
+        return stats
+
+    def test_update_stats(self):
+        """The buffered statistics are added to the rows of the same function
+        and minute, with a single query on PostgreSQL."""
+        for using in ("default", "sqlite"):
+            with self.subTest(using=using):
+                stats = self._buffer(
+                    ("app.add", Task.STATUS_SUCCESS, 0.1),
+                    ("app.add", Task.STATUS_FAILED, 0.3),
+                    ("app.sub", Task.STATUS_QUEUED, 1),
+                )
+                update_stats(stats.pop(), using=using)
+                stats = self._buffer(("app.add", Task.STATUS_SUCCESS, 0.2))
+                if using == "default":
+                    with self.assertNumQueries(1, using=using):
+                        update_stats(stats.pop(), using=using)
+                else:
+                    update_stats(stats.pop(), using=using)
+
+                result = get_stats(using=using)
+                self.assertEqual(
+                    TaskStats.objects.using(using).count(), 2, "One row per function"
+                )
+                self.assertEqual(result["app.add"]["executions"], 3)
+                self.assertEqual(result["app.add"]["failures"], 1)
+                self.assertAlmostEqual(result["app.add"]["failure_rate"], 1 / 3)
+                self.assertAlmostEqual(
+                    result["app.add"]["mean_duration"].total_seconds(), 0.2
+                )
+                self.assertAlmostEqual(
+                    result["app.add"]["p50"].total_seconds(), 0.2, delta=0.2 * 0.19
+                )
+                self.assertEqual(result["app.sub"]["retries"], 1)
+
+    def test_consumer_writes_stats_once_per_iteration(self):
+        """The consumer buffers the statistics of the tasks it executes and
+        writes them all at once."""
+        for _ in range(3):
+            create_task(function_name="tests.fixtures.do_nothing")
+        consumer = Consumer()
+        consumer.execute_tasks()
+
+        with patch("taskq.backends.update_stats") as update_stats_mock:
+            consumer.write_stats()
+            consumer.write_stats()
+        self.assertEqual(update_stats_mock.call_count, 1)
+
+        create_task(function_name="tests.fixtures.do_nothing")
+        consumer.execute_tasks()
+        consumer.write_stats()
+        stats = get_stats()["tests.fixtures.do_nothing"]
+        self.assertEqual(stats["executions"], 1)
+
+    @override_settings(TASKQ={"resource_accounting": True})
+    def test_consumer_records_resource_usage(self):
+        """With TASKQ["resource_accounting"], the consumer records the CPU time
+        and the SQL queries of the tasks."""
+        create_task(function_name="tests.fixtures.count_tasks")
+        consumer = Consumer()
+        consumer.execute_tasks()
+        consumer.write_stats()
+
+        stats = get_stats()["tests.fixtures.count_tasks"]
+        self.assertEqual(stats["queries"], 2)
+        self.assertGreater(stats["query_time"], timedelta(0))
+        self.assertGreaterEqual(stats["max_rss_delta"], 0)
+
+    def test_resource_usage(self):
+        """ResourceUsage counts the queries run in the block."""
+        with ResourceUsage() as usage:
+            TaskStats.objects.count()
+            TaskStats.objects.using("sqlite").count()
+            sum(range(2000000))
+        TaskStats.objects.count()
+
+        self.assertEqual(usage.queries, 2)
+        self.assertGreater(usage.user_time + usage.system_time, 0)
+
+    @skipUnless(getattr(taskq_stats.resource, "RUSAGE_THREAD", None), "Linux only")
+    def test_resource_usage_excludes_other_threads(self):
+        """The CPU time of the other threads is not counted."""
+        stop = threading.Event()
+
+        def spin():
+            while not stop.is_set():
+                pass
+
+        thread = threading.Thread(target=spin)
+        thread.start()
+        try:
+            with ResourceUsage() as usage:
+                time.sleep(0.3)
+        finally:
+            stop.set()
+            thread.join()
+
+        self.assertLess(usage.user_time, 0.1)
+
+    def test_interrupted_tasks_are_not_counted(self):
+        """A task interrupted by a BaseException is not counted."""
+        create_task(function_name="tests.fixtures.do_nothing", timeout=0)
+        consumer = Consumer()
+
+        with patch.object(Task, "execute", side_effect=KeyboardInterrupt):
+            with self.assertRaises(KeyboardInterrupt):
+                consumer.execute_tasks()
+        consumer.write_stats()
+
+        self.assertEqual(TaskStats.objects.count(), 0)
+
+    @override_settings(TASKQ={"stats": False})
+    def test_stats_can_be_disabled(self):
+        """No statistics are recorded with TASKQ["stats"] = False."""
+        create_task(function_name="tests.fixtures.do_nothing")
+        consumer = Consumer()
+        consumer.execute_tasks()
+        consumer.write_stats()
+
+        self.assertEqual(TaskStats.objects.count(), 0)
+
+    @override_settings(TASKQ={"stats_retention": 3600})
+    def test_purge_stats(self):
+        """The statistics older than their retention are deleted."""
+        TaskStats.objects.create(function_name="app.add", minute=now())
+        TaskStats.objects.create(
+            function_name="app.add", minute=now() - timedelta(hours=2)
+        )
+
+        self.assertEqual(purge_stats(), 1)
+        self.assertEqual(TaskStats.objects.count(), 1)
@@ -0,0 +1,81 @@
+import threading
+from datetime import timedelta
+from time import sleep
+from unittest.mock import Mock
+
+from django.db import connection
+from django.test import TransactionTestCase, override_settings
+
+from taskq.backends import get_backend
+from taskq.consumer import Consumer
+from .utils import create_task
+
+SCHEDULE = {
+    "my-scheduled-task": {"task": "tests.fixtures.do_nothing", "cron": "0 1 * * *"}
+}
+
+
+class IterationTimingsTestCase(TransactionTestCase):
+    def test_iteration_phases_are_timed(self):
+        """Each iteration times its phases, and passes them to the iteration
+        hooks."""
+        create_task()
+        consumer = Consumer(sleep_rate=0)
+        hook = Mock()
+        consumer.iteration_hooks.append(hook)
+
+        timings = consumer.run_iteration()
+
+        self.assertEqual(
+            list(timings.phases),
+            ["schedule", "claim", "process", "purge", "stats", "sleep"],
+        )
+        self.assertGreaterEqual(timings.duration, timings.phases["process"])
+        hook.assert_called_once_with(consumer, timings)
+
+    @override_settings(TASKQ={"schedule": SCHEDULE})
+    def test_schedule_lock_wait_is_timed(self):
+        """The time spent waiting for the lock of the scheduled tasks is timed."""
+        consumer = Consumer(sleep_rate=0)
+        consumer._scheduler._tasks[0].due_at -= timedelta(days=1)
+
+        locked = threading.Event()
+
+        def hold_lock():
+            with get_backend().lock("taskq_create_scheduled_tasks"):
+                locked.set()
+                sleep(0.3)
+            connection.close()
+
+        thread = threading.Thread(target=hold_lock)
+        thread.start()
+        locked.wait()
+        timings = consumer.run_iteration()
+        thread.join()
+
+        self.assertGreaterEqual(timings.phases["schedule_lock_wait"], 0.2)
+        self.assertGreaterEqual(
+            timings.phases["schedule"], timings.phases["schedule_lock_wait"]
+        )
+
+    @override_settings(TASKQ={"slow_iteration_threshold": 0})
+    def test_slow_iterations_are_logged(self):
+        """The iterations slower than TASKQ["slow_iteration_threshold"] are
+        logged with the duration of their phases."""
+        consumer = Consumer(sleep_rate=0)
+
+        with self.assertLogs("taskq", "WARNING") as logs:
+            consumer.run_iteration()
+
+        self.assertIn("Slow iteration", logs.output[0])
+        self.assertIn("claim", logs.output[0])
+
+    @override_settings(TASKQ={"iteration_hooks": ["tests.fixtures.failing"]})
+    def test_failing_hooks_are_logged(self):
+        """The exceptions of the iteration hooks are logged."""
+        consumer = Consumer(sleep_rate=0)
+
+        with self.assertLogs("taskq", "ERROR") as logs:
+            consumer.run_iteration()
+
+        self.assertIn("Iteration hook", logs.output[0])
@@ -0,0 +1,72 @@
+from unittest.mock import Mock
+
+from django.test import TransactionTestCase, override_settings
+
+from taskq.consumer import Consumer
+from taskq.ingest import task_from_record
+from taskq.models import Task
+from taskq.task import taskify
+from taskq.tracing import get_trace_context, get_tracer, use_trace_context
+
+TRACEPARENT = "00-0af7651916cd43dd8448eb211c80319c-b7ad6b7169203331-01"
+
+_seen_trace_contexts = []
+
+
+@taskify
+def record_trace_context():
+    _seen_trace_contexts.append(get_trace_context())
+
+
+class TracingTestCase(TransactionTestCase):
+    def setUp(self):
+        _seen_trace_contexts.clear()
+
+    def test_trace_context_is_propagated(self):
+        """The trace context of apply_async is stored with the task and
+        restored while it is executed."""
+        with use_trace_context(TRACEPARENT):
+            task = record_trace_context.apply_async()
+        record_trace_context.apply_async()
+
+        self.assertEqual(Task.objects.get(pk=task.pk).trace_context, TRACEPARENT)
+        self.assertIsNone(get_trace_context())
+
+        Consumer().execute_tasks()
+
+        self.assertCountEqual(_seen_trace_contexts, [TRACEPARENT, None])
+        self.assertIsNone(get_trace_context())
+
+    def test_imported_tasks_trace_context(self):
+        """Imported records can have a trace context."""
+        task = task_from_record(
+            {
+                "function_name": "tests.test_tracing.record_trace_context",
+                "trace_context": "my-correlation-id",
+            }
+        )
+        self.assertEqual(task.trace_context, "my-correlation-id")
+
+    @override_settings(TASKQ={"tracer": "taskq.tracing.LoggingTracer"})
+    def test_consumer_reports_spans(self):
+        """The consumer reports a queue wait span and an execution span for
+        each task."""
+        with use_trace_context(TRACEPARENT):
+            task = record_trace_context.apply_async()
+        tracer = get_tracer()
+        tracer.record_span = Mock(wraps=tracer.record_span)
+
+        with self.assertLogs("taskq", "INFO") as logs:
+            Consumer().execute_tasks()
+
+        spans = [call.args[0] for call in tracer.record_span.call_args_list]
+        self.assertEqual(spans, ["taskq.queue_wait", "taskq.execute"])
+        self.assertTrue(
+            any(
+                "Span taskq.execute" in line and TRACEPARENT in line
+                for line in logs.output
+            )
+        )
+        queue_wait = tracer.record_span.call_args_list[0].args
+        self.assertEqual(queue_wait[1].uuid, task.uuid)
+        self.assertLessEqual(queue_wait[2], queue_wait[3])
@@ -1,8 +1,9 @@
 import datetime
 
-from django.test import TransactionTestCase
+from django.conf import settings
+from django.test import TransactionTestCase, override_settings
 
-from taskq.utils import parse_timedelta, ordinal
+from taskq.utils import cached_setting, chunks, parse_timedelta, ordinal
 
 
 class UtilsParseTimedeltaTestCase(TransactionTestCase):
@@ -68,3 +69,33 @@ class UtilsOrdinalTestCase(TransactionTestCase):
     def test_ordinal_1250239(self):
         """ordinal(1250239) -> 1250239th"""
         self.assertEqual(ordinal(1250239), "1250239th")
+
+
+class UtilsChunksTestCase(TransactionTestCase):
+    def test_chunks_splits_iterable(self):
+        """chunks splits an iterable in lists of at most `size` items."""
+        self.assertEqual(list(chunks(range(5), 2)), [[0, 1], [2, 3], [4]])
+
+    def test_chunks_empty_iterable(self):
+        """chunks does not yield anything for an empty iterable."""
+        self.assertEqual(list(chunks([], 2)), [])
+
+
+class UtilsCachedSettingTestCase(TransactionTestCase):
+    def test_cached_setting_is_cleared_when_settings_change(self):
+        """cached_setting caches the value until settings.TASKQ changes."""
+        calls = []
+
+        @cached_setting
+        def get_value():
+            calls.append(None)
+            return getattr(settings, "TASKQ", {}).get("value")
+
+        self.assertIsNone(get_value())
+        self.assertIsNone(get_value())
+        self.assertEqual(len(calls), 1)
+
+        with override_settings(TASKQ={"value": 1}):
+            self.assertEqual(get_value(), 1)
+        self.assertIsNone(get_value())
+        self.assertEqual(len(calls), 3)
@@ -0,0 +1,179 @@
+import json
+from unittest.mock import patch
+
+from django.db import connection
+from django.test import TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from taskq.exceptions import InvalidTaskRecord
+from taskq.ingest import task_from_record
+from taskq.models import Task
+
+INGEST = {"ingest_auth": "taskq.views.token_auth", "ingest_tokens": ["s3cret"]}
+
+
+@override_settings(ROOT_URLCONF="taskq.urls", TASKQ=INGEST)
+class IngestViewTestCase(TransactionTestCase):
+    def _post(self, body, token="s3cret"):
+        headers = {"HTTP_AUTHORIZATION": f"Bearer {token}"} if token else {}
+        return self.client.post(
+            "/tasks/",
+            json.dumps(body),
+            content_type="application/json",
+            **headers,
+        )
+
+    def test_tasks_are_created(self):
+        """The view creates the submitted tasks and returns their uuids."""
+        response = self._post(
+            {
+                "tasks": [
+                    {"function_name": "tests.fixtures.task_add", "args": [1, 2]},
+                    {"function_name": "tests.fixtures.counter_increment"},
+                ]
+            }
+        )
+
+        self.assertEqual(response.status_code, 201)
+        uuids = response.json()["uuids"]
+        self.assertEqual(response.json()["created"], 2)
+        self.assertEqual(
+            set(Task.objects.values_list("uuid", flat=True)), set(map(str, uuids))
+        )
+
+    def test_tasks_are_inserted_in_one_statement(self):
+        """A batch of tasks is inserted with a single INSERT."""
+        record = {"function_name": "tests.fixtures.task_add", "args": [1, 2]}
+        self._post({"tasks": [record]})
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self._post({"tasks": [record] * 1000})
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Task.objects.count(), 1001)
+        inserts = [q for q in queries if q["sql"].startswith("INSERT")]
+        self.assertEqual(len(inserts), 1)
+
+    def test_tasks_get_traceparent_header(self):
+        """The tasks without trace_context get the traceparent header."""
+        traceparent = "00-0af7651916cd43dd8448eb211c80319c-b7ad6b7169203331-01"
+        response = self.client.post(
+            "/tasks/",
+            json.dumps(
+                {
+                    "tasks": [
+                        {"function_name": "tests.fixtures.task_add"},
+                        {
+                            "function_name": "tests.fixtures.task_add",
+                            "trace_context": "x",
+                        },
+                    ]
+                }
+            ),
+            content_type="application/json",
+            HTTP_AUTHORIZATION="Bearer s3cret",
+            HTTP_TRACEPARENT=traceparent,
+        )
+
+        self.assertEqual(response.status_code, 201)
+        self.assertCountEqual(
+            Task.objects.values_list("trace_context", flat=True), [traceparent, "x"]
+        )
+
+    def test_invalid_tasks_are_rejected(self):
+        """No task is created when any of them is invalid, and the errors are
+        reported by index."""
+        response = self._post(
+            {
+                "tasks": [
+                    {"function_name": "tests.fixtures.task_add"},
+                    {"function_name": "tests.fixtures.unknown"},
+                ]
+            }
+        )
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(list(response.json()["errors"]), ["1"])
+        self.assertEqual(Task.objects.count(), 0)
+
+    def test_unregistered_functions_are_not_imported(self):
+        """The functions which are not registered are rejected without
+        importing their module."""
+        with patch("importlib.import_module") as mock_import_module:
+            response = self._post({"tasks": [{"function_name": "os.system"}]})
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(
+            response.json()["errors"], {"0": 'Unknown function "os.system"'}
+        )
+        mock_import_module.assert_not_called()
+
+    def test_uuids_are_validated(self):
+        """Invalid and duplicate uuids are rejected, and existing ones conflict."""
+        uuid = "0af76519-16cd-43dd-8448-eb211c80319c"
+        record = {"function_name": "tests.fixtures.task_add", "uuid": uuid}
+        response = self._post({"tasks": [{**record, "uuid": "nope"}, record, record]})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(list(response.json()["errors"]), ["0", "2"])
+
+        self.assertEqual(self._post({"tasks": [record]}).status_code, 201)
+        response = self._post({"tasks": [record]})
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(Task.objects.count(), 1)
+
+    def test_retry_options_are_validated(self):
+        """The retry options of the wrong type are rejected per task, instead
+        of failing the insertion."""
+        invalid_options = [
+            ("max_retries", "x", "max_retries must be an integer"),
+            ("max_retries", True, "max_retries must be an integer"),
+            ("max_retries", -1, "max_retries must not be negative"),
+            ("retry_backoff", "yes", "retry_backoff must be a boolean"),
+            (
+                "retry_backoff_factor",
+                "x",
+                "retry_backoff_factor must be a finite number",
+            ),
+        ]
+        for key, value, error in invalid_options:
+            with self.subTest(key=key, value=value):
+                record = {"function_name": "tests.fixtures.task_add", key: value}
+                response = self._post({"tasks": [record]})
+
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.json()["errors"], {"0": error})
+        # JSON has no infinite numbers, but the other producers of records do
+        with self.assertRaisesMessage(
+            InvalidTaskRecord, "retry_backoff_factor must be a finite number"
+        ):
+            task_from_record(
+                {
+                    "function_name": "tests.fixtures.task_add",
+                    "retry_backoff_factor": float("inf"),
+                }
+            )
+        self.assertEqual(Task.objects.count(), 0)
+
+    def test_invalid_bodies_are_rejected(self):
+        """Bodies without a non empty list of tasks are rejected."""
+        for body in [[], {}, {"tasks": []}, {"tasks": {}}]:
+            with self.subTest(body=body):
+                self.assertEqual(self._post(body).status_code, 400)
+
+    @override_settings(TASKQ={**INGEST, "ingest_max_tasks": 2})
+    def test_too_many_tasks_are_rejected(self):
+        """Requests with more than TASKQ["ingest_max_tasks"] are rejected."""
+        record = {"function_name": "tests.fixtures.task_add"}
+        self.assertEqual(self._post({"tasks": [record] * 3}).status_code, 400)
+
+    def test_unauthorized_requests_are_rejected(self):
+        """Requests without a valid token are rejected."""
+        record = {"function_name": "tests.fixtures.task_add"}
+        self.assertEqual(self._post({"tasks": [record]}, token=None).status_code, 403)
+        self.assertEqual(self._post({"tasks": [record]}, token="x").status_code, 403)
+
+    @override_settings(TASKQ={})
+    def test_requests_are_rejected_without_auth(self):
+        """All requests are rejected when TASKQ["ingest_auth"] is not set."""
+        record = {"function_name": "tests.fixtures.task_add"}
+        self.assertEqual(self._post({"tasks": [record]}).status_code, 403)
@@ -0,0 +1,106 @@
+import os
+import socket
+from datetime import timedelta
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TransactionTestCase, override_settings
+from django.utils.timezone import now
+
+from taskq.consumer import Consumer
+from taskq.models import Task, Worker
+from .utils import create_task
+
+
+class WorkersTestCase(TransactionTestCase):
+    def test_consumer_registers_worker(self):
+        """The consumer registers itself before its first claim, and stores a
+        heartbeat at each iteration."""
+        consumer = Consumer(sleep_rate=0)
+        consumer.register_worker()
+        consumer.run_iteration()
+
+        worker = Worker.objects.get()
+        self.assertEqual(worker.pid, os.getpid())
+        self.assertEqual(worker.databases, ["default"])
+
+        create_task(function_name="tests.fixtures.do_nothing")
+        timings = consumer.run_iteration()
+        with self.assertNumQueries(1):
+            consumer.heartbeat(timings)
+        worker.refresh_from_db()
+        self.assertEqual(worker.tasks_processed, 1)
+        self.assertGreater(worker.busy_ratio, 0)
+        self.assertEqual(Task.objects.get().worker, worker.uuid)
+
+        consumer.unregister_worker()
+        self.assertFalse(Worker.objects.exists())
+
+    def test_heartbeat_when_tasks_start(self):
+        """The heartbeat is stored when each task starts, so that a worker busy
+        with a long batch of tasks isn't pruned."""
+        consumer = Consumer(sleep_rate=0)
+        consumer.register_worker()
+        consumer.execute_tasks()
+        Worker.objects.update(last_heartbeat=now() - timedelta(hours=1))
+
+        create_task(function_name="tests.fixtures.do_nothing")
+        started_at = now()
+        consumer.execute_tasks()
+
+        worker = Worker.objects.get()
+        self.assertGreaterEqual(worker.last_heartbeat, started_at)
+        self.assertEqual(Task.objects.get().worker, worker.uuid)
+
+    def test_heartbeat_registers_pruned_worker(self):
+        """A worker pruned while it was still running is registered again."""
+        consumer = Consumer(sleep_rate=0)
+        consumer.register_worker()
+        consumer.run_iteration()
+        Worker.objects.all().delete()
+
+        consumer.run_iteration()
+
+        self.assertEqual(Worker.objects.get().uuid, consumer._worker.uuid)
+
+    @override_settings(TASKQ={"worker_timeout": 60})
+    def test_dead_workers_are_pruned(self):
+        """The workers whose heartbeat is older than the worker timeout are
+        pruned at the first iteration of a consumer."""
+        Worker.objects.create(
+            host="dead", pid=1, last_heartbeat=now() - timedelta(minutes=2)
+        )
+        Worker.objects.create(host="alive", pid=2)
+
+        consumer = Consumer(sleep_rate=0)
+        consumer.register_worker()
+        consumer.run_iteration()
+
+        self.assertEqual(
+            sorted(Worker.objects.values_list("host", flat=True)),
+            sorted(["alive", socket.gethostname()]),
+        )
+
+    @override_settings(TASKQ={"worker_timeout": 60})
+    def test_workers_command(self):
+        """taskqworkers lists the workers with their running task and counts
+        the idle ones."""
+        busy = Worker.objects.create(host="host1", pid=1, databases=["default"])
+        Worker.objects.create(host="host2", pid=2, databases=["default"])
+        Worker.objects.create(
+            host="host3", pid=3, last_heartbeat=now() - timedelta(minutes=2)
+        )
+        task = create_task(status=Task.STATUS_RUNNING, worker=busy.uuid)
+
+        out = StringIO()
+        call_command("taskqworkers", stdout=out)
+
+        lines = out.getvalue().splitlines()
+        self.assertIn("host1:1 busy", lines[0])
+        self.assertIn(f"task={task}", lines[0])
+        self.assertIn("host2:2 idle", lines[1])
+        self.assertIn("host3:3 dead", lines[2])
+        self.assertEqual(lines[3], "2 workers: 1 busy, 1 idle (idle ratio 50%), 1 dead")
+
+        call_command("taskqworkers", "--prune", stdout=StringIO())
+        self.assertEqual(Worker.objects.count(), 2)
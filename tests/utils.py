@@ -32,6 +32,12 @@ def create_task(**kwargs):
         task.retry_backoff_factor = kwargs["retry_backoff_factor"]
     if "timeout" in kwargs:
         task.timeout = parse_timedelta(kwargs["timeout"], nullable=True)
+    if "shard" in kwargs:
+        task.shard = kwargs["shard"]
+    if "worker" in kwargs:
+        task.worker = kwargs["worker"]
+    if "finished_at" in kwargs:
+        task.finished_at = kwargs["finished_at"]
 
     task.save()
 